@@ -0,0 +1,152 @@
+from fastapi import APIRouter, UploadFile, Form, File, HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+from typing import Annotated, List, Optional
+import asyncio
+import json
+
+from app.config import Config
+from app.core.janitor import janitor
+from app.core.pipeline import analyze_media
+from app.crud.chat_messages import build_messages, append_messages
+from app.crud.media_cleanup import discard_unrecorded
+from app.crud.media_manifest import manifest_entry, record_media
+from app.utils.logger import logger
+from app.utils.metrics import track_stage
+from app.utils.upload_ingest import UploadRoute, ingest_upload
+
+router = APIRouter(route_class=UploadRoute)
+
+def _line(item: dict) -> str:
+    return json.dumps(jsonable_encoder(item)) + "\n"
+
+@router.post("/batch")
+async def analyze_batch(
+    clerk_user_id: Annotated[str, Form()],
+    email: Annotated[str, Form()],
+    chat_id: Annotated[Optional[str], Form()] = None,
+    files: List[UploadFile] = File(...)
+):
+    """
+        Endpoint to analyze many images, videos and audio files in one request.
+        The media type of each file is detected from its content.
+
+        Responds with newline-delimited JSON: one line per file as soon as its analysis finishes,
+        then a final line with the chat_id once all messages are stored in one write.
+    """
+
+    if len(files) > Config.BATCH_MAX_FILES:
+        raise HTTPException(status_code=413, detail=f"A batch can contain at most {Config.BATCH_MAX_FILES} files.")
+
+    # Ingest every file up front, the uploads are closed once this handler returns
+    uploads = []
+
+    for index, file in enumerate(files):
+        try:
+            upload = await ingest_upload(file, None, Config.MAX_FILE_SIZE)
+            uploads.append({"index": index, "filename": file.filename, "upload": upload, "error": None})
+        except HTTPException as he:
+            uploads.append({"index": index, "filename": file.filename, "upload": None, "error": he.detail})
+
+    semaphore = asyncio.Semaphore(Config.BATCH_CONCURRENCY)
+
+    async def analyze(item: dict) -> dict:
+        result = {"index": item["index"], "filename": item["filename"]}
+
+        if item["error"]:
+            return {**result, "status": "failed", "error": item["error"]}
+
+        upload = item["upload"]
+
+        try:
+            async with semaphore:
+                upload_response, (label, confidence, reason, *details), timings = await analyze_media(
+                    upload["media_type"], upload["path"], upload["mime_type"], upload["sha256"], clerk_user_id or email
+                )
+
+            item["media"] = manifest_entry(upload["media_type"], upload_response, upload["sha256"])
+
+            # A cache hit reuses an asset of another chat, anything else was uploaded for this batch
+            item["uploaded"] = timings.get("cache") != "hit"
+
+            user_message, ai_message = build_messages(
+                upload["media_type"], upload_response["secure_url"], label, confidence, reason, *details
+            )
+
+            return {
+                **result,
+                "status": "done",
+                "media_type": upload["media_type"],
+                "user_message": user_message,
+                "ai_message": ai_message,
+                "timings": timings
+            }
+
+        except Exception as e:
+            logger.error(f"Error in analyzing batch item {item['filename']}: {str(e)}")
+            return {**result, "status": "failed", "error": str(e)}
+
+        finally:
+            janitor.discard_temp_file(upload["path"])
+
+    async def results():
+        tasks = [asyncio.create_task(analyze(item)) for item in uploads]
+        finished = []
+        saved = False
+
+        try:
+            for task in asyncio.as_completed(tasks):
+                result = await task
+                finished.append(result)
+                yield _line(result)
+
+            done = sorted((result for result in finished if result["status"] == "done"), key=lambda result: result["index"])
+            messages = [message for result in done for message in (result["user_message"], result["ai_message"])]
+            saved_chat_id = chat_id
+
+            if messages:
+                try:
+                    with track_stage("mongo_write", "batch"):
+                        saved_chat_id = await append_messages(clerk_user_id, email, chat_id, "Batch Analysis", messages)
+                except Exception as e:
+                    logger.error(f"Failed to store batch messages for user: {email}. Error: {e}")
+                    yield _line({"status": "error", "error": "Failed to store the analysis results"})
+                    return
+
+                saved = True
+
+                try:
+                    media = [uploads[result["index"]]["media"] for result in done]
+                    await record_media(clerk_user_id, email, saved_chat_id, media)
+                except Exception as e:
+                    # The purge still finds the media through the stored messages
+                    logger.error(f"Failed to record batch media of chat_id: {saved_chat_id}. Error: {e}")
+                    yield _line({"status": "error", "chat_id": saved_chat_id, "error": "Failed to store the analysis results"})
+                    return
+
+            yield _line({
+                "status": "complete",
+                "chat_id": saved_chat_id,
+                "succeeded": len(done),
+                "failed": len(finished) - len(done)
+            })
+
+        finally:
+            # Stop whatever is still running if the client went away
+            for task in tasks:
+                task.cancel()
+
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+            for item in uploads:
+                if item["upload"]:
+                    janitor.discard_temp_file(item["upload"]["path"])
+
+            # The client went away or the messages were not stored: nothing refers to the uploaded media
+            if not saved:
+                try:
+                    await discard_unrecorded([item["media"] for item in uploads if item.get("uploaded")])
+                except Exception as e:
+                    logger.error(f"Failed to delete the media of an unsaved batch for user: {email}. Error: {e}")
+
+    return StreamingResponse(results(), media_type="application/x-ndjson")
@@ -1,21 +1,27 @@
-from fastapi import APIRouter, HTTPException, Body
-from typing import List
+from fastapi import APIRouter, HTTPException, Body, Query
+from typing import List, Optional
 from bson import ObjectId
+import uuid
 
 from app.core.database import db
-from app.schemas.chat_schema import ChatSchema
-from app.crud.media_cleanup import delete_media_for_chat_id, clear_media_for_user
+from app.core.purge_queue import purge_queue
+from app.schemas.chat_schema import ChatSchema, ChatHistoryPage, MessagePage
+from app.crud.chat_history import get_history_page
+from app.crud.chat_messages import attach_messages, get_messages_page
+from app.crud.media_manifest import get_storage_usage
 from app.utils.logger import logger
 
 router = APIRouter()
 
-@router.get("/history", response_model=List[ChatSchema])
+@router.get("/history", response_model=List[ChatSchema], deprecated=True)
 async def get_chat_history(email: str):
     """
         Get all chat history of user and sort them by newest first.
+        Reads every message of every chat: use /history/page and /{chat_id}/messages instead.
     """
 
-    chats = await db["chats"].find({"user_email": email}).sort("created_at", -1).to_list(length=None)
+    chats = await db["chats"].find({"user_email": email, "deleted_at": None}).sort([("created_at", -1), ("_id", -1)]).to_list(length=None)
+    await attach_messages(chats)
 
     # Convert ObjectId to string pydantic
     for chat in chats:
@@ -24,19 +30,51 @@ async def get_chat_history(email: str):
     logger.info(f"Fetched chat history for user: {email}, total chats: {len(chats)}")
     return chats
 
+@router.get("/history/page", response_model=ChatHistoryPage)
+async def get_chat_history_page(
+    email: str,
+    limit: int = Query(20, ge=1, le=100),
+    cursor: Optional[str] = None
+):
+    """
+        Get one page of the user's chats, newest first, without their messages.
+        Pass the returned next_cursor as cursor to get the following page.
+    """
+
+    try:
+        chats, next_cursor = await get_history_page(email, limit, cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    logger.info(f"Fetched chat history page for user: {email}, chats: {len(chats)}")
+    return {"chats": chats, "next_cursor": next_cursor}
+
+@router.get("/storage", response_model=dict)
+async def get_chat_storage(email: str):
+    """
+        Get how many media files the user's chats use and their total size in bytes, per media type.
+    """
+
+    usage = await get_storage_usage(email)
+
+    logger.info(f"Fetched storage usage for user: {email}, bytes: {usage['bytes']}")
+    return usage
+
 @router.get("/{chat_id}", response_model=ChatSchema)
 async def get_chat_details(chat_id: str):
     """
-        Get a specific chat by chat_id
+        Get a specific chat by chat_id, with all of its messages.
+        Use /{chat_id}/messages to read a long chat page by page.
     """
 
     try:
-        chat = await db["chats"].find_one({"_id": ObjectId(chat_id)})
+        chat = await db["chats"].find_one({"_id": ObjectId(chat_id), "deleted_at": None})
 
         if not chat:
             logger.warning(f"Chat with chat_id: {chat_id} not found")
             return None
         
+        await attach_messages([chat])
         chat["_id"] = str(chat["_id"])
         logger.info(f"Fetched chat details for chat_id: {chat_id}")
         return chat
@@ -45,20 +83,47 @@ async def get_chat_details(chat_id: str):
         logger.error(f"Failed to get chat details for chat_id: {chat_id}")
         raise HTTPException(status_code=400, detail="Failed to get chat details")
 
+@router.get("/{chat_id}/messages", response_model=MessagePage)
+async def get_chat_messages(
+    chat_id: str,
+    email: str,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None
+):
+    """
+        Get one page of a chat's messages, starting from the newest ones.
+        Messages within a page are oldest first; pass the returned next_cursor as cursor to get older messages.
+    """
+
+    # Messages outlive their chat until the purge, deleted chats and chats of other users are not found
+    chat_filter = {"_id": ObjectId(chat_id), "user_email": email, "deleted_at": None} if ObjectId.is_valid(chat_id) else None
+
+    if not chat_filter or not await db["chats"].find_one(chat_filter, {"_id": 1}):
+        logger.warning(f"Chat with chat_id: {chat_id} for user: {email} not found")
+        raise HTTPException(status_code=404, detail="Chat not found")
+
+    try:
+        messages, next_cursor = await get_messages_page(chat_id, limit, cursor)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+    logger.info(f"Fetched messages page for chat_id: {chat_id}, messages: {len(messages)}")
+    return {"messages": messages, "next_cursor": next_cursor}
+
 @router.delete("/delete", response_model=dict)
 async def delete_chat(
     email: str,
     chatId: str
 ):
     """
-        Delete a specific chat by chat_id
+        Delete a specific chat by chat_id.
+        The chat is hidden right away, its media is purged in the background.
     """
 
     try:
-        await delete_media_for_chat_id(chatId)
-        result = await db["chats"].delete_one({"_id": ObjectId(chatId), "user_email": email})
+        purge_id = await purge_queue.enqueue(f"chat:{chatId}", {"_id": ObjectId(chatId), "user_email": email})
 
-        if result.deleted_count == 0:
+        if not purge_id:
             logger.error(f"Chat with chat_id: {chatId} for user: {email} not found")
             return {"message": "Chat not found"}
 
@@ -72,14 +137,14 @@ async def delete_chat(
 @router.delete("/delete_all_chats", response_model=dict)
 async def delete_all_chats(email: str):
     """
-        Delete all chats for a specific user
+        Delete all chats for a specific user.
+        The chats are hidden right away, their media is purged in the background.
     """
 
     try:
-        await clear_media_for_user(email)
-        result = await db["chats"].delete_many({"user_email": email})
+        purge_id = await purge_queue.enqueue(f"user:{uuid.uuid4().hex}", {"user_email": email})
 
-        if result.deleted_count == 0:
+        if not purge_id:
             logger.error(f"No chats found for user: {email} to delete")
             return {"message": "No chats found to delete"}
 
@@ -0,0 +1,103 @@
+from fastapi import APIRouter, Form, HTTPException
+from typing import Annotated, Optional
+import re
+import time
+import uuid
+from cloudinary.exceptions import NotFound
+
+from app.config import Config
+from app.core.cloudinary_client import FOLDERS, RESOURCE_TYPES, created_at, direct_upload_folder, get_resource, sign_upload
+from app.core.executor import PoolSaturatedError, cloudinary_pool
+from app.core.pipeline import analyze_reference_and_save
+from app.crud.media_manifest import extract_public_id_from_url
+from app.utils.logger import logger
+
+router = APIRouter()
+reference_router = APIRouter()
+
+USER_ID_PATTERN = re.compile(r"^[A-Za-z0-9_-]+$")
+
+def _check(media_type: str, clerk_user_id: str):
+    if media_type not in FOLDERS:
+        raise HTTPException(status_code=400, detail="media_type must be one of: image, video, audio.")
+
+    # The user id is part of the public_id of direct uploads
+    if not USER_ID_PATTERN.match(clerk_user_id):
+        raise HTTPException(status_code=400, detail="Invalid clerk_user_id.")
+
+def _direct_upload_prefix(media_type: str, clerk_user_id: str) -> str:
+    return f"{direct_upload_folder(media_type)}{clerk_user_id}/"
+
+@router.post("/signature")
+async def create_upload_signature(
+    clerk_user_id: Annotated[str, Form()],
+    media_type: Annotated[str, Form()]
+):
+    """
+        Endpoint to get signed parameters for uploading one image, video or audio straight to Cloudinary.
+        Post the file to upload_url with the returned public_id, timestamp, api_key and signature,
+        then analyze it with POST /api/analyze/reference. The upload must be done before expires_at.
+    """
+
+    _check(media_type, clerk_user_id)
+
+    issued_at = int(time.time())
+    public_id = f"{_direct_upload_prefix(media_type, clerk_user_id)}{issued_at}-{uuid.uuid4().hex}"
+
+    return {
+        **sign_upload(public_id, RESOURCE_TYPES[media_type]),
+        "resource_type": RESOURCE_TYPES[media_type],
+        "max_file_size": Config.MAX_FILE_SIZE,
+        "expires_at": issued_at + Config.DIRECT_UPLOAD_TTL_SECONDS
+    }
+
+@reference_router.post("/reference")
+async def analyze_reference(
+    clerk_user_id: Annotated[str, Form()],
+    email: Annotated[str, Form()],
+    media_type: Annotated[str, Form()],
+    reference: Annotated[str, Form()],
+    chat_id: Annotated[Optional[str], Form()] = None
+):
+    """
+        Endpoint to analyze an image, video or audio that was uploaded straight to Cloudinary.
+        reference is the public_id returned by /api/upload/signature, or the Cloudinary URL of the upload.
+    """
+
+    _check(media_type, clerk_user_id)
+
+    prefix = _direct_upload_prefix(media_type, clerk_user_id)
+    public_id = extract_public_id_from_url(reference) if reference.startswith(("http://", "https://")) else reference
+
+    if not public_id or not public_id.startswith(prefix):
+        raise HTTPException(status_code=403, detail="The reference is not a direct upload of this user.")
+
+    try:
+        issued_at = int(public_id[len(prefix):].split("-", 1)[0])
+    except ValueError:
+        raise HTTPException(status_code=403, detail="The reference is not a direct upload of this user.")
+
+    try:
+        resource = await cloudinary_pool.run(get_resource, public_id, RESOURCE_TYPES[media_type])
+
+        # Cloudinary accepts a signature for an hour, uploads made after our own expiry are refused here
+        if created_at(resource) > issued_at + Config.DIRECT_UPLOAD_TTL_SECONDS:
+            raise HTTPException(status_code=410, detail="The upload signature expired before the file was uploaded.")
+
+        if (resource.get("bytes") or 0) > Config.MAX_FILE_SIZE:
+            raise HTTPException(status_code=413, detail=f"File size exceeds the {Config.MAX_FILE_SIZE // (1024 * 1024)}MB limit.")
+
+        # Download the asset if its verdict is not known yet, get the (label, confidence, reason) from LLM and store the messages
+        return await analyze_reference_and_save(media_type, resource, clerk_user_id, email, chat_id)
+
+    except HTTPException as he:
+        raise he
+    except NotFound:
+        logger.warning(f"Referenced {media_type} {public_id} not found on Cloudinary")
+        raise HTTPException(status_code=404, detail="The referenced upload was not found.")
+    except PoolSaturatedError as pe:
+        logger.warning(str(pe))
+        raise HTTPException(status_code=503, detail="Server is busy. Please try again shortly.")
+    except Exception as e:
+        logger.error(f"Error in analyzing referenced {media_type}: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
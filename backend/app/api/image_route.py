@@ -1,23 +1,18 @@
 from fastapi import APIRouter, UploadFile, Form, File, HTTPException
+from fastapi.responses import JSONResponse
 from typing import Annotated, Optional
-import tempfile
-import os
-from bson import ObjectId
-from datetime import datetime
-import pytz
-import uuid
-import shutil
-import gc
 
-from app.core.cloudinary_client import upload_image
-from app.core.database import db
-from app.utils.llm_analysis import analyze_image_with_llm
+from app.config import Config
+from app.core.executor import PoolSaturatedError
+from app.core.janitor import janitor
+from app.core.jobs import job_manager
+from app.core.pipeline import analyze_and_save
 from app.utils.logger import logger
+from app.utils.upload_ingest import UploadRoute, ingest_upload
 
-router = APIRouter()
+router = APIRouter(route_class=UploadRoute)
 
-MAX_FILE_SIZE = 50 * 1024 * 1024  # 50 MB
-IST = pytz.timezone('Asia/Kolkata')
+MAX_FILE_SIZE = Config.MAX_FILE_SIZE
 
 @router.post("/analyze")
 async def analyze_image(
@@ -25,92 +20,51 @@ async def analyze_image(
     email: Annotated[str, Form()], 
     mime_type: Annotated[str, Form()],
     chat_id: Annotated[Optional[str], Form()] = None,
+    as_job: Annotated[bool, Form()] = False,
     file: UploadFile = File(...)
 ):
     """
         Endpoint to upload and analyze the given image.
     """
-    if file.size and file.size > MAX_FILE_SIZE:
-        raise HTTPException(status_code=413, detail="File size exceeds the 50MB limit.")
+    temp_file_path = None
 
     try:
-        # Save the uploaded file to a temporary location
-        with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-            shutil.copyfileobj(file.file, temp_file)
-            temp_file_path = temp_file.name
+        # Stream the upload to a temporary file, checking its size and real type on the way
+        upload = await ingest_upload(file, "image", MAX_FILE_SIZE)
+        temp_file_path = upload["path"]
 
-        if os.path.getsize(temp_file_path) > MAX_FILE_SIZE:
-             os.remove(temp_file_path)
-             raise HTTPException(status_code=413, detail="File size exceeds the 50MB limit.")
+        # Release the parser's in-memory spool of the part right away instead of after the response
+        await file.close()
 
-        # Free up memory
-        del file
-        gc.collect()
-
-        # Upload image to Cloudinary
-        document_url = upload_image(temp_file_path)
-        logger.info(f"Image uploaded to Cloudinary: {document_url}")
-        gc.collect() 
-
-        # Get the (label, confidence, reason) from LLM
-        label, confidence, reason = analyze_image_with_llm(temp_file_path, mime_type)
-        gc.collect()
-
-        user_msg_id = str(uuid.uuid4())
-        ai_msg_id = str(uuid.uuid4())
-
-        user_message = {
-            "id": user_msg_id,
-            "role": "user",
-            "type": "image",
-            "content": document_url,
-            "created_at": datetime.now()
-        }
-
-        ai_message = {
-            "id": ai_msg_id,
-            "role": "trueai",
-            "type": "image",
-            "content": document_url,
-            "label": label,
-            "confidence": confidence,
-            "reason": reason,
-            "created_at": datetime.now()
-        }
-
-        if not chat_id or chat_id == "null" or chat_id == "":
-            new_chat = {
-                "clerk_user_id": clerk_user_id,
-                "user_email": email,
-                "title": f"Image Analysis {datetime.now(IST).strftime('%H:%M')}",
-                "created_at": datetime.now(),
-                "messages": [user_message, ai_message]
-            }
-
-            result = await db["chats"].insert_one(new_chat)
-            chat_id = str(result.inserted_id)
-        else:
-            result = await db["chats"].update_one(
-                {"_id": ObjectId(chat_id)},
-                {"$push": {"messages": {"$each": [user_message, ai_message]}}}
+        if as_job:
+            job_id = await job_manager.submit(
+                "image", temp_file_path, upload["mime_type"], upload["sha256"], clerk_user_id, email, chat_id
             )
+            temp_file_path = None  # The job deletes the file once it is done
+
+            return JSONResponse(status_code=202, content={
+                "job_id": job_id,
+                "status": "queued",
+                "status_url": f"/api/jobs/{job_id}",
+                "events_url": f"/api/jobs/{job_id}/events"
+            })
 
-        logger.info(f"Analysis result: {result}")
+        # Upload image to Cloudinary, get the (label, confidence, reason) from LLM and store the messages
+        response = await analyze_and_save(
+            "image", temp_file_path, upload["mime_type"], upload["sha256"], clerk_user_id, email, chat_id
+        )
 
-        return {
-            "chat_id": chat_id,
-            "user_message": user_message,
-            "ai_message": ai_message
-        }
+        return response
 
     except HTTPException as he:
         raise he
+    except PoolSaturatedError as pe:
+        logger.warning(str(pe))
+        raise HTTPException(status_code=503, detail="Server is busy. Please try again shortly.")
     except Exception as e:
         logger.error(f"Error in uploading or analyzing image: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
     
     finally:
-        if os.path.exists(temp_file_path):
-            os.remove(temp_file_path)
-            logger.info(f"Temporary file {temp_file_path} deleted.")
-        gc.collect()
+        if temp_file_path:
+            janitor.discard_temp_file(temp_file_path)
@@ -0,0 +1,47 @@
+from fastapi import APIRouter, HTTPException
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
+import json
+
+from app.core.jobs import job_manager
+from app.utils.logger import logger
+
+router = APIRouter()
+
+@router.get("/{job_id}", response_model=dict)
+async def get_job(job_id: str):
+    """
+        Get the status, stage history and (once done) the result of an analysis job.
+    """
+
+    job = await job_manager.get(job_id)
+
+    if not job:
+        logger.warning(f"Job with job_id: {job_id} not found")
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    return job
+
+@router.get("/{job_id}/events")
+async def stream_job_events(job_id: str):
+    """
+        Server-sent events stream of an analysis job.
+        Sends a 'progress' event on every stage change and ends with a 'done' or 'failed' event
+        that carries the final result or error.
+    """
+
+    job = await job_manager.get(job_id)
+
+    if not job:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def events():
+        async for job in job_manager.watch(job_id):
+            event = job["status"] if job["status"] in ("done", "failed") else "progress"
+            yield f"event: {event}\ndata: {json.dumps(jsonable_encoder(job))}\n\n"
+
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
@@ -0,0 +1,85 @@
+from fastapi import APIRouter
+from fastapi.responses import PlainTextResponse
+
+from app.core.admission import admission_queue, byte_budget
+from app.core.executor import get_pool_stats
+from app.core.gemini_file_watcher import gemini_file_watcher
+from app.core.janitor import janitor
+from app.core.jobs import job_manager
+from app.core.phash_index import phash_index
+from app.core.purge_queue import purge_queue
+from app.core.scheduler import fair_scheduler
+from app.core.verdict_cache import verdict_cache
+from app.core.worker_metrics import worker_metrics
+from app.utils.metrics import Gauge
+
+router = APIRouter()
+prometheus_router = APIRouter()
+
+# Snapshots of the in-process stats, refreshed on every scrape and before every worker snapshot
+POOL_TASKS = Gauge("trueai_pool_tasks", "Calls queued and running on each offload pool.", ("pool", "state"))
+JOBS_QUEUED = Gauge("trueai_jobs_queued", "Analysis jobs waiting for a worker.")
+ADMISSION = Gauge("trueai_admission_requests", "Analyze requests holding or waiting for an admission slot.", ("state",))
+BYTE_BUDGET = Gauge("trueai_byte_budget_bytes", "Request bytes reserved in and waiting for the upload byte budget.", ("state",))
+JANITOR_PENDING = Gauge("trueai_janitor_pending_files", "Gemini files and temp files waiting to be deleted.", ("kind",))
+SCHEDULER_WAITING = Gauge("trueai_scheduler_waiting", "Analyses waiting in the fair scheduler by media type.", ("media_type",))
+
+@router.get("/", response_model=dict)
+async def get_metrics():
+    """
+        Get queue depth and call counters of the offload pools, the upload byte budget,
+        cache hit/miss counters, depth and lag of the media purge queue, queue wait
+        per media type in the fair scheduler and the files pending deletion.
+        The stats are those of the worker process serving the request.
+    """
+
+    return {
+        "admission": admission_queue.stats(),
+        "byte_budget": byte_budget.stats(),
+        "executors": get_pool_stats(),
+        "verdict_cache": verdict_cache.stats(),
+        "phash_index": phash_index.stats(),
+        "jobs": job_manager.stats(),
+        "purge_queue": await purge_queue.stats(),
+        "scheduler": fair_scheduler.stats(),
+        "gemini_file_watcher": gemini_file_watcher.stats(),
+        "janitor": janitor.stats(),
+        "worker_metrics": worker_metrics.stats()
+    }
+
+def refresh_gauges():
+    """
+        Sets the gauges that are snapshots of the in-process stats.
+    """
+
+    for pool, stats in get_pool_stats().items():
+        POOL_TASKS.set(stats["queued"], pool=pool, state="queued")
+        POOL_TASKS.set(stats["active"], pool=pool, state="active")
+
+    JOBS_QUEUED.set(job_manager.stats()["queued"])
+
+    admission = admission_queue.stats()
+
+    for state in ("active", "waiting"):
+        ADMISSION.set(admission[state], state=state)
+
+    budget = byte_budget.stats()
+    BYTE_BUDGET.set(budget["used_bytes"], state="reserved")
+    BYTE_BUDGET.set(budget["waiting_bytes"], state="waiting")
+
+    cleanup = janitor.stats()
+    JANITOR_PENDING.set(cleanup["pending_gemini"], kind="gemini")
+    JANITOR_PENDING.set(cleanup["pending_temp"], kind="temp")
+
+    for media_type, stats in fair_scheduler.stats()["classes"].items():
+        SCHEDULER_WAITING.set(stats["waiting"], media_type=media_type)
+
+@prometheus_router.get("/metrics", response_class=PlainTextResponse)
+async def get_prometheus_metrics():
+    """
+        Stage latency histograms, in-flight gauges, error and byte counters in Prometheus text format,
+        merged over all worker processes.
+        Runs on the event loop, like the stats it reads are updated, so they never change mid-read.
+    """
+
+    return PlainTextResponse(await worker_metrics.render(), media_type="text/plain; version=0.0.4")
@@ -1,23 +1,21 @@
-from fastapi import APIRouter, UploadFile, Form, File, HTTPException
+from fastapi import APIRouter, UploadFile, Form, File, HTTPException, Header, Request
+from fastapi.responses import JSONResponse
 from typing import Annotated, Optional
-import tempfile
-import os
-from bson import ObjectId
-from datetime import datetime
-import pytz
-import uuid
-import shutil
-import gc
-
-from app.core.cloudinary_client import upload_video
-from app.core.database import db
-from app.utils.llm_analysis import analyze_video_with_llm
+
+from app.config import Config
+from app.core.chunked_upload import chunked_uploads
+from app.core.executor import PoolSaturatedError
+from app.core.janitor import janitor
+from app.core.jobs import job_manager
+from app.core.pipeline import analyze_and_save
+from app.crud.media_cleanup import discard_unrecorded
+from app.crud.media_manifest import manifest_entry
 from app.utils.logger import logger
+from app.utils.upload_ingest import UploadRoute, ingest_upload
 
-router = APIRouter()
+router = APIRouter(route_class=UploadRoute)
 
-MAX_FILE_SIZE = 50 * 1024 * 1024  # 50 MB
-IST = pytz.timezone('Asia/Kolkata')
+MAX_FILE_SIZE = Config.MAX_FILE_SIZE
 
 @router.post("/analyze")
 async def analyze_video(
@@ -25,93 +23,144 @@ async def analyze_video(
     email: Annotated[str, Form()], 
     mime_type: Annotated[str, Form()],
     chat_id: Annotated[Optional[str], Form()] = None,
+    as_job: Annotated[bool, Form()] = False,
     file: UploadFile = File(...)
 ):
     """
         Endpoint to upload and analyze the given video.
     """
     
-    if file.size and file.size > MAX_FILE_SIZE:
-        raise HTTPException(status_code=413, detail="File size exceeds the 50MB limit.")
+    temp_file_path = None
 
     try:
-        # Save the uploaded file to a temporary location
-        with tempfile.NamedTemporaryFile(delete=False) as temp_file:
-            shutil.copyfileobj(file.file, temp_file)
-            temp_file_path = temp_file.name
-        
-        if os.path.getsize(temp_file_path) > MAX_FILE_SIZE:
-             os.remove(temp_file_path)
-             raise HTTPException(status_code=413, detail="File size exceeds the 50MB limit.")
-        
-        # Free up memory
-        del file
-        gc.collect()
+        # Stream the upload to a temporary file, checking its size and real type on the way
+        upload = await ingest_upload(file, "video", MAX_FILE_SIZE)
+        temp_file_path = upload["path"]
+
+        # Release the parser's in-memory spool of the part right away instead of after the response
+        await file.close()
         
-        # Upload video to Cloudinary
-        document_url = upload_video(temp_file_path)
-        logger.info(f"Video uploaded to Cloudinary: {document_url}")
-        gc.collect()
-
-        # Get the (label, confidence, reason) from LLM
-        label, confidence, reason = analyze_video_with_llm(temp_file_path, mime_type)
-        gc.collect()
-
-        user_msg_id = str(uuid.uuid4())
-        ai_msg_id = str(uuid.uuid4())
-
-        user_message = {
-            "id": user_msg_id,
-            "role": "user",
-            "type": "video",
-            "content": document_url,
-            "created_at": datetime.now()
-        }
-
-        ai_message = {
-            "id": ai_msg_id,
-            "role": "trueai",
-            "type": "video",
-            "content": document_url,
-            "label": label,
-            "confidence": confidence,
-            "reason": reason,
-            "created_at": datetime.now()
-        }
-
-        if not chat_id or chat_id == "null" or chat_id == "":
-            new_chat = {
-                "clerk_user_id": clerk_user_id,
-                "user_email": email,
-                "title": f"Video Analysis {datetime.now(IST).strftime('%H:%M')}",
-                "created_at": datetime.now(),
-                "messages": [user_message, ai_message]
-            }
-
-            result = await db["chats"].insert_one(new_chat)
-            chat_id = str(result.inserted_id)
-        else:
-            result = await db["chats"].update_one(
-                {"_id": ObjectId(chat_id)},
-                {"$push": {"messages": {"$each": [user_message, ai_message]}}}
+        if as_job:
+            job_id = await job_manager.submit(
+                "video", temp_file_path, upload["mime_type"], upload["sha256"], clerk_user_id, email, chat_id
             )
+            temp_file_path = None  # The job deletes the file once it is done
 
-        logger.info(f"Analysis result: {result}")
+            return JSONResponse(status_code=202, content={
+                "job_id": job_id,
+                "status": "queued",
+                "status_url": f"/api/jobs/{job_id}",
+                "events_url": f"/api/jobs/{job_id}/events"
+            })
+
+        # Upload video to Cloudinary, get the (label, confidence, reason) from LLM and store the messages
+        response = await analyze_and_save(
+            "video", temp_file_path, upload["mime_type"], upload["sha256"], clerk_user_id, email, chat_id
+        )
+
+        return response
 
-        return {
-            "chat_id": chat_id,
-            "user_message": user_message,
-            "ai_message": ai_message
-        }
-    
     except HTTPException as he:
         raise he
+    except PoolSaturatedError as pe:
+        logger.warning(str(pe))
+        raise HTTPException(status_code=503, detail="Server is busy. Please try again shortly.")
     except Exception as e:
         logger.error(f"Error in uploading or analyzing video: {str(e)}")
         raise HTTPException(status_code=500, detail=str(e))
     
     finally:
-        if os.path.exists(temp_file_path):
-            os.remove(temp_file_path)
-            logger.info(f"Temporary file {temp_file_path} deleted.")
-        gc.collect()
+        if temp_file_path:
+            janitor.discard_temp_file(temp_file_path)
+
+@router.post("/uploads")
+async def create_chunked_upload(
+    clerk_user_id: Annotated[str, Form()],
+    email: Annotated[str, Form()],
+    total_size: Annotated[int, Form()]
+):
+    """
+        Endpoint to start a resumable upload of a video in chunks.
+        Send each chunk with PUT /uploads/{upload_id}/chunks/{index}, every chunk chunk_size bytes
+        except the last, then analyze the video with POST /uploads/{upload_id}/complete.
+    """
+
+    return await chunked_uploads.create(clerk_user_id, email, total_size)
+
+@router.put("/uploads/{upload_id}/chunks/{index}")
+async def put_chunk(
+    upload_id: str,
+    index: int,
+    request: Request,
+    x_chunk_sha256: Annotated[Optional[str], Header()] = None
+):
+    """
+        Endpoint to send one chunk of a chunked upload as the raw request body.
+        The chunk is checked against the X-Chunk-SHA256 header when it is set. Sending a chunk again is safe.
+    """
+
+    return await chunked_uploads.put_chunk(upload_id, index, request.stream(), x_chunk_sha256)
+
+@router.get("/uploads/{upload_id}")
+async def get_chunked_upload(upload_id: str):
+    """
+        Get the status of a chunked upload, including the chunks still missing to resume it.
+    """
+
+    return await chunked_uploads.status(upload_id)
+
+@router.post("/uploads/{upload_id}/complete")
+async def complete_chunked_upload(
+    upload_id: str,
+    chat_id: Annotated[Optional[str], Form()] = None,
+    as_job: Annotated[bool, Form()] = False
+):
+    """
+        Endpoint to analyze a video once all its chunks are in.
+        It is already hashed and on Cloudinary by then, so only the LLM analysis is left.
+    """
+
+    temp_file_path = None
+
+    try:
+        upload = await chunked_uploads.complete(upload_id)
+        temp_file_path = upload["path"]
+
+        if as_job:
+            try:
+                job_id = await job_manager.submit(
+                    "video", temp_file_path, upload["mime_type"], upload["sha256"], upload["clerk_user_id"], upload["email"], chat_id,
+                    upload_response=upload["upload_response"]
+                )
+            except BaseException:
+                # The upload is gone by now, nothing else refers to its asset
+                await discard_unrecorded([manifest_entry("video", upload["upload_response"])])
+                raise
+
+            temp_file_path = None  # The job deletes the file once it is done
+
+            return JSONResponse(status_code=202, content={
+                "job_id": job_id,
+                "status": "queued",
+                "status_url": f"/api/jobs/{job_id}",
+                "events_url": f"/api/jobs/{job_id}/events"
+            })
+
+        # Get the (label, confidence, reason) from LLM and store the messages
+        return await analyze_and_save(
+            "video", temp_file_path, upload["mime_type"], upload["sha256"], upload["clerk_user_id"], upload["email"], chat_id,
+            upload_response=upload["upload_response"]
+        )
+
+    except HTTPException as he:
+        raise he
+    except PoolSaturatedError as pe:
+        logger.warning(str(pe))
+        raise HTTPException(status_code=503, detail="Server is busy. Please try again shortly.")
+    except Exception as e:
+        logger.error(f"Error in analyzing chunked video upload {upload_id}: {str(e)}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+    finally:
+        if temp_file_path:
+            janitor.discard_temp_file(temp_file_path)
@@ -2,8 +2,7 @@ from fastapi import APIRouter, Request, HTTPException, Header
 from svix.webhooks import Webhook, WebhookVerificationError
 
 from app.config import Config
-from app.core.database import db
-from app.crud.media_cleanup import delete_media_for_chat_id
+from app.core.purge_queue import purge_queue
 from app.utils.logger import logger
 
 router = APIRouter()
@@ -41,14 +40,9 @@ async def clerk_webhook(
     if event_type == "user.deleted":
         user_id = event["data"]["id"]
 
-        # Delete all media and chats associated with this user
-        chats = await db["chats"].find({ "clerk_user_id": user_id }).to_list(length=None)
-
-        for chat in chats:
-            chat_id = str(chat["_id"])
-            await delete_media_for_chat_id(chat_id)
-
-        result = await db["chats"].delete_many({ "clerk_user_id": user_id })
-        logger.info(f"Deleted {result.deleted_count} chats for Clerk user ID: {user_id}")
+        # Hide all chats of this user and purge them with their media in the background.
+        # Keyed by the Svix message id, so a retried delivery does not queue the purge again.
+        purge_id = await purge_queue.enqueue(f"svix:{svix_id}", { "clerk_user_id": user_id })
+        logger.info(f"Queued purge {purge_id} for Clerk user ID: {user_id}")
     
     return {"status": "success"}
@@ -1,4 +1,5 @@
 import os
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -14,3 +15,123 @@ class Config:
     CLIENT_URL_2=os.getenv("CLIENT_URL_2")
     CLIENT_URL_3=os.getenv("CLIENT_URL_3")
     CLERK_WEBHOOK_SECRET=os.getenv("CLERK_WEBHOOK_SECRET")
+
+    # Thread pools for blocking SDK calls, sized per backend
+    CLOUDINARY_POOL_SIZE=int(os.getenv("CLOUDINARY_POOL_SIZE", 8))
+    GEMINI_POOL_SIZE=int(os.getenv("GEMINI_POOL_SIZE", 8))
+    OFFLOAD_MAX_QUEUE=int(os.getenv("OFFLOAD_MAX_QUEUE", 64))
+
+    # Verdict cache keyed by file hash (in-process LRU in front of Mongo)
+    VERDICT_CACHE_SIZE=int(os.getenv("VERDICT_CACHE_SIZE", 1024))
+    VERDICT_CACHE_TTL_SECONDS=int(os.getenv("VERDICT_CACHE_TTL_SECONDS", 7 * 24 * 3600))
+    VERDICT_CACHE_LOCAL_TTL_SECONDS=float(os.getenv("VERDICT_CACHE_LOCAL_TTL_SECONDS", 30))
+
+    # Perceptual-hash index for near-duplicate images
+    IMAGE_PHASH_ENABLED=os.getenv("IMAGE_PHASH_ENABLED", "true").lower() == "true"
+    IMAGE_PHASH_MAX_DISTANCE=int(os.getenv("IMAGE_PHASH_MAX_DISTANCE", 6))
+
+    # Upload limits
+    MAX_FILE_SIZE=int(os.getenv("MAX_FILE_SIZE", 50 * 1024 * 1024))
+
+    # Background analysis jobs
+    JOB_WORKERS=int(os.getenv("JOB_WORKERS", 4))
+    JOB_TTL_SECONDS=int(os.getenv("JOB_TTL_SECONDS", 24 * 3600))
+    JOB_STALE_SECONDS=int(os.getenv("JOB_STALE_SECONDS", 15 * 60))
+    JOB_MAX_QUEUE=int(os.getenv("JOB_MAX_QUEUE", 32))
+
+    # Polling of uploaded Gemini files until they are ACTIVE
+    GEMINI_FILE_POLL_INITIAL_SECONDS=float(os.getenv("GEMINI_FILE_POLL_INITIAL_SECONDS", 0.25))
+    GEMINI_FILE_POLL_MAX_SECONDS=float(os.getenv("GEMINI_FILE_POLL_MAX_SECONDS", 5))
+    GEMINI_FILE_POLL_BACKOFF=float(os.getenv("GEMINI_FILE_POLL_BACKOFF", 1.5))
+    GEMINI_FILE_ACTIVE_TIMEOUT_SECONDS=float(os.getenv("GEMINI_FILE_ACTIVE_TIMEOUT_SECONDS", 300))
+
+    # Video analysis: "full" uploads the whole video to Gemini, "keyframes" sends sampled frames inline
+    VIDEO_ANALYSIS_MODE=os.getenv("VIDEO_ANALYSIS_MODE", "full")
+    VIDEO_KEYFRAME_COUNT=int(os.getenv("VIDEO_KEYFRAME_COUNT", 8))
+    VIDEO_KEYFRAME_SAMPLING=os.getenv("VIDEO_KEYFRAME_SAMPLING", "scene")
+    VIDEO_AUDIO_EXCERPT_SECONDS=float(os.getenv("VIDEO_AUDIO_EXCERPT_SECONDS", 10))
+    VIDEO_KEYFRAME_MIN_CONFIDENCE=float(os.getenv("VIDEO_KEYFRAME_MIN_CONFIDENCE", 0.7))
+
+    # Audio analysis: "whole" sends the file as one request, "segments" scores overlapping windows
+    AUDIO_ANALYSIS_MODE=os.getenv("AUDIO_ANALYSIS_MODE", "whole")
+    AUDIO_SAMPLE_RATE=int(os.getenv("AUDIO_SAMPLE_RATE", 16000))
+    AUDIO_SEGMENT_SECONDS=float(os.getenv("AUDIO_SEGMENT_SECONDS", 30))
+    AUDIO_SEGMENT_OVERLAP_SECONDS=float(os.getenv("AUDIO_SEGMENT_OVERLAP_SECONDS", 5))
+    AUDIO_SEGMENT_CONCURRENCY=int(os.getenv("AUDIO_SEGMENT_CONCURRENCY", 4))
+    AUDIO_SEGMENT_AI_THRESHOLD=float(os.getenv("AUDIO_SEGMENT_AI_THRESHOLD", 0.7))
+
+    # Batch analysis
+    BATCH_MAX_FILES=int(os.getenv("BATCH_MAX_FILES", 50))
+    BATCH_MAX_TOTAL_SIZE=int(os.getenv("BATCH_MAX_TOTAL_SIZE", 500 * 1024 * 1024))
+    BATCH_CONCURRENCY=int(os.getenv("BATCH_CONCURRENCY", 4))
+
+    # Bulk media deletion
+    CLOUDINARY_DELETE_BATCH_SIZE=int(os.getenv("CLOUDINARY_DELETE_BATCH_SIZE", 100))
+    CLOUDINARY_DELETE_CONCURRENCY=int(os.getenv("CLOUDINARY_DELETE_CONCURRENCY", 4))
+
+    # Background media purge queue
+    PURGE_WORKERS=int(os.getenv("PURGE_WORKERS", 2))
+    PURGE_MAX_ATTEMPTS=int(os.getenv("PURGE_MAX_ATTEMPTS", 8))
+    PURGE_BACKOFF_BASE_SECONDS=float(os.getenv("PURGE_BACKOFF_BASE_SECONDS", 5))
+    PURGE_BACKOFF_MAX_SECONDS=float(os.getenv("PURGE_BACKOFF_MAX_SECONDS", 15 * 60))
+    PURGE_LEASE_SECONDS=int(os.getenv("PURGE_LEASE_SECONDS", 5 * 60))
+    PURGE_POLL_SECONDS=float(os.getenv("PURGE_POLL_SECONDS", 2))
+    PURGE_RETENTION_SECONDS=int(os.getenv("PURGE_RETENTION_SECONDS", 7 * 24 * 60 * 60))
+
+    # Server launch (run.py)
+    APP_ENV=os.getenv("APP_ENV", "development")
+    HOST=os.getenv("HOST", "0.0.0.0")
+    PORT=int(os.getenv("PORT", 5001))
+    WEB_WORKERS=int(os.getenv("WEB_WORKERS", os.cpu_count() or 1))
+    KEEP_ALIVE_TIMEOUT_SECONDS=int(os.getenv("KEEP_ALIVE_TIMEOUT_SECONDS", 180))
+    GRACEFUL_SHUTDOWN_TIMEOUT_SECONDS=int(os.getenv("GRACEFUL_SHUTDOWN_TIMEOUT_SECONDS", 300))
+    FORWARDED_ALLOW_IPS=os.getenv("FORWARDED_ALLOW_IPS", "127.0.0.1")
+
+    # Worker processes actually serving requests: run.py only starts WEB_WORKERS of them in production
+    SERVING_WORKERS=WEB_WORKERS if APP_ENV == "production" else 1
+
+    # Prometheus metrics of the worker processes, merged through snapshots in this directory
+    METRICS_DIR=os.getenv("METRICS_DIR", os.path.join(tempfile.gettempdir(), "trueai-metrics"))
+    METRICS_SNAPSHOT_SECONDS=float(os.getenv("METRICS_SNAPSHOT_SECONDS", 5))
+
+    # Admission queue in front of the analyze routes, per worker process
+    ADMISSION_MAX_ACTIVE=int(os.getenv("ADMISSION_MAX_ACTIVE", 16))
+    ADMISSION_MAX_QUEUE=int(os.getenv("ADMISSION_MAX_QUEUE", 64))
+    ADMISSION_QUEUE_TIMEOUT_SECONDS=float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", 30))
+
+    # Fair scheduling of LLM analyses across users, capacity and costs in cost units
+    SCHEDULER_CAPACITY=float(os.getenv("SCHEDULER_CAPACITY", 24))
+    SCHEDULER_COST_IMAGE=float(os.getenv("SCHEDULER_COST_IMAGE", 1))
+    SCHEDULER_COST_AUDIO=float(os.getenv("SCHEDULER_COST_AUDIO", 3))
+    SCHEDULER_COST_VIDEO=float(os.getenv("SCHEDULER_COST_VIDEO", 6))
+    SCHEDULER_COST_PER_MB=float(os.getenv("SCHEDULER_COST_PER_MB", 0.2))
+    SCHEDULER_USER_RATE=float(os.getenv("SCHEDULER_USER_RATE", 1))
+    SCHEDULER_USER_BURST=float(os.getenv("SCHEDULER_USER_BURST", 30))
+
+    # Memory budget of the analyze routes, per worker process
+    UPLOAD_BYTE_BUDGET=int(os.getenv("UPLOAD_BYTE_BUDGET", 512 * 1024 * 1024))
+    UPLOAD_SPOOL_MAX_BYTES=int(os.getenv("UPLOAD_SPOOL_MAX_BYTES", 1024 * 1024))
+    CLOUDINARY_CHUNK_SIZE=int(os.getenv("CLOUDINARY_CHUNK_SIZE", 6 * 1024 * 1024)) # Cloudinary requires at least 5 MB
+
+    # Media up to this size is sent inline in generate_content instead of through the Gemini File API
+    GEMINI_INLINE_MAX_BYTES=int(os.getenv("GEMINI_INLINE_MAX_BYTES", 8 * 1024 * 1024))
+
+    # Background deletion of Gemini files and temp files
+    JANITOR_INTERVAL_SECONDS=float(os.getenv("JANITOR_INTERVAL_SECONDS", 1))
+    JANITOR_BATCH_SIZE=int(os.getenv("JANITOR_BATCH_SIZE", 16))
+    JANITOR_MAX_ATTEMPTS=int(os.getenv("JANITOR_MAX_ATTEMPTS", 6))
+    JANITOR_BACKOFF_BASE_SECONDS=float(os.getenv("JANITOR_BACKOFF_BASE_SECONDS", 2))
+    JANITOR_BACKOFF_MAX_SECONDS=float(os.getenv("JANITOR_BACKOFF_MAX_SECONDS", 300))
+    JANITOR_ORPHAN_AGE_SECONDS=int(os.getenv("JANITOR_ORPHAN_AGE_SECONDS", 3600))
+    JANITOR_DRAIN_TIMEOUT_SECONDS=float(os.getenv("JANITOR_DRAIN_TIMEOUT_SECONDS", 10))
+
+    # Direct uploads from clients to Cloudinary, analyzed by reference
+    DIRECT_UPLOAD_TTL_SECONDS=int(os.getenv("DIRECT_UPLOAD_TTL_SECONDS", 10 * 60))
+    DIRECT_UPLOAD_SWEEP_INTERVAL_SECONDS=int(os.getenv("DIRECT_UPLOAD_SWEEP_INTERVAL_SECONDS", 60 * 60))
+    DIRECT_UPLOAD_SWEEP_AGE_SECONDS=int(os.getenv("DIRECT_UPLOAD_SWEEP_AGE_SECONDS", 60 * 60)) # Past the TTL and the longest analysis
+    DOWNLOAD_TIMEOUT_SECONDS=float(os.getenv("DOWNLOAD_TIMEOUT_SECONDS", 60))
+
+    # Resumable chunked video uploads
+    CHUNKED_UPLOAD_CHUNK_SIZE=int(os.getenv("CHUNKED_UPLOAD_CHUNK_SIZE", 2 * 1024 * 1024))
+    CHUNKED_UPLOAD_TTL_SECONDS=int(os.getenv("CHUNKED_UPLOAD_TTL_SECONDS", 24 * 60 * 60))
+    CHUNKED_UPLOAD_COMPLETE_TIMEOUT_SECONDS=float(os.getenv("CHUNKED_UPLOAD_COMPLETE_TIMEOUT_SECONDS", 120))
@@ -0,0 +1,233 @@
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+
+from app.config import Config
+from app.utils.metrics import ADMISSION_TURNED_AWAY
+
+# Bounds of the Retry-After estimate, in seconds
+MIN_RETRY_AFTER = 1
+MAX_RETRY_AFTER = 120
+
+class AdmissionRejected(Exception):
+    """
+        Raised when a request cannot be admitted, with the number of seconds the client should wait.
+    """
+
+    def __init__(self, retry_after: int):
+        super().__init__(f"Server is busy, retry after {retry_after}s.")
+        self.retry_after = retry_after
+
+class AdmissionQueue:
+    """
+        Bounded admission queue: at most max_active requests run at once, up to max_queue more
+        wait for a slot in arrival order, and anything beyond that is turned away right away.
+        A request that waited longer than queue_timeout is turned away as well.
+
+        Rejections carry a Retry-After estimate from the average time a request holds its slot.
+    """
+
+    def __init__(self, max_active: int, max_queue: int, queue_timeout: float):
+        self.max_active = max_active
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+
+        self._semaphore = asyncio.Semaphore(max_active)
+        self._active = 0
+        self._waiting = 0
+        self._average_seconds = None
+        self._admitted = 0
+        self._rejected = 0
+        self._timed_out = 0
+
+    @asynccontextmanager
+    async def slot(self):
+        """
+            Holds one of the max_active slots for the duration of the block.
+            Raises AdmissionRejected when the queue is full or the wait timed out.
+        """
+
+        if not self._semaphore.locked():
+            # A slot is free, acquire() takes it without suspending
+            await self._semaphore.acquire()
+
+        elif self._waiting >= self.max_queue:
+            self._rejected += 1
+            ADMISSION_TURNED_AWAY.inc(reason="queue_full")
+            raise AdmissionRejected(self.retry_after())
+
+        else:
+            self._waiting += 1
+
+            try:
+                await asyncio.wait_for(self._semaphore.acquire(), timeout=self.queue_timeout)
+            except asyncio.TimeoutError:
+                self._timed_out += 1
+                ADMISSION_TURNED_AWAY.inc(reason="timed_out")
+                raise AdmissionRejected(self.retry_after())
+            finally:
+                self._waiting -= 1
+
+        self._active += 1
+        self._admitted += 1
+        started = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self._active -= 1
+            self._semaphore.release()
+            self._record(time.perf_counter() - started)
+
+    def retry_after(self) -> int:
+        """
+            Seconds until the queue ahead of a new request has likely drained by one slot's worth.
+        """
+
+        if self._average_seconds is None:
+            return MIN_RETRY_AFTER
+
+        estimate = self._average_seconds * (self._waiting + 1) / self.max_active
+        return max(MIN_RETRY_AFTER, min(MAX_RETRY_AFTER, math.ceil(estimate)))
+
+    def stats(self) -> dict:
+        return {
+            "max_active": self.max_active,
+            "max_queue": self.max_queue,
+            "active": self._active,
+            "waiting": self._waiting,
+            "admitted": self._admitted,
+            "rejected": self._rejected,
+            "timed_out": self._timed_out,
+            "average_seconds": round(self._average_seconds, 3) if self._average_seconds is not None else None
+        }
+
+    def _record(self, seconds: float):
+        # Exponentially weighted, so the estimate follows the current load
+        if self._average_seconds is None:
+            self._average_seconds = seconds
+        else:
+            self._average_seconds = 0.9 * self._average_seconds + 0.1 * seconds
+
+class ByteBudget:
+    """
+        Process-wide budget of request bytes: a request reserves its declared size before its body is
+        read and holds it until the response is sent, so the uploads received, spooled and analyzed
+        at once never add up to more than limit bytes. Reservations are granted in arrival order,
+        one larger than the whole budget takes all of it.
+
+        A request that cannot reserve its size within timeout seconds is turned away.
+    """
+
+    def __init__(self, limit: int, timeout: float):
+        self.limit = limit
+        self.timeout = timeout
+
+        self._used = 0
+        self._waiters = deque()
+        self._average_seconds = None
+        self._reserved = 0
+        self._timed_out = 0
+
+    @asynccontextmanager
+    async def reserve(self, size: int):
+        """
+            Holds size bytes of the budget for the duration of the block.
+            Raises AdmissionRejected when they could not be reserved in time.
+        """
+
+        size = min(size, self.limit)
+
+        if not self._waiters and self._used + size <= self.limit:
+            self._used += size
+        else:
+            future = asyncio.get_running_loop().create_future()
+            waiter = (size, future)
+            self._waiters.append(waiter)
+
+            try:
+                await asyncio.wait_for(future, timeout=self.timeout)
+            except BaseException as e:
+                if future.done() and not future.cancelled():
+                    # Granted just as the wait ended
+                    self._release(size)
+                else:
+                    if waiter in self._waiters:
+                        self._waiters.remove(waiter)
+                    self._grant()
+
+                if isinstance(e, asyncio.TimeoutError):
+                    self._timed_out += 1
+                    raise AdmissionRejected(self.retry_after())
+
+                raise
+
+        self._reserved += 1
+        started = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self._release(size)
+            self._record(time.perf_counter() - started)
+
+    def retry_after(self) -> int:
+        """
+            Seconds until the bytes queued ahead of a new request have likely been released.
+        """
+
+        if self._average_seconds is None:
+            return MIN_RETRY_AFTER
+
+        queued = self._used + sum(size for size, _ in self._waiters)
+        estimate = self._average_seconds * queued / self.limit
+        return max(MIN_RETRY_AFTER, min(MAX_RETRY_AFTER, math.ceil(estimate)))
+
+    def stats(self) -> dict:
+        return {
+            "limit_bytes": self.limit,
+            "used_bytes": self._used,
+            "waiting": len(self._waiters),
+            "waiting_bytes": sum(size for size, _ in self._waiters),
+            "reserved": self._reserved,
+            "timed_out": self._timed_out
+        }
+
+    def _release(self, size: int):
+        self._used -= size
+        self._grant()
+
+    def _grant(self):
+        while self._waiters:
+            size, future = self._waiters[0]
+
+            if future.done():
+                # Cancelled, removed by its caller
+                self._waiters.popleft()
+                continue
+
+            if self._used + size > self.limit:
+                return
+
+            self._waiters.popleft()
+            self._used += size
+            future.set_result(None)
+
+    def _record(self, seconds: float):
+        if self._average_seconds is None:
+            self._average_seconds = seconds
+        else:
+            self._average_seconds = 0.9 * self._average_seconds + 0.1 * seconds
+
+admission_queue = AdmissionQueue(
+    Config.ADMISSION_MAX_ACTIVE,
+    Config.ADMISSION_MAX_QUEUE,
+    Config.ADMISSION_QUEUE_TIMEOUT_SECONDS
+)
+
+byte_budget = ByteBudget(
+    Config.UPLOAD_BYTE_BUDGET,
+    Config.ADMISSION_QUEUE_TIMEOUT_SECONDS
+)
@@ -0,0 +1,510 @@
+import asyncio
+import fcntl
+import hashlib
+import json
+import math
+import os
+import re
+import shutil
+import tempfile
+import time
+import uuid
+from typing import AsyncIterator, Optional
+from fastapi import HTTPException
+
+from app.config import Config
+from app.core.cloudinary_client import FOLDERS, upload_video_part
+from app.core.executor import cloudinary_pool
+from app.crud.media_cleanup import delete_public_ids
+from app.utils.logger import logger
+from app.utils.upload_ingest import CHUNK_SIZE, SNIFF_SIZE, SPOOL_PREFIX, sniff_mime_type
+
+UPLOAD_ID_PATTERN = re.compile(r"^[0-9a-f]{32}$")
+
+class ChunkedUploads:
+    """
+        Resumable video uploads in numbered chunks.
+
+        The client creates an upload with its total size and sends the chunks, in any order and as
+        often as needed: a chunk that was already received is acknowledged again, and the status
+        lists the chunks still missing after a dropped connection. While chunks arrive, the received
+        prefix of the video is hashed and sent on to Cloudinary in parts of part_size, so when the
+        last chunk lands the video is already hashed and on Cloudinary and its analysis starts right away.
+
+        An upload is kept on local disk, one directory per upload:
+            session.json   what the upload was created with
+            data           the video, every chunk written at its offset
+            chunks/<n>     SHA-256 of chunk n, written once the chunk is in data
+            progress.json  chunks hashed and bytes sent to Cloudinary so far
+            lock           held by the process moving the hashing and Cloudinary transfer forward
+        so the chunks of one upload can be taken by any worker process of this host.
+    """
+
+    def __init__(self, root: str, chunk_size: int, part_size: int, max_size: int, ttl: int, complete_timeout: float):
+        self.root = root
+        self.chunk_size = chunk_size
+        self.part_size = part_size
+        self.max_size = max_size
+        self.ttl = ttl
+        self.complete_timeout = complete_timeout
+
+        # upload_id -> (hasher, chunks hashed), the hashing progress of this process
+        self._hashers = {}
+        self._tasks = set()
+        self._expirer = None
+
+    async def start(self):
+        os.makedirs(self.root, exist_ok=True)
+        self._expirer = asyncio.create_task(self._expire_loop())
+
+    async def stop(self):
+        tasks = list(self._tasks) + ([self._expirer] if self._expirer else [])
+
+        for task in tasks:
+            task.cancel()
+
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    async def create(self, clerk_user_id: str, email: str, total_size: int) -> dict:
+        """
+            Creates an upload of total_size bytes. Returns its status, with the upload_id and chunk_size to use.
+        """
+
+        if total_size <= 0:
+            raise HTTPException(status_code=400, detail="total_size must be positive.")
+
+        if total_size > self.max_size:
+            raise HTTPException(status_code=413, detail=f"File size exceeds the {self.max_size // (1024 * 1024)}MB limit.")
+
+        upload_id = uuid.uuid4().hex
+
+        session = {
+            "upload_id": upload_id,
+            "clerk_user_id": clerk_user_id,
+            "email": email,
+            "total_size": total_size,
+            "chunk_size": self.chunk_size,
+            "chunk_count": math.ceil(total_size / self.chunk_size),
+            "public_id": f"{FOLDERS['video']}/{upload_id}",
+            "created_at": time.time()
+        }
+
+        await asyncio.to_thread(self._create_files, session)
+        logger.info(f"Created chunked upload {upload_id} of {total_size} bytes.")
+
+        return await self._status(session)
+
+    async def put_chunk(self, upload_id: str, index: int, body: AsyncIterator[bytes], checksum: Optional[str] = None) -> dict:
+        """
+            Stores chunk index of the upload, checked against its SHA-256 checksum when one is given.
+            Returns the status of the upload.
+        """
+
+        session = await self._load(upload_id)
+
+        if not 0 <= index < session["chunk_count"]:
+            raise HTTPException(status_code=400, detail=f"Chunk index must be between 0 and {session['chunk_count'] - 1}.")
+
+        expected = min(session["chunk_size"], session["total_size"] - index * session["chunk_size"])
+        data = bytearray()
+
+        async for piece in body:
+            data += piece
+
+            if len(data) > expected:
+                break
+
+        if len(data) != expected:
+            raise HTTPException(status_code=400, detail=f"Chunk {index} must be {expected} bytes.")
+
+        digest = hashlib.sha256(data).hexdigest()
+
+        if checksum and checksum.lower() != digest:
+            raise HTTPException(status_code=400, detail=f"Checksum of chunk {index} does not match, send it again.")
+
+        received = await asyncio.to_thread(self._read_text, self._path(upload_id, "chunks", str(index)))
+
+        if received is None:
+            await asyncio.to_thread(self._write_chunk, session, index, bytes(data), digest)
+        elif received != digest:
+            raise HTTPException(status_code=409, detail=f"Chunk {index} was already received with different content.")
+
+        task = asyncio.create_task(self._advance(session))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+        return await self._status(session)
+
+    async def status(self, upload_id: str) -> dict:
+        return await self._status(await self._load(upload_id))
+
+    async def complete(self, upload_id: str) -> dict:
+        """
+            Waits until every chunk is hashed and on Cloudinary, then hands the video over to the caller,
+            who deletes it once it is analyzed. The upload is gone afterwards.
+
+            Returns {"path", "size", "sha256", "mime_type", "media_type", "upload_response", "clerk_user_id", "email"}.
+        """
+
+        session = await self._load(upload_id)
+        deadline = time.monotonic() + self.complete_timeout
+
+        while True:
+            missing = await asyncio.to_thread(self._missing, session)
+
+            if missing:
+                raise HTTPException(status_code=409, detail=f"{len(missing)} chunks are missing, starting with chunk {missing[0]}.")
+
+            await self._advance(session)
+            progress = await self._progress(upload_id)
+
+            if progress.get("error"):
+                await self._abandon(session)
+                raise HTTPException(status_code=progress["error"]["status"], detail=progress["error"]["detail"])
+
+            if progress.get("sha256"):
+                break
+
+            if time.monotonic() > deadline:
+                raise HTTPException(status_code=504, detail="The upload is still being processed, please retry.")
+
+            await asyncio.sleep(0.5)
+
+        # Moving the video out makes sure only one completion gets it
+        temp_file_path = os.path.join(tempfile.gettempdir(), f"{SPOOL_PREFIX}{upload_id}")
+
+        try:
+            await asyncio.to_thread(os.replace, self._path(upload_id, "data"), temp_file_path)
+        except FileNotFoundError:
+            raise HTTPException(status_code=404, detail="Upload not found.")
+
+        await self._discard(upload_id)
+
+        return {
+            "path": temp_file_path,
+            "size": session["total_size"],
+            "sha256": progress["sha256"],
+            "mime_type": progress["mime_type"],
+            "media_type": "video",
+            "upload_response": progress["upload_response"],
+            "clerk_user_id": session["clerk_user_id"],
+            "email": session["email"]
+        }
+
+    def _path(self, upload_id: str, *parts: str) -> str:
+        return os.path.join(self.root, upload_id, *parts)
+
+    async def _load(self, upload_id: str) -> dict:
+        if not UPLOAD_ID_PATTERN.match(upload_id):
+            raise HTTPException(status_code=404, detail="Upload not found.")
+
+        text = await asyncio.to_thread(self._read_text, self._path(upload_id, "session.json"))
+
+        if text is None:
+            raise HTTPException(status_code=404, detail="Upload not found.")
+
+        session = json.loads(text)
+
+        if session["created_at"] + self.ttl < time.time():
+            raise HTTPException(status_code=410, detail="The upload expired, please start again.")
+
+        return session
+
+    async def _status(self, session: dict) -> dict:
+        progress, missing = await asyncio.to_thread(self._read_status, session)
+
+        return {
+            "upload_id": session["upload_id"],
+            "total_size": session["total_size"],
+            "chunk_size": session["chunk_size"],
+            "chunk_count": session["chunk_count"],
+            "received_chunks": session["chunk_count"] - len(missing),
+            "missing_chunks": missing,
+            "hashed_bytes": min(progress.get("hashed_chunks", 0) * session["chunk_size"], session["total_size"]),
+            "uploaded_bytes": progress.get("uploaded_bytes", 0),
+            "ready": bool(progress.get("sha256")),
+            "expires_at": int(session["created_at"] + self.ttl)
+        }
+
+    def _missing(self, session: dict) -> list:
+        try:
+            received = {int(name) for name in os.listdir(self._path(session["upload_id"], "chunks")) if name.isdigit()}
+        except FileNotFoundError:
+            received = set()
+
+        return [index for index in range(session["chunk_count"]) if index not in received]
+
+    def _read_status(self, session: dict) -> tuple:
+        return self._read_progress(session["upload_id"]), self._missing(session)
+
+    def _read_progress(self, upload_id: str) -> dict:
+        text = self._read_text(self._path(upload_id, "progress.json"))
+        return json.loads(text) if text else {}
+
+    async def _progress(self, upload_id: str) -> dict:
+        return await asyncio.to_thread(self._read_progress, upload_id)
+
+    async def _save_progress(self, upload_id: str, progress: dict):
+        await asyncio.to_thread(self._write_text, self._path(upload_id, "progress.json"), json.dumps(progress))
+
+    def _create_files(self, session: dict):
+        upload_id = session["upload_id"]
+        os.makedirs(self._path(upload_id, "chunks"))
+
+        # Sparse until the chunks are written
+        with open(self._path(upload_id, "data"), "wb") as data:
+            data.truncate(session["total_size"])
+
+        self._write_text(self._path(upload_id, "session.json"), json.dumps(session))
+
+    def _write_chunk(self, session: dict, index: int, data: bytes, digest: str):
+        fd = os.open(self._path(session["upload_id"], "data"), os.O_WRONLY)
+
+        try:
+            os.pwrite(fd, data, index * session["chunk_size"])
+        finally:
+            os.close(fd)
+
+        self._write_text(self._path(session["upload_id"], "chunks", str(index)), digest)
+
+    def _read(self, upload_id: str, offset: int, length: int) -> bytes:
+        fd = os.open(self._path(upload_id, "data"), os.O_RDONLY)
+
+        try:
+            return os.pread(fd, length, offset)
+        finally:
+            os.close(fd)
+
+    def _read_text(self, path: str) -> Optional[str]:
+        try:
+            with open(path) as file:
+                return file.read()
+        except FileNotFoundError:
+            return None
+
+    def _write_text(self, path: str, text: str):
+        # Written under a unique name and renamed, so readers never see a partial file
+        temp_path = f"{path}.{uuid.uuid4().hex}.tmp"
+
+        with open(temp_path, "w") as file:
+            file.write(text)
+
+        os.replace(temp_path, path)
+
+    def _try_lock(self, upload_id: str):
+        try:
+            lock = open(self._path(upload_id, "lock"), "a")
+        except FileNotFoundError:
+            return None
+
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return lock
+        except BlockingIOError:
+            lock.close()
+            return None
+
+    async def _advance(self, session: dict):
+        """
+            Moves the hashing and the Cloudinary transfer forward over the chunks received so far,
+            unless another task or process is already doing so.
+        """
+
+        upload_id = session["upload_id"]
+
+        while True:
+            lock = await asyncio.to_thread(self._try_lock, upload_id)
+
+            if lock is None:
+                return
+
+            try:
+                await self._consume(session)
+            except Exception as e:
+                # Picked up again with the next chunk or by the completion
+                logger.warning(f"Chunked upload {upload_id} could not move forward. Error: {e}")
+                return
+            finally:
+                await asyncio.to_thread(lock.close)
+
+            # A chunk that arrived while the lock was held is taken here
+            progress = await self._progress(upload_id)
+            hashed = progress.get("hashed_chunks", 0)
+
+            if progress.get("sha256") or progress.get("error") or hashed >= session["chunk_count"]:
+                return
+
+            if not await asyncio.to_thread(os.path.exists, self._path(upload_id, "chunks", str(hashed))):
+                return
+
+    async def _consume(self, session: dict):
+        upload_id = session["upload_id"]
+        chunk_size, total_size, chunk_count = session["chunk_size"], session["total_size"], session["chunk_count"]
+
+        progress = await self._progress(upload_id)
+
+        if progress.get("sha256") or progress.get("error"):
+            return
+
+        hashed = progress.get("hashed_chunks", 0)
+        uploaded = progress.get("uploaded_bytes", 0)
+        hasher = await self._hasher(session, hashed)
+        response = None
+
+        while True:
+            moved = False
+
+            if hashed < chunk_count and await asyncio.to_thread(os.path.exists, self._path(upload_id, "chunks", str(hashed))):
+                offset = hashed * chunk_size
+                data = await asyncio.to_thread(self._read, upload_id, offset, min(chunk_size, total_size - offset))
+
+                if hashed == 0:
+                    mime_type = sniff_mime_type(data[:SNIFF_SIZE])
+
+                    if not mime_type or not mime_type.startswith("video/"):
+                        progress["error"] = {"status": 415, "detail": "Unsupported file type. Expected a supported video format."}
+                        await self._save_progress(upload_id, progress)
+                        return
+
+                    progress["mime_type"] = mime_type
+
+                hasher.update(data)
+                hashed += 1
+                self._hashers[upload_id] = (hasher, hashed)
+                moved = True
+
+            # Cloudinary takes parts of at least 5 MB, only the last one can be smaller
+            received = min(hashed * chunk_size, total_size)
+            part_end = min(uploaded + self.part_size, received)
+
+            if part_end - uploaded == self.part_size or (part_end == total_size and uploaded < total_size):
+                data = await asyncio.to_thread(self._read, upload_id, uploaded, part_end - uploaded)
+                response = await cloudinary_pool.run(
+                    upload_video_part, data, uploaded, total_size, upload_id, session["public_id"]
+                )
+                uploaded = part_end
+                moved = True
+
+            if not moved:
+                break
+
+            progress.update(hashed_chunks=hashed, uploaded_bytes=uploaded)
+
+            # Saved together with the last part, so a crash cannot leave an upload that is sent but never ready
+            if uploaded == total_size:
+                progress.update(sha256=hasher.hexdigest(), upload_response=response)
+
+            await self._save_progress(upload_id, progress)
+
+            if uploaded == total_size:
+                logger.info(f"Chunked upload {upload_id} is hashed and on Cloudinary: {response.get('secure_url')}")
+                return
+
+    async def _hasher(self, session: dict, hashed: int):
+        upload_id = session["upload_id"]
+        cached = self._hashers.get(upload_id)
+
+        if cached and cached[1] == hashed:
+            return cached[0]
+
+        # The chunks so far were hashed by another process, hash them again here
+        hasher = hashlib.sha256()
+        await asyncio.to_thread(self._hash_prefix, upload_id, hasher, min(hashed * session["chunk_size"], session["total_size"]))
+
+        self._hashers[upload_id] = (hasher, hashed)
+        return hasher
+
+    def _hash_prefix(self, upload_id: str, hasher, size: int):
+        with open(self._path(upload_id, "data"), "rb") as data:
+            while size > 0:
+                piece = data.read(min(CHUNK_SIZE, size))
+
+                if not piece:
+                    break
+
+                hasher.update(piece)
+                size -= len(piece)
+
+    async def _discard(self, upload_id: str):
+        self._hashers.pop(upload_id, None)
+        await asyncio.to_thread(shutil.rmtree, self._path(upload_id), True)
+
+    async def _abandon(self, session: dict) -> bool:
+        """
+            Removes an upload that will never be completed, deleting whatever of it reached Cloudinary.
+            Returns False, keeping the upload for another try, when the Cloudinary delete failed.
+        """
+
+        upload_id = session["upload_id"]
+        progress = await self._progress(upload_id)
+
+        # Once any chunk was consumed a part may have reached Cloudinary, even if progress.json does not show it yet
+        if progress:
+            reports = await delete_public_ids({"video": [session["public_id"]]})
+
+            if any(report["error"] for report in reports):
+                return False
+
+            logger.info(f"Deleted Cloudinary asset {session['public_id']} of abandoned chunked upload {upload_id}.")
+
+        await self._discard(upload_id)
+        return True
+
+    async def _expire_loop(self):
+        while True:
+            try:
+                expired = await asyncio.to_thread(self._expired)
+                removed = 0
+
+                for upload_id, session in expired:
+                    if session:
+                        removed += await self._abandon(session)
+                    else:
+                        await self._discard(upload_id)
+                        removed += 1
+
+                if removed:
+                    logger.info(f"Removed {removed} expired chunked uploads.")
+
+            except Exception as e:
+                logger.error(f"Failed to remove expired chunked uploads: {e}")
+
+            await asyncio.sleep(min(self.ttl, 300))
+
+    def _expired(self) -> list:
+        expired = []
+        now = time.time()
+
+        for upload_id in os.listdir(self.root):
+            try:
+                session = json.loads(self._read_text(self._path(upload_id, "session.json")) or "null")
+            except ValueError:
+                session = None
+
+            created_at = session["created_at"] if session else None
+
+            # Without a readable session.json, the directory's age is used
+            if created_at is None:
+                try:
+                    created_at = os.path.getmtime(self._path(upload_id))
+                except FileNotFoundError:
+                    continue
+
+            if created_at + self.ttl < now:
+                expired.append((upload_id, session))
+
+        # Uploads completed or removed by another process
+        for upload_id in list(self._hashers):
+            if not os.path.exists(self._path(upload_id)):
+                self._hashers.pop(upload_id, None)
+
+        return expired
+
+chunked_uploads = ChunkedUploads(
+    os.path.join(tempfile.gettempdir(), "trueai_uploads"),
+    Config.CHUNKED_UPLOAD_CHUNK_SIZE,
+    Config.CLOUDINARY_CHUNK_SIZE,
+    Config.MAX_FILE_SIZE,
+    Config.CHUNKED_UPLOAD_TTL_SECONDS,
+    Config.CHUNKED_UPLOAD_COMPLETE_TIMEOUT_SECONDS
+)
@@ -1,8 +1,13 @@
+import time
+from datetime import datetime
 import cloudinary
+import cloudinary.api
 import cloudinary.uploader
+import cloudinary.utils
 
 from app.config import Config
 from app.utils.logger import logger
+from app.utils.metrics import BYTES, track_stage
 
 cloudinary.config(
     cloud_name = Config.CLOUDINARY_CLOUD_NAME,
@@ -10,35 +15,72 @@ cloudinary.config(
     api_secret = Config.CLOUDINARY_API_SECRET
 )
 
-def upload_image(file_path: str) -> str:
+# Folder and resource_type of each media type, Cloudinary stores audio as "video"
+FOLDERS = {"image": "TrueAI/images", "video": "TrueAI/videos", "audio": "TrueAI/audios"}
+RESOURCE_TYPES = {"image": "image", "video": "video", "audio": "video"}
+
+def direct_upload_folder(media_type: str) -> str:
+    # Clients upload straight to Cloudinary under <folder>/direct/<user id>/
+    return f"{FOLDERS[media_type]}/direct/"
+
+def upload_image(file_path: str) -> dict:
     """
         Uploads image to Cloudinary.
+        Returns the Cloudinary upload response (secure_url, public_id, resource_type, ...).
     """
 
     folder_name = "TrueAI/images"
-    response = cloudinary.uploader.upload(file_path, folder = folder_name, resource_type = "image")
-    return response["secure_url"]
 
-def upload_video(file_path: str) -> str:
+    with track_stage("cloudinary_upload", "image"):
+        response = cloudinary.uploader.upload(file_path, folder = folder_name, resource_type = "image")
+
+    BYTES.inc(response.get("bytes", 0), direction="cloudinary", media_type="image")
+    return response
+
+def upload_video(file_path: str) -> dict:
     """
-        Uploads video to Cloudinary.
+        Uploads video to Cloudinary, in chunks so at most one chunk of it is held in memory.
+        Returns the Cloudinary upload response (secure_url, public_id, resource_type, ...).
     """
 
     folder_name = "TrueAI/videos"
-    response = cloudinary.uploader.upload(file_path, folder = folder_name, resource_type = "video")
-    return response["secure_url"]
 
-def upload_audio(file_path: str) -> str:
+    with track_stage("cloudinary_upload", "video"):
+        response = cloudinary.uploader.upload_large(file_path, folder = folder_name, resource_type = "video", chunk_size = Config.CLOUDINARY_CHUNK_SIZE)
+
+    BYTES.inc(response.get("bytes", 0), direction="cloudinary", media_type="video")
+    return response
+
+def upload_video_part(data: bytes, start: int, total_size: int, upload_id: str, public_id: str) -> dict:
+    """
+        Uploads one part of a video that is uploaded in parts, identified by upload_id.
+        Parts must be sent in order and every part but the last must be at least 5 MB.
+        Returns the Cloudinary upload response, complete (secure_url, ...) once the last part is in.
+    """
+
+    headers = {"Content-Range": f"bytes {start}-{start + len(data) - 1}/{total_size}", "X-Unique-Upload-Id": upload_id}
+
+    with track_stage("cloudinary_upload_part", "video"):
+        response = cloudinary.uploader.upload_large_part(("video", data), http_headers=headers, public_id=public_id, resource_type="video")
+
+    BYTES.inc(len(data), direction="cloudinary", media_type="video")
+    return response
+
+def upload_audio(file_path: str) -> dict:
     """
         Uploads audio to Cloudinary.
         Only .mp3 and .wav formats are supported.
+        Returns the Cloudinary upload response (secure_url, public_id, resource_type, ...).
     """
 
     folder_name = "TrueAI/audios"
 
     # Cloudinary uses resource_type "video" to store audio files.
-    response = cloudinary.uploader.upload_large(file_path, folder = folder_name, resource_type = "video")
-    return response["secure_url"]
+    with track_stage("cloudinary_upload", "audio"):
+        response = cloudinary.uploader.upload_large(file_path, folder = folder_name, resource_type = "video", chunk_size = Config.CLOUDINARY_CHUNK_SIZE)
+
+    BYTES.inc(response.get("bytes", 0), direction="cloudinary", media_type="audio")
+    return response
 
 def delete_resource(public_id: str, resource_type: str) -> dict:
     """
@@ -54,3 +96,69 @@ def delete_resource(public_id: str, resource_type: str) -> dict:
     except Exception as e:
         logger.error(f"Failed to delete resource with public_id: {public_id}. Error: {e}")
         return None
+
+def delete_resources(public_ids: list, resource_type: str) -> dict:
+    """
+        Deletes up to 100 images, videos or audios from Cloudinary in one Admin API call.
+        Returns the per public_id status ("deleted", "not_found", ...).
+    """
+
+    with track_stage("cloudinary_delete", resource_type):
+        response = cloudinary.api.delete_resources(public_ids, resource_type=resource_type, type="upload")
+
+    logger.info(f"Deleted {len(public_ids)} {resource_type} resources from Cloudinary.")
+    return response.get("deleted", {})
+
+def get_resources(public_ids: list, resource_type: str) -> list:
+    """
+        Looks up up to 100 images, videos or audios in one Admin API call.
+        Returns the resource details (public_id, bytes, secure_url, ...) of those that exist.
+    """
+
+    response = cloudinary.api.resources_by_ids(public_ids, resource_type=resource_type, type="upload", max_results=len(public_ids))
+    return response.get("resources", [])
+
+def list_resources(prefix: str, resource_type: str, next_cursor: str = None) -> tuple:
+    """
+        Lists up to 500 images, videos or audios whose public_id starts with prefix in one Admin API call.
+        Returns (resources, next_cursor), next_cursor is None on the last page.
+    """
+
+    with track_stage("cloudinary_lookup", resource_type):
+        response = cloudinary.api.resources(
+            type="upload", prefix=prefix, resource_type=resource_type, max_results=500, next_cursor=next_cursor
+        )
+
+    return response.get("resources", []), response.get("next_cursor")
+
+def created_at(resource: dict) -> float:
+    """
+        Returns when the resource was uploaded, as a Unix timestamp.
+    """
+
+    return datetime.fromisoformat(resource["created_at"].replace("Z", "+00:00")).timestamp()
+
+def get_resource(public_id: str, resource_type: str) -> dict:
+    """
+        Looks up one image, video or audio.
+        Returns its details (bytes, secure_url, etag, created_at, ...), raises cloudinary.exceptions.NotFound if it does not exist.
+    """
+
+    with track_stage("cloudinary_lookup", resource_type):
+        return cloudinary.api.resource(public_id, resource_type=resource_type, type="upload")
+
+def sign_upload(public_id: str, resource_type: str) -> dict:
+    """
+        Signs the parameters of one direct upload from a client to Cloudinary.
+        The signature only allows an upload to the given public_id.
+        Returns the fields to post along with the file and the URL to post them to.
+    """
+
+    params = {"public_id": public_id, "timestamp": int(time.time())}
+
+    return {
+        **params,
+        "signature": cloudinary.utils.api_sign_request(params, Config.CLOUDINARY_API_SECRET),
+        "api_key": Config.CLOUDINARY_API_KEY,
+        "upload_url": cloudinary.utils.cloudinary_api_url("upload", resource_type=resource_type)
+    }
@@ -0,0 +1,128 @@
+import asyncio
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from functools import partial
+
+from app.config import Config
+from app.utils.logger import logger
+
+class PoolSaturatedError(Exception):
+    """
+        Raised when an offload pool already has its maximum number of calls waiting.
+    """
+
+class OffloadPool:
+    """
+        Runs blocking SDK calls on a dedicated thread pool so the event loop stays responsive.
+        Every backend (Cloudinary, Gemini) gets its own pool, so a slow backend cannot starve the other.
+    """
+
+    def __init__(self, name: str, max_workers: int, max_queue: int):
+        self.name = name
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix=f"{name}-pool")
+        self._lock = threading.Lock()
+        self._queued = 0
+        self._active = 0
+        self._completed = 0
+        self._failed = 0
+        self._rejected = 0
+
+    async def run(self, func, *args, **kwargs):
+        """
+            Runs func(*args, **kwargs) on the pool and awaits its result.
+        """
+
+        return await self._await(self._submit(func, *args, **kwargs))
+
+    async def run_with_cleanup(self, cleanup, func, *args, **kwargs):
+        """
+            Like run(), but if the caller is cancelled after the call has already started,
+            cleanup(result) is queued on the pool once the call finishes.
+            Used for calls that create remote state, e.g. an upload that would otherwise be orphaned.
+        """
+
+        return await self._await(self._submit(func, *args, **kwargs), cleanup)
+
+    def _submit(self, func, *args, **kwargs) -> Future:
+        with self._lock:
+            if self._queued >= self.max_queue:
+                self._rejected += 1
+                raise PoolSaturatedError(f"{self.name} pool is saturated ({self._queued} calls waiting).")
+            self._queued += 1
+
+        return self._executor.submit(partial(self._call, func, *args, **kwargs))
+
+    async def _await(self, future: Future, cleanup=None):
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            # A call that never started will never decrement the queue itself
+            if future.cancel():
+                with self._lock:
+                    self._queued -= 1
+            elif cleanup:
+                future.add_done_callback(partial(self._run_cleanup, cleanup))
+            raise
+
+    def _run_cleanup(self, cleanup, future: Future):
+        if future.cancelled() or future.exception():
+            return
+
+        try:
+            self._executor.submit(cleanup, future.result())
+        except RuntimeError as e:
+            logger.error(f"Could not schedule cleanup after cancelled {self.name} call: {e}")
+
+    def _call(self, func, *args, **kwargs):
+        with self._lock:
+            self._queued -= 1
+            self._active += 1
+
+        try:
+            result = func(*args, **kwargs)
+        except BaseException:
+            with self._lock:
+                self._failed += 1
+            raise
+        finally:
+            with self._lock:
+                self._active -= 1
+                self._completed += 1
+
+        return result
+
+    def stats(self) -> dict:
+        """
+            Snapshot of the pool size, queue depth and call counters.
+        """
+
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "max_queue": self.max_queue,
+                "queued": self._queued,
+                "active": self._active,
+                "completed": self._completed,
+                "failed": self._failed,
+                "rejected": self._rejected
+            }
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+        logger.info(f"Shut down {self.name} offload pool.")
+
+cloudinary_pool = OffloadPool("cloudinary", Config.CLOUDINARY_POOL_SIZE, Config.OFFLOAD_MAX_QUEUE)
+gemini_pool = OffloadPool("gemini", Config.GEMINI_POOL_SIZE, Config.OFFLOAD_MAX_QUEUE)
+
+def get_pool_stats() -> dict:
+    """
+        Returns queue-depth metrics for all offload pools.
+    """
+
+    return {
+        cloudinary_pool.name: cloudinary_pool.stats(),
+        gemini_pool.name: gemini_pool.stats()
+    }
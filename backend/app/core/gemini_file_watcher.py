@@ -0,0 +1,165 @@
+import asyncio
+import google.generativeai as genai
+
+from app.config import Config
+from app.core.executor import gemini_pool
+from app.utils.logger import logger
+
+class GeminiFileError(Exception):
+    """
+        Raised when Gemini fails to process an uploaded file, or it does not become ACTIVE in time.
+    """
+
+class _PendingFile:
+    def __init__(self, future: asyncio.Future, deadline: float, interval: float, next_poll: float):
+        self.future = future
+        self.deadline = deadline
+        self.interval = interval
+        self.next_poll = next_poll
+
+class GeminiFileWatcher:
+    """
+        Tracks every uploaded Gemini file that is still PROCESSING and resolves a future for it
+        the moment it turns ACTIVE or FAILED.
+
+        A single background task does the polling for all pending files. Each file is polled with
+        adaptive backoff (fast at first, slower for files that take long) and has its own deadline.
+        Files that are due at once are polled concurrently with one get_file() call each, a failed
+        poll only delays the file it was for.
+    """
+
+    def __init__(
+        self,
+        initial_interval: float,
+        max_interval: float,
+        backoff: float,
+        timeout: float
+    ):
+        self.initial_interval = initial_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.timeout = timeout
+
+        self._pending = {}
+        self._task = None
+        self._wakeup = asyncio.Event()
+        self._polls = 0
+        self._poll_errors = 0
+        self._failed = 0
+        self._timed_out = 0
+
+    async def wait_until_active(self, file, timeout: float = None):
+        """
+            Returns the file once Gemini has processed it.
+            Raises GeminiFileError if processing failed or did not finish within the timeout.
+        """
+
+        if file.state.name == "ACTIVE":
+            return file
+
+        if file.state.name == "FAILED":
+            self._failed += 1
+            raise GeminiFileError(f"Gemini failed to process file {file.name}.")
+
+        loop = asyncio.get_running_loop()
+        now = loop.time()
+        future = loop.create_future()
+
+        self._pending[file.name] = _PendingFile(
+            future,
+            deadline=now + (timeout or self.timeout),
+            interval=self.initial_interval,
+            next_poll=now + self.initial_interval
+        )
+
+        if not self._task or self._task.done():
+            self._task = asyncio.create_task(self._run())
+        else:
+            self._wakeup.set()
+
+        try:
+            return await future
+        finally:
+            self._pending.pop(file.name, None)
+
+    def stats(self) -> dict:
+        return {
+            "pending": len(self._pending),
+            "polls": self._polls,
+            "poll_errors": self._poll_errors,
+            "failed": self._failed,
+            "timed_out": self._timed_out
+        }
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+
+        while self._pending:
+            now = loop.time()
+            due = [name for name, pending in self._pending.items() if pending.next_poll <= now]
+
+            if due:
+                files = await self._fetch(due)
+                now = loop.time()
+
+                for name in due:
+                    pending = self._pending.get(name)
+
+                    if pending and not pending.future.done():
+                        self._check(name, pending, files.get(name), now)
+
+            if not self._pending:
+                break
+
+            delay = max(0.0, min(pending.next_poll for pending in self._pending.values()) - loop.time())
+            self._wakeup.clear()
+
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=delay)
+            except asyncio.TimeoutError:
+                pass
+
+    async def _fetch(self, names: list) -> dict:
+        """
+            Fetches the current state of the given files, each with its own get_file() call.
+            Files whose poll failed are left out.
+        """
+
+        self._polls += len(names)
+        results = await asyncio.gather(*(gemini_pool.run(genai.get_file, name) for name in names), return_exceptions=True)
+        files = {}
+
+        for name, result in zip(names, results):
+            if isinstance(result, Exception):
+                # Keep the file pending, it is polled again after its next interval
+                self._poll_errors += 1
+                logger.warning(f"Failed to poll Gemini file {name}: {result}")
+            else:
+                files[name] = result
+
+        return files
+
+    def _check(self, name: str, pending: _PendingFile, file, now: float):
+        state = file.state.name if file else None
+
+        if state == "ACTIVE":
+            pending.future.set_result(file)
+
+        elif state == "FAILED":
+            self._failed += 1
+            pending.future.set_exception(GeminiFileError(f"Gemini failed to process file {name}."))
+
+        elif now >= pending.deadline:
+            self._timed_out += 1
+            pending.future.set_exception(GeminiFileError(f"Gemini file {name} was not processed in time."))
+
+        else:
+            pending.interval = min(pending.interval * self.backoff, self.max_interval)
+            pending.next_poll = min(now + pending.interval, pending.deadline)
+
+gemini_file_watcher = GeminiFileWatcher(
+    Config.GEMINI_FILE_POLL_INITIAL_SECONDS,
+    Config.GEMINI_FILE_POLL_MAX_SECONDS,
+    Config.GEMINI_FILE_POLL_BACKOFF,
+    Config.GEMINI_FILE_ACTIVE_TIMEOUT_SECONDS
+)
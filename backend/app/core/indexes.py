@@ -0,0 +1,167 @@
+import asyncio
+import sys
+from bson import ObjectId
+from datetime import datetime
+from pymongo import ASCENDING, DESCENDING
+from pymongo.errors import OperationFailure
+
+from app.config import Config
+from app.core.database import db
+from app.utils.logger import logger
+
+# Indexes the route queries rely on, per collection, as (keys, options)
+INDEXES = {
+    "chats": [
+        ([("user_email", ASCENDING), ("created_at", DESCENDING), ("_id", DESCENDING)], {}),
+        ([("clerk_user_id", ASCENDING)], {}),
+        ([("purge_id", ASCENDING)], {"sparse": True})
+    ],
+    "messages": [
+        ([("chat_id", ASCENDING), ("created_at", ASCENDING), ("_id", ASCENDING)], {}),
+        ([("id", ASCENDING)], {"unique": True})
+    ],
+    "verdict_cache": [
+        ([("created_at", ASCENDING)], {"expireAfterSeconds": Config.VERDICT_CACHE_TTL_SECONDS}),
+        ([("url", ASCENDING)], {})
+    ],
+    "image_phashes": [
+        ([("phash", ASCENDING)], {"unique": True})
+    ],
+    "analysis_jobs": [
+        ([("created_at", ASCENDING)], {"expireAfterSeconds": Config.JOB_TTL_SECONDS}),
+        ([("status", ASCENDING), ("host", ASCENDING), ("updated_at", ASCENDING)], {})
+    ],
+    "media": [
+        ([("chat_id", ASCENDING), ("public_id", ASCENDING)], {"unique": True}),
+        ([("user_email", ASCENDING)], {}),
+        ([("clerk_user_id", ASCENDING)], {}),
+        ([("public_id", ASCENDING)], {}),
+        ([("sha256", ASCENDING)], {"sparse": True})
+    ],
+    "purge_queue": [
+        ([("finished_at", ASCENDING)], {"expireAfterSeconds": Config.PURGE_RETENTION_SECONDS}),
+        ([("status", ASCENDING), ("next_attempt_at", ASCENDING)], {}),
+        ([("status", ASCENDING), ("lease_until", ASCENDING)], {}),
+        ([("status", ASCENDING), ("created_at", ASCENDING)], {})
+    ]
+}
+
+# Representative filters of every indexed route query, checked with explain() by check_query_plans().
+# Queries that are meant to read a whole collection (loading the pHash index) are left out.
+QUERY_CHECKS = [
+    ("chat history", "chats", {"user_email": "user@example.com", "deleted_at": None}, [("created_at", -1), ("_id", -1)]),
+    ("chat history page", "chats", {
+        "user_email": "user@example.com",
+        "deleted_at": None,
+        "$or": [
+            {"created_at": {"$lt": datetime(2025, 1, 1)}},
+            {"created_at": datetime(2025, 1, 1), "_id": {"$lt": ObjectId()}}
+        ]
+    }, [("created_at", -1), ("_id", -1)]),
+    ("chat messages", "messages", {"chat_id": {"$in": ["0123"]}}, [("chat_id", 1), ("created_at", 1), ("_id", 1)]),
+    ("chat messages page", "messages", {
+        "chat_id": "0123",
+        "$or": [
+            {"created_at": {"$lt": datetime(2025, 1, 1)}},
+            {"created_at": datetime(2025, 1, 1), "_id": {"$lt": ObjectId()}}
+        ]
+    }, [("created_at", -1), ("_id", -1)]),
+    ("chat by id", "chats", {"_id": ObjectId(), "deleted_at": None}, None),
+    ("delete chat", "chats", {"_id": ObjectId(), "user_email": "user@example.com", "deleted_at": None}, None),
+    ("chats of clerk user", "chats", {"clerk_user_id": "user_123", "deleted_at": None}, None),
+    ("media of chats", "media", {"chat_id": {"$in": ["0123"]}}, None),
+    ("media references", "media", {"public_id": {"$in": ["TrueAI/images/a"]}, "deleted_at": None}, None),
+    ("storage of user", "media", {"user_email": "user@example.com", "deleted_at": None}, None),
+    ("media by content hash", "media", {"sha256": "0123456789abcdef"}, None),
+    ("verdict cache by key", "verdict_cache", {"_id": "image:model:hash"}, None),
+    ("verdict cache by url", "verdict_cache", {"url": {"$in": ["https://res.cloudinary.com/demo/a.png"]}}, None),
+    ("perceptual hash", "image_phashes", {"phash": "0123456789abcdef"}, None),
+    ("job by id", "analysis_jobs", {"_id": "job"}, None),
+    ("stale jobs", "analysis_jobs", {"status": "running", "updated_at": {"$lt": datetime(2025, 1, 1)}}, None),
+    ("queued jobs of host", "analysis_jobs", {"status": "queued", "host": "host"}, None),
+    ("chats of purge", "chats", {"purge_id": "chat:0123"}, None),
+    ("due purges", "purge_queue", {"status": "queued", "next_attempt_at": {"$lte": datetime(2025, 1, 1)}}, None),
+    ("expired purge leases", "purge_queue", {"status": "running", "lease_until": {"$lt": datetime(2025, 1, 1)}}, None),
+    ("oldest pending purge", "purge_queue", {"status": {"$in": ["queued", "running"]}}, [("created_at", 1)])
+]
+
+async def ensure_indexes():
+    """
+        Creates the declared indexes. Creating an index that already exists is a no-op,
+        a TTL index whose expiry setting changed is updated in place.
+    """
+
+    for collection, indexes in INDEXES.items():
+        for keys, options in indexes:
+            try:
+                name = await db[collection].create_index(keys, **options)
+            except OperationFailure:
+                if "expireAfterSeconds" not in options:
+                    raise
+
+                await db.command(
+                    "collMod", collection,
+                    index={"keyPattern": dict(keys), "expireAfterSeconds": options["expireAfterSeconds"]}
+                )
+                name = f"{keys[0][0]}_1 (TTL updated)"
+
+            logger.info(f"Ensured index {name} on {collection}.")
+
+def _plan_stages(plan: dict):
+    """
+        Yields every stage name of an explain() plan tree.
+    """
+
+    yield plan.get("stage")
+
+    for key in ("inputStage", "queryPlan"):
+        if key in plan:
+            yield from _plan_stages(plan[key])
+
+    for child in plan.get("inputStages", []):
+        yield from _plan_stages(child)
+
+async def check_query_plans() -> list:
+    """
+        Runs explain() on every query in QUERY_CHECKS and returns the names of those whose
+        winning plan contains a COLLSCAN.
+    """
+
+    collscans = []
+
+    for name, collection, query, sort in QUERY_CHECKS:
+        command = {"find": collection, "filter": query}
+
+        if sort:
+            command["sort"] = dict(sort)
+
+        explain = await db.command("explain", command, verbosity="queryPlanner")
+        stages = list(_plan_stages(explain["queryPlanner"]["winningPlan"]))
+
+        if "COLLSCAN" in stages:
+            collscans.append(name)
+            logger.error(f"Query '{name}' on {collection} does a collection scan: {stages}")
+        else:
+            logger.info(f"Query '{name}' on {collection} uses: {stages}")
+
+    return collscans
+
+async def _main(check: bool) -> int:
+    await ensure_indexes()
+
+    if not check:
+        return 0
+
+    collscans = await check_query_plans()
+
+    if collscans:
+        logger.error(f"{len(collscans)} queries fall back to COLLSCAN: {', '.join(collscans)}")
+        return 1
+
+    logger.info("All route queries use an index.")
+    return 0
+
+if __name__ == "__main__":
+    # python -m app.core.indexes           -> create the indexes
+    # python -m app.core.indexes --check   -> also fail if any route query does a COLLSCAN
+    sys.exit(asyncio.run(_main("--check" in sys.argv)))
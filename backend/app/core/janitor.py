@@ -0,0 +1,217 @@
+import asyncio
+import glob
+import os
+import tempfile
+import time
+import aiofiles.os
+import google.generativeai as genai
+from google.api_core.exceptions import NotFound
+
+from app.config import Config
+from app.core.executor import gemini_pool
+from app.crud.media_cleanup import sweep_direct_uploads
+from app.utils.logger import logger
+from app.utils.upload_ingest import SPOOL_PREFIX
+
+GEMINI = "gemini"
+TEMP = "temp"
+
+class Janitor:
+    """
+        Deletes Gemini files and temp files in the background, off the critical path of the requests.
+
+        Files are handed over with discard_gemini_file() / discard_temp_file() and deleted in batches
+        every interval seconds. A failed delete is retried with exponential backoff, up to
+        max_attempts times. On start, leftovers of earlier runs older than orphan_age seconds are swept:
+        Gemini files (they would otherwise only expire after 48 hours) and spooled uploads in the temp
+        directory, except the uploads of jobs that are still to run.
+
+        Every upload_sweep_interval seconds, direct uploads to Cloudinary older than upload_sweep_age
+        seconds that no chat has recorded are deleted as well.
+    """
+
+    def __init__(
+        self,
+        interval: float,
+        batch_size: int,
+        max_attempts: int,
+        backoff_base: float,
+        backoff_max: float,
+        orphan_age: float,
+        upload_sweep_interval: float,
+        upload_sweep_age: float
+    ):
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.orphan_age = orphan_age
+        self.upload_sweep_interval = upload_sweep_interval
+        self.upload_sweep_age = upload_sweep_age
+
+        # (kind, target) -> [attempts, due_at]
+        self._pending = {}
+        self._task = None
+        self._upload_sweeper = None
+        self._deleted = {GEMINI: 0, TEMP: 0}
+        self._retried = 0
+        self._failed = 0
+        self._swept = 0
+        self._swept_uploads = 0
+
+    async def start(self, keep=None):
+        """
+            Starts the background task. keep is awaited by the startup sweep for the set of
+            temp file paths that must not be swept.
+        """
+
+        self._task = asyncio.create_task(self._run(keep))
+        self._upload_sweeper = asyncio.create_task(self._sweep_uploads())
+
+    async def stop(self, drain_timeout: float = 0):
+        """
+            Stops the background task, then spends up to drain_timeout seconds deleting what is still pending.
+        """
+
+        tasks = [task for task in (self._task, self._upload_sweeper) if task]
+
+        for task in tasks:
+            task.cancel()
+
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+        try:
+            await asyncio.wait_for(self._collect(drain=True), timeout=drain_timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"Janitor stopped with {len(self._pending)} files left to delete.")
+
+    def discard_gemini_file(self, file):
+        self._add(GEMINI, getattr(file, "name", file))
+
+    def discard_temp_file(self, temp_file_path: str):
+        self._add(TEMP, temp_file_path)
+
+    def stats(self) -> dict:
+        return {
+            "pending_gemini": sum(1 for kind, _ in self._pending if kind == GEMINI),
+            "pending_temp": sum(1 for kind, _ in self._pending if kind == TEMP),
+            "deleted_gemini": self._deleted[GEMINI],
+            "deleted_temp": self._deleted[TEMP],
+            "retried": self._retried,
+            "failed": self._failed,
+            "swept": self._swept,
+            "swept_direct_uploads": self._swept_uploads
+        }
+
+    async def sweep(self, keep: set = frozenset()):
+        """
+            Queues the Gemini files and spooled uploads left over by earlier runs for deletion.
+            Only files older than orphan_age are taken, so files in use by other workers are left alone.
+        """
+
+        cutoff = time.time() - self.orphan_age
+        swept = 0
+
+        for path in glob.glob(os.path.join(tempfile.gettempdir(), SPOOL_PREFIX + "*")):
+            try:
+                if path not in keep and os.path.getmtime(path) < cutoff:
+                    self.discard_temp_file(path)
+                    swept += 1
+            except FileNotFoundError:
+                continue
+
+        files = await gemini_pool.run(lambda: list(genai.list_files()))
+
+        for file in files:
+            created = getattr(file, "create_time", None)
+
+            if created and created.timestamp() < cutoff:
+                self.discard_gemini_file(file)
+                swept += 1
+
+        self._swept += swept
+
+        if swept:
+            logger.info(f"Janitor found {swept} leftover files to delete.")
+
+    def _add(self, kind: str, target: str):
+        self._pending.setdefault((kind, target), [0, 0.0])
+
+    async def _run(self, keep):
+        try:
+            await self.sweep(await keep() if keep else frozenset())
+        except Exception as e:
+            logger.error(f"Janitor sweep failed: {e}")
+
+        while True:
+            await self._collect()
+            await asyncio.sleep(self.interval)
+
+    async def _sweep_uploads(self):
+        while True:
+            try:
+                self._swept_uploads += await sweep_direct_uploads(self.upload_sweep_age)
+            except Exception as e:
+                logger.error(f"Direct upload sweep failed: {e}")
+
+            await asyncio.sleep(self.upload_sweep_interval)
+
+    async def _collect(self, drain: bool = False):
+        """
+            Deletes the pending files that are due, batch_size at a time.
+            With drain every pending file is tried once, whatever its schedule.
+        """
+
+        now = time.monotonic()
+
+        # Files are also handed over from the pool threads, iterate over a copy
+        due = [key for key, (_, due_at) in list(self._pending.items()) if drain or due_at <= now]
+
+        for start in range(0, len(due), self.batch_size):
+            batch = due[start:start + self.batch_size]
+            results = await asyncio.gather(*(self._delete(kind, target) for kind, target in batch), return_exceptions=True)
+
+            for key, result in zip(batch, results):
+                if not isinstance(result, Exception):
+                    self._pending.pop(key, None)
+                    self._deleted[key[0]] += 1
+                    continue
+
+                entry = self._pending.get(key)
+
+                if entry is None:
+                    continue
+
+                entry[0] += 1
+
+                if entry[0] >= self.max_attempts:
+                    self._pending.pop(key)
+                    self._failed += 1
+                    logger.error(f"Giving up deleting {key[0]} file {key[1]} after {entry[0]} attempts. Error: {result}")
+                else:
+                    entry[1] = time.monotonic() + min(self.backoff_base * 2 ** (entry[0] - 1), self.backoff_max)
+                    self._retried += 1
+                    logger.warning(f"Failed to delete {key[0]} file {key[1]}, retrying. Error: {result}")
+
+    async def _delete(self, kind: str, target: str):
+        try:
+            if kind == GEMINI:
+                await gemini_pool.run(genai.delete_file, target)
+            else:
+                await aiofiles.os.remove(target)
+
+        except (NotFound, FileNotFoundError):
+            # Already gone
+            pass
+
+janitor = Janitor(
+    Config.JANITOR_INTERVAL_SECONDS,
+    Config.JANITOR_BATCH_SIZE,
+    Config.JANITOR_MAX_ATTEMPTS,
+    Config.JANITOR_BACKOFF_BASE_SECONDS,
+    Config.JANITOR_BACKOFF_MAX_SECONDS,
+    Config.JANITOR_ORPHAN_AGE_SECONDS,
+    Config.DIRECT_UPLOAD_SWEEP_INTERVAL_SECONDS,
+    Config.DIRECT_UPLOAD_SWEEP_AGE_SECONDS
+)
@@ -0,0 +1,304 @@
+import asyncio
+import os
+import socket
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+from fastapi import HTTPException
+from pymongo import ReturnDocument
+
+from app.config import Config
+from app.core.database import db
+from app.core.janitor import janitor
+from app.core.pipeline import analyze_and_save
+from app.crud.media_cleanup import discard_unrecorded
+from app.crud.media_manifest import manifest_entry
+from app.utils.logger import logger
+
+# Fields of a job record that are internal to the worker and never returned to clients
+PRIVATE_FIELDS = ("host", "temp_file_path", "mime_type", "sha256", "clerk_user_id", "email", "chat_id", "upload_response")
+
+class JobManager:
+    """
+        Runs analyses as background jobs, so the analyze request can return a job id right away.
+
+        Every job has a record in Mongo with its status, stage history and final result, which
+        GET /api/jobs/{id} and the SSE stream read. The in-process queue is drained by a fixed
+        number of worker tasks; on startup, queued jobs whose upload is still on this host are
+        picked up again and jobs that were cut off mid-run are retried.
+
+        A job keeps its upload on local disk until it is done, so at most max_queue jobs are
+        queued or running per process; beyond that, submit() answers with a 503.
+    """
+
+    def __init__(self, collection, workers: int, stale_seconds: int, max_queue: int):
+        self.collection = collection
+        self.workers = workers
+        self.stale_after = timedelta(seconds=stale_seconds)
+        self.max_queue = max_queue
+
+        self._queue = asyncio.Queue()
+        self._tasks = []
+        self._busy = set()
+        self._submitting = 0
+        self._rejected = 0
+        self._stopping = False
+        self._changed = asyncio.Condition()
+
+    async def start(self):
+        try:
+            await self._recover()
+        except Exception as e:
+            logger.error(f"Failed to recover analysis jobs: {e}")
+
+        self._stopping = False
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        logger.info(f"Started {self.workers} analysis job workers.")
+
+    async def stop(self, drain_timeout: float = 0):
+        """
+            Stops the workers. Jobs that are running get up to drain_timeout seconds to finish,
+            jobs still running after that are cancelled and re-queued for the next start.
+        """
+
+        self._stopping = True
+        busy = [task for number, task in enumerate(self._tasks) if number in self._busy]
+
+        for number, task in enumerate(self._tasks):
+            if number not in self._busy:
+                task.cancel()
+
+        if busy and drain_timeout:
+            logger.info(f"Waiting up to {drain_timeout}s for {len(busy)} running analysis jobs.")
+            await asyncio.wait(busy, timeout=drain_timeout)
+
+        for task in self._tasks:
+            task.cancel()
+
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def pending_files(self) -> set:
+        """
+            Returns the uploads of this host's jobs that are yet to run or still running.
+        """
+
+        paths = await self.collection.distinct(
+            "temp_file_path", {"status": {"$in": ["queued", "running"]}, "host": socket.gethostname()}
+        )
+        return set(paths)
+
+    async def submit(
+        self,
+        media_type: str,
+        temp_file_path: str,
+        mime_type: str,
+        sha256: str,
+        clerk_user_id: str,
+        email: str,
+        chat_id: Optional[str],
+        upload_response: Optional[dict] = None
+    ) -> str:
+        """
+            Records a queued job for an ingested upload and returns its id.
+            The job takes ownership of the temp file and deletes it when it is done.
+            upload_response is passed when the file is already on Cloudinary.
+            Raises a 503 HTTPException when max_queue jobs are queued or running already,
+            the caller keeps the temp file then.
+        """
+
+        if self._queue.qsize() + len(self._busy) + self._submitting >= self.max_queue:
+            self._rejected += 1
+            raise HTTPException(status_code=503, detail="Too many analysis jobs are queued. Please try again shortly.")
+
+        job_id = uuid.uuid4().hex
+        now = datetime.now()
+        self._submitting += 1
+
+        try:
+            await self.collection.insert_one({
+                "_id": job_id,
+                "status": "queued",
+                "stage": "queued",
+                "media_type": media_type,
+                "host": socket.gethostname(),
+                "temp_file_path": temp_file_path,
+                "mime_type": mime_type,
+                "sha256": sha256,
+                "clerk_user_id": clerk_user_id,
+                "email": email,
+                "chat_id": chat_id,
+                "upload_response": upload_response,
+                "events": [{"stage": "queued", "at": now}],
+                "result": None,
+                "error": None,
+                "created_at": now,
+                "updated_at": now
+            })
+            await self._queue.put(job_id)
+        finally:
+            self._submitting -= 1
+
+        logger.info(f"Queued {media_type} analysis job: {job_id}")
+
+        return job_id
+
+    async def get(self, job_id: str) -> Optional[dict]:
+        """
+            Returns the public view of a job record, or None.
+        """
+
+        job = await self.collection.find_one({"_id": job_id}, {field: 0 for field in PRIVATE_FIELDS})
+
+        if job:
+            job["id"] = job.pop("_id")
+
+        return job
+
+    async def watch(self, job_id: str, poll_interval: float = 1.0):
+        """
+            Yields the job record every time it changes, until the job is done or failed.
+            Updates made by this process are delivered immediately, updates made by another
+            worker process are picked up within poll_interval.
+        """
+
+        last_update = None
+
+        while True:
+            job = await self.get(job_id)
+
+            if not job:
+                return
+
+            if job["updated_at"] != last_update:
+                last_update = job["updated_at"]
+                yield job
+
+            if job["status"] in ("done", "failed"):
+                return
+
+            async with self._changed:
+                try:
+                    await asyncio.wait_for(self._changed.wait(), timeout=poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+
+    def stats(self) -> dict:
+        return {
+            "workers": len(self._tasks),
+            "queued": self._queue.qsize(),
+            "running": len(self._busy),
+            "max_queue": self.max_queue,
+            "rejected": self._rejected
+        }
+
+    async def _worker(self, number: int):
+        while not self._stopping:
+            job_id = await self._queue.get()
+            self._busy.add(number)
+
+            try:
+                await self._run(job_id)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Job worker {number} failed on job {job_id}. Error: {e}")
+            finally:
+                self._busy.discard(number)
+                self._queue.task_done()
+
+    async def _run(self, job_id: str):
+        # Claim the job, so it runs only once even if it was queued by more than one process
+        job = await self.collection.find_one_and_update(
+            {"_id": job_id, "status": "queued"},
+            {"$set": {"status": "running", "updated_at": datetime.now()}},
+            return_document=ReturnDocument.AFTER
+        )
+
+        if not job:
+            return
+
+        try:
+            result = await analyze_and_save(
+                job["media_type"],
+                job["temp_file_path"],
+                job["mime_type"],
+                job["sha256"],
+                job["clerk_user_id"],
+                job["email"],
+                job["chat_id"],
+                on_stage=lambda stage: self._set_stage(job_id, stage),
+                upload_response=job.get("upload_response")
+            )
+            await self._finish(job_id, "done", result=result)
+
+        except asyncio.CancelledError:
+            # Shutting down, keep the upload so the job is picked up again on restart.
+            # An asset handed over with the job was deleted by the cancelled analysis, the retry uploads the file again
+            await asyncio.shield(self.collection.update_one(
+                {"_id": job_id},
+                {"$set": {"status": "queued", "upload_response": None, "updated_at": datetime.now()}}
+            ))
+            raise
+
+        except Exception as e:
+            logger.error(f"Analysis job {job_id} failed. Error: {e}")
+            await self._finish(job_id, "failed", error=str(e))
+
+        janitor.discard_temp_file(job["temp_file_path"])
+
+    async def _set_stage(self, job_id: str, stage: str):
+        now = datetime.now()
+
+        await self.collection.update_one(
+            {"_id": job_id},
+            {"$set": {"stage": stage, "updated_at": now}, "$push": {"events": {"stage": stage, "at": now}}}
+        )
+        await self._notify()
+
+    async def _finish(self, job_id: str, status: str, result: dict = None, error: str = None):
+        now = datetime.now()
+
+        await self.collection.update_one(
+            {"_id": job_id},
+            {
+                "$set": {"status": status, "stage": status, "result": result, "error": error, "updated_at": now},
+                "$push": {"events": {"stage": status, "at": now}}
+            }
+        )
+        await self._notify()
+        logger.info(f"Analysis job {job_id} {status}.")
+
+    async def _notify(self):
+        async with self._changed:
+            self._changed.notify_all()
+
+    async def _recover(self):
+        """
+            Re-queues jobs left over by a previous run of this host.
+            Jobs that were running when it stopped are retried once their record is stale.
+        """
+
+        await self.collection.update_many(
+            {"status": "running", "updated_at": {"$lt": datetime.now() - self.stale_after}},
+            {"$set": {"status": "queued", "updated_at": datetime.now()}}
+        )
+
+        recovered = 0
+
+        # Uploads are spooled on local disk, so jobs from other hosts are left to them
+        async for job in self.collection.find({"status": "queued", "host": socket.gethostname()}, {"temp_file_path": 1, "media_type": 1, "upload_response": 1}):
+            if os.path.exists(job["temp_file_path"]):
+                await self._queue.put(job["_id"])
+                recovered += 1
+            else:
+                await self._finish(job["_id"], "failed", error="The upload was lost before the job could run.")
+
+                # Nothing will analyze the asset the job was handed
+                if job.get("upload_response"):
+                    await discard_unrecorded([manifest_entry(job["media_type"], job["upload_response"])])
+
+        if recovered:
+            logger.info(f"Recovered {recovered} queued analysis jobs.")
+
+job_manager = JobManager(db["analysis_jobs"], Config.JOB_WORKERS, Config.JOB_STALE_SECONDS, Config.JOB_MAX_QUEUE)
@@ -0,0 +1,89 @@
+from starlette.responses import JSONResponse
+
+from app.core.admission import AdmissionRejected
+
+# Room for the multipart boundaries and the small form fields sent along with the file
+FORM_OVERHEAD = 64 * 1024
+
+# Requests that neither carry an upload nor start an analysis
+BODILESS_METHODS = ("GET", "HEAD", "OPTIONS")
+
+class UploadSizeLimitMiddleware:
+    """
+        Rejects upload requests whose declared Content-Length is over the limit with a 413,
+        before the multipart body is read and spooled to disk.
+        Bodies without a Content-Length are still capped while streaming by ingest_upload().
+        path_limits overrides the limit for paths that accept several files, e.g. the batch endpoint.
+    """
+
+    def __init__(self, app, max_file_size: int, path_limits: dict = None):
+        self.app = app
+        self.max_file_size = max_file_size
+        self.path_limits = path_limits or {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http" and scope["method"] == "POST":
+            content_length = dict(scope["headers"]).get(b"content-length")
+
+            limit = self.path_limits.get(scope["path"].rstrip("/"), self.max_file_size)
+
+            if content_length and content_length.isdigit() and int(content_length) > limit + FORM_OVERHEAD:
+                limit_mb = limit // (1024 * 1024)
+                response = JSONResponse({"detail": f"Upload size exceeds the {limit_mb}MB limit."}, status_code=413)
+                await response(scope, receive, send)
+                return
+
+        await self.app(scope, receive, send)
+
+class AdmissionControlMiddleware:
+    """
+        Runs requests to the given path prefixes through the admission queue.
+        When the queue is full, or a request waited too long for a slot, it answers 503 with a
+        Retry-After header instead of letting requests pile up on the analyze routes.
+        Other routes (history, metrics, webhooks, upload signatures) are not queued, and neither are
+        requests without a body on the queued prefixes, e.g. polling the status of a chunked upload.
+
+        An admitted request then reserves its Content-Length in the byte budget, or max_request_size
+        when it has none, so large uploads wait for memory instead of being read all at once.
+    """
+
+    def __init__(self, app, admission, path_prefixes: tuple, byte_budget=None, max_request_size: int = 0):
+        self.app = app
+        self.admission = admission
+        self.path_prefixes = path_prefixes
+        self.byte_budget = byte_budget
+        self.max_request_size = max_request_size
+
+    async def __call__(self, scope, receive, send):
+        if (
+            scope["type"] != "http"
+            or scope["method"] in BODILESS_METHODS
+            or not scope["path"].startswith(self.path_prefixes)
+        ):
+            await self.app(scope, receive, send)
+            return
+
+        try:
+            async with self.admission.slot():
+                if self.byte_budget is None:
+                    await self.app(scope, receive, send)
+                    return
+
+                async with self.byte_budget.reserve(self._request_size(scope)):
+                    await self.app(scope, receive, send)
+
+        except AdmissionRejected as e:
+            response = JSONResponse(
+                {"detail": "Server is busy, please retry later."},
+                status_code=503,
+                headers={"Retry-After": str(e.retry_after)}
+            )
+            await response(scope, receive, send)
+
+    def _request_size(self, scope) -> int:
+        content_length = dict(scope["headers"]).get(b"content-length")
+
+        if content_length and content_length.isdigit():
+            return int(content_length)
+
+        return self.max_request_size
@@ -0,0 +1,174 @@
+from datetime import datetime
+from itertools import combinations
+from typing import Optional
+
+from app.config import Config
+from app.core.database import db
+from app.utils.perceptual_hash import hamming_distance
+from app.utils.logger import logger
+
+class MultiIndexHash:
+    """
+        In-memory multi-index hash over 64-bit perceptual hashes.
+
+        Each hash is split into `bands` substrings, and every band has its own table.
+        If two hashes differ in at most max_distance bits, then by the pigeonhole principle
+        at least one band differs in at most max_distance // bands bits. So a lookup only probes
+        the buckets within that small radius in each band and verifies the few candidates,
+        instead of scanning every stored hash.
+    """
+
+    def __init__(self, bits: int = 64, bands: int = 4):
+        self.bits = bits
+        self.bands = bands
+        self.band_bits = bits // bands
+        self.band_mask = (1 << self.band_bits) - 1
+
+        self._tables = [{} for _ in range(bands)]
+        self._hashes = []
+        self._payloads = []
+        self._positions = {}
+
+    def __len__(self) -> int:
+        return len(self._hashes)
+
+    def add(self, value: int, payload):
+        """
+            Adds a hash to the index. Adding a hash that is already present replaces its payload.
+        """
+
+        position = self._positions.get(value)
+
+        if position is not None:
+            self._payloads[position] = payload
+            return
+
+        position = len(self._hashes)
+        self._hashes.append(value)
+        self._payloads.append(payload)
+        self._positions[value] = position
+
+        for band, table in enumerate(self._tables):
+            table.setdefault(self._band_value(value, band), []).append(position)
+
+    def nearest(self, value: int, max_distance: int):
+        """
+            Returns (distance, payload) of the closest stored hash within max_distance, or None.
+        """
+
+        radius = max_distance // self.bands
+        best = None
+        seen = set()
+
+        for band, table in enumerate(self._tables):
+            for probe in self._neighbours(self._band_value(value, band), radius):
+                for position in table.get(probe, ()):
+                    if position in seen:
+                        continue
+                    seen.add(position)
+
+                    distance = hamming_distance(value, self._hashes[position])
+
+                    if distance <= max_distance and (best is None or distance < best[0]):
+                        best = (distance, self._payloads[position])
+
+                        if distance == 0:
+                            return best
+
+        return best
+
+    def _band_value(self, value: int, band: int) -> int:
+        return (value >> (band * self.band_bits)) & self.band_mask
+
+    def _neighbours(self, band_value: int, radius: int):
+        """
+            Yields every band value within the given Hamming radius of band_value.
+        """
+
+        yield band_value
+
+        for flips in range(1, radius + 1):
+            for bits in combinations(range(self.band_bits), flips):
+                mask = 0
+                for bit in bits:
+                    mask |= 1 << bit
+                yield band_value ^ mask
+
+class PerceptualHashIndex:
+    """
+        Near-duplicate index of previously analyzed images.
+        Verdicts are persisted in Mongo and loaded into a MultiIndexHash at startup.
+    """
+
+    def __init__(self, collection, max_distance: int):
+        self.collection = collection
+        self.max_distance = max_distance
+
+        self._index = MultiIndexHash()
+        self._hits = 0
+        self._misses = 0
+
+    async def load(self):
+        """
+            Loads all stored hashes into memory.
+        """
+
+        cursor = self.collection.find({}, {"_id": 0, "phash": 1, "label": 1, "confidence": 1, "reason": 1})
+
+        try:
+            async for document in cursor:
+                self._index.add(int(document["phash"], 16), self._verdict(document))
+        except Exception as e:
+            logger.error(f"Failed to load perceptual hashes. Error: {e}")
+            return
+
+        logger.info(f"Loaded {len(self._index)} perceptual hashes into the near-duplicate index.")
+
+    def lookup(self, phash: int) -> Optional[tuple]:
+        """
+            Returns (distance, (label, confidence, reason)) of the closest analyzed image, or None.
+        """
+
+        match = self._index.nearest(phash, self.max_distance)
+
+        if match:
+            self._hits += 1
+        else:
+            self._misses += 1
+
+        return match
+
+    async def add(self, phash: int, label: str, confidence: float, reason: str):
+        verdict = (label, confidence, reason)
+        self._index.add(phash, verdict)
+
+        phash_hex = format(phash, "016x")
+
+        try:
+            await self.collection.update_one(
+                {"phash": phash_hex},
+                {"$set": {
+                    "phash": phash_hex,
+                    "label": label,
+                    "confidence": confidence,
+                    "reason": reason,
+                    "created_at": datetime.now()
+                }},
+                upsert=True
+            )
+        except Exception as e:
+            logger.error(f"Failed to store perceptual hash {phash_hex}. Error: {e}")
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._index),
+            "max_distance": self.max_distance,
+            "hits": self._hits,
+            "misses": self._misses
+        }
+
+    @staticmethod
+    def _verdict(document: dict) -> tuple:
+        return document["label"], document["confidence"], document["reason"]
+
+phash_index = PerceptualHashIndex(db["image_phashes"], Config.IMAGE_PHASH_MAX_DISTANCE)
@@ -0,0 +1,371 @@
+import asyncio
+import os
+import time
+
+from app.core.cloudinary_client import upload_image, upload_video, upload_audio, delete_resource
+from app.config import Config
+from app.core.admission import byte_budget
+from app.core.executor import cloudinary_pool
+from app.core.janitor import janitor
+from app.core.phash_index import phash_index
+from app.core.scheduler import fair_scheduler
+from app.core.verdict_cache import verdict_cache
+from app.crud.chat_messages import save_analysis
+from app.crud.media_cleanup import discard_unrecorded
+from app.crud.media_manifest import manifest_entry, record_media
+from app.utils.hashing import sha256_file
+from app.utils.perceptual_hash import dhash
+from app.utils.upload_ingest import ingest_url
+from app.utils.llm_analysis import MODEL_NAME, analyze_image_with_llm, analyze_video_with_llm, analyze_audio_with_llm
+from app.utils.logger import logger
+from app.utils.metrics import track_stage
+
+UPLOADERS = {
+    "image": upload_image,
+    "video": upload_video,
+    "audio": upload_audio
+}
+
+ANALYZERS = {
+    "image": analyze_image_with_llm,
+    "video": analyze_video_with_llm,
+    "audio": analyze_audio_with_llm
+}
+
+def delete_uploaded_media(upload_response: dict):
+    """
+        Deletes a Cloudinary asset that was uploaded for a request which failed afterwards.
+    """
+
+    logger.warning(f"Deleting orphaned Cloudinary asset: {upload_response['public_id']}")
+    delete_resource(upload_response["public_id"], upload_response["resource_type"])
+
+async def _timed(coro, timings: dict, stage: str):
+    started = time.perf_counter()
+
+    try:
+        return await coro
+    finally:
+        timings[stage] = round((time.perf_counter() - started) * 1000, 1)
+
+async def _scheduled_analysis(media_type: str, temp_file_path: str, mime_type: str, user: str, timings: dict):
+    # Only the LLM analysis goes through the fair scheduler, the Cloudinary upload starts right away
+    async with fair_scheduler.slot(user, media_type, os.path.getsize(temp_file_path)) as waited:
+        timings["scheduler_wait_ms"] = round(waited * 1000, 1)
+        return await ANALYZERS[media_type](temp_file_path, mime_type)
+
+async def _given(upload_response: dict) -> dict:
+    return upload_response
+
+async def run_analysis_stages(media_type: str, temp_file_path: str, mime_type: str, user: str = None, upload_response: dict = None):
+    """
+        Runs the Cloudinary upload and the LLM analysis of the given file concurrently.
+        Both stages only read the temp file, so the total latency is the slower of the two.
+        The LLM analysis waits for its turn in the fair scheduler, queued under the given user.
+        When the file is already on Cloudinary its upload_response is passed and only the analysis runs.
+
+        If either stage fails (or the request is cancelled) the other one is cancelled and an
+        already uploaded Cloudinary asset is deleted, so nothing is left orphaned.
+
+        Returns (upload_response, verdict, timings). The verdict is (label, confidence, reason),
+        segmented audio analysis appends the list of segment results as a fourth element.
+    """
+
+    timings = {}
+    started = time.perf_counter()
+
+    uploading = upload_response is None
+
+    if uploading:
+        upload_task = asyncio.create_task(_timed(
+            cloudinary_pool.run_with_cleanup(delete_uploaded_media, UPLOADERS[media_type], temp_file_path),
+            timings, "cloudinary_upload_ms"
+        ))
+    else:
+        upload_task = asyncio.create_task(_given(upload_response))
+    analysis_task = asyncio.create_task(_timed(
+        _scheduled_analysis(media_type, temp_file_path, mime_type, user, timings),
+        timings, "llm_analysis_ms"
+    ))
+
+    try:
+        upload_response, verdict = await asyncio.gather(upload_task, analysis_task)
+
+    except BaseException:
+        # gather() does not cancel the sibling stage by itself
+        upload_task.cancel()
+        analysis_task.cancel()
+        await asyncio.wait({upload_task, analysis_task})
+
+        if uploading and not upload_task.cancelled() and upload_task.exception() is None:
+            await cloudinary_pool.run(delete_uploaded_media, upload_task.result())
+
+        raise
+
+    timings["total_ms"] = round((time.perf_counter() - started) * 1000, 1)
+    logger.info(f"{media_type.capitalize()} analysis stages finished: {timings}")
+
+    return upload_response, verdict, timings
+
+async def _image_phash(temp_file_path: str):
+    try:
+        return await asyncio.to_thread(dhash, temp_file_path)
+    except Exception as e:
+        logger.warning(f"Could not compute perceptual hash: {e}")
+        return None
+
+async def _upload_only(media_type: str, temp_file_path: str, started: float):
+    upload_started = time.perf_counter()
+    upload_response = await cloudinary_pool.run(UPLOADERS[media_type], temp_file_path)
+
+    timings = {
+        "cloudinary_upload_ms": round((time.perf_counter() - upload_started) * 1000, 1),
+        "total_ms": round((time.perf_counter() - started) * 1000, 1)
+    }
+
+    return upload_response, timings
+
+def _cached_verdict(cached: dict) -> tuple:
+    verdict = (cached["label"], cached["confidence"], cached["reason"])
+
+    if cached.get("segments"):
+        verdict += (cached["segments"],)
+
+    return verdict
+
+async def analyze_media(
+    media_type: str,
+    temp_file_path: str,
+    mime_type: str,
+    sha256: str = None,
+    user: str = None,
+    upload_response: dict = None
+):
+    """
+        Analyzes the given file, reusing a cached verdict when the same bytes were analyzed before.
+        A cache hit skips both the Cloudinary upload and the LLM call.
+        For images, a near-duplicate of an analyzed image (re-saved, resized, recompressed)
+        reuses its verdict and only the Cloudinary upload is done.
+        sha256 can be passed when it was already computed while ingesting the upload.
+        user is who the analysis is scheduled for, analyses of the same user share their fair share.
+        upload_response is passed for a file that is already on Cloudinary, it is then not uploaded again.
+
+        Returns (upload_response, (label, confidence, reason), timings).
+    """
+
+    with track_stage("analysis", media_type):
+        return await _analyze_media(media_type, temp_file_path, mime_type, sha256, user, upload_response)
+
+async def _analyze_media(
+    media_type: str,
+    temp_file_path: str,
+    mime_type: str,
+    sha256: str = None,
+    user: str = None,
+    upload_response: dict = None
+):
+    started = time.perf_counter()
+    if not sha256:
+        sha256 = await asyncio.to_thread(sha256_file, temp_file_path)
+
+    cache_key = verdict_cache.make_key(sha256, media_type, MODEL_NAME)
+
+    cached = await verdict_cache.get(cache_key)
+
+    if cached:
+        logger.info(f"Verdict cache hit for {media_type}: {cache_key}")
+
+        upload_response = upload_response or {
+            "secure_url": cached["url"],
+            "public_id": cached["public_id"],
+            "resource_type": cached["resource_type"],
+            "bytes": cached.get("bytes")
+        }
+        timings = {"cache": "hit", "total_ms": round((time.perf_counter() - started) * 1000, 1)}
+
+        return upload_response, _cached_verdict(cached), timings
+
+    phash = None
+
+    if media_type == "image" and Config.IMAGE_PHASH_ENABLED:
+        phash = await _image_phash(temp_file_path)
+        match = phash_index.lookup(phash) if phash is not None else None
+
+        if match:
+            distance, verdict = match
+            logger.info(f"Near-duplicate image found at Hamming distance {distance}, skipping LLM analysis")
+
+            if upload_response is None:
+                upload_response, timings = await _upload_only(media_type, temp_file_path, started)
+            else:
+                timings = {"total_ms": round((time.perf_counter() - started) * 1000, 1)}
+
+            timings["cache"] = "near_duplicate"
+            timings["phash_distance"] = distance
+
+            await verdict_cache.put(cache_key, upload_response, *verdict)
+            return upload_response, verdict, timings
+
+    upload_response, verdict, timings = await run_analysis_stages(media_type, temp_file_path, mime_type, user, upload_response)
+    timings["cache"] = "miss"
+
+    # Errors from the LLM come back as an 'Unknown' verdict and must not be cached
+    label, confidence, reason, *details = verdict
+
+    if label and label != "Unknown":
+        await verdict_cache.put(cache_key, upload_response, label, confidence, reason, *details)
+
+        if phash is not None:
+            await phash_index.add(phash, label, confidence, reason)
+
+    return upload_response, verdict, timings
+
+async def analyze_and_save(
+    media_type: str,
+    temp_file_path: str,
+    mime_type: str,
+    sha256: str,
+    clerk_user_id: str,
+    email: str,
+    chat_id: str,
+    on_stage=None,
+    upload_response: dict = None
+) -> dict:
+    """
+        Analyzes an ingested upload and stores the resulting messages in the chat.
+        on_stage(stage) is awaited before each stage, so callers can report progress.
+        upload_response is passed when the file was already uploaded to Cloudinary while it was received,
+        the asset then belongs to this analysis and is deleted if the analysis or the save fails.
+        Returns the analyze response: chat_id, user_message, ai_message and timings.
+    """
+
+    handed_over = upload_response is not None
+
+    if on_stage:
+        await on_stage("analyzing")
+
+    try:
+        upload_response, verdict, timings = await analyze_media(
+            media_type, temp_file_path, mime_type, sha256, clerk_user_id or email, upload_response
+        )
+    except BaseException:
+        # run_analysis_stages only deletes the assets it uploaded itself
+        if handed_over:
+            await _discard_unsaved(media_type, upload_response)
+        raise
+
+    logger.info(f"{media_type.capitalize()} uploaded to Cloudinary: {upload_response['secure_url']}")
+
+    if on_stage:
+        await on_stage("saving")
+
+    # A cache hit reuses the asset of another chat
+    uploaded = handed_over or timings.get("cache") != "hit"
+
+    return await _save(media_type, upload_response, verdict, timings, sha256, clerk_user_id, email, chat_id, uploaded)
+
+async def analyze_reference(media_type: str, resource: dict, user: str = None):
+    """
+        Analyzes media that the client uploaded straight to Cloudinary, given its Admin API resource.
+        The verdict cache is checked by the asset's etag first, so a known asset is never downloaded.
+        Otherwise the asset is streamed to a temp file and analyzed without being uploaded again.
+
+        Returns (upload_response, (label, confidence, reason), timings, sha256), sha256 is None on an etag hit.
+    """
+
+    started = time.perf_counter()
+
+    upload_response = {
+        "secure_url": resource["secure_url"],
+        "public_id": resource["public_id"],
+        "resource_type": resource["resource_type"],
+        "bytes": resource.get("bytes")
+    }
+
+    etag_key = verdict_cache.make_key(f"etag:{resource['etag']}", media_type, MODEL_NAME) if resource.get("etag") else None
+    cached = await verdict_cache.get(etag_key) if etag_key else None
+
+    if cached:
+        logger.info(f"Verdict cache hit for referenced {media_type}: {resource['public_id']}")
+        timings = {"cache": "hit", "total_ms": round((time.perf_counter() - started) * 1000, 1)}
+
+        return upload_response, _cached_verdict(cached), timings, None
+
+    # The downloaded asset takes the same room as an upload would
+    async with byte_budget.reserve(resource.get("bytes") or Config.MAX_FILE_SIZE):
+        download_started = time.perf_counter()
+        upload = await ingest_url(resource["secure_url"], media_type, Config.MAX_FILE_SIZE, Config.DOWNLOAD_TIMEOUT_SECONDS)
+        download_ms = round((time.perf_counter() - download_started) * 1000, 1)
+
+        try:
+            _, verdict, timings = await analyze_media(
+                media_type, upload["path"], upload["mime_type"], upload["sha256"], user, upload_response
+            )
+        finally:
+            janitor.discard_temp_file(upload["path"])
+
+    timings["download_ms"] = download_ms
+    timings["total_ms"] = round((time.perf_counter() - started) * 1000, 1)
+
+    if etag_key and verdict[0] and verdict[0] != "Unknown":
+        await verdict_cache.put(etag_key, upload_response, *verdict)
+
+    return upload_response, verdict, timings, upload["sha256"]
+
+async def analyze_reference_and_save(
+    media_type: str,
+    resource: dict,
+    clerk_user_id: str,
+    email: str,
+    chat_id: str
+) -> dict:
+    """
+        Analyzes media uploaded straight to Cloudinary and stores the resulting messages in the chat.
+        Returns the analyze response: chat_id, user_message, ai_message and timings.
+    """
+
+    upload_response, verdict, timings, sha256 = await analyze_reference(media_type, resource, clerk_user_id or email)
+
+    # The client's own upload, kept when saving fails so the analysis can be retried
+    return await _save(media_type, upload_response, verdict, timings, sha256, clerk_user_id, email, chat_id, False)
+
+async def _discard_unsaved(media_type: str, upload_response: dict):
+    try:
+        await asyncio.shield(discard_unrecorded([manifest_entry(media_type, upload_response)]))
+    except Exception as e:
+        logger.error(f"Failed to delete Cloudinary asset {upload_response['public_id']} of an unsaved analysis. Error: {e}")
+
+async def _save(
+    media_type: str,
+    upload_response: dict,
+    verdict: tuple,
+    timings: dict,
+    sha256: str,
+    clerk_user_id: str,
+    email: str,
+    chat_id: str,
+    uploaded: bool
+) -> dict:
+    label, confidence, reason, *details = verdict
+    document_url = upload_response["secure_url"]
+
+    with track_stage("mongo_write", media_type):
+        try:
+            chat_id, user_message, ai_message = await save_analysis(
+                media_type, clerk_user_id, email, chat_id, document_url, label, confidence, reason, *details
+            )
+        except BaseException:
+            # Nothing refers to an asset uploaded for this analysis yet
+            if uploaded:
+                await _discard_unsaved(media_type, upload_response)
+            raise
+
+        # A failure fails the save, the purge still finds the asset through the stored message
+        await record_media(clerk_user_id, email, chat_id, [manifest_entry(media_type, upload_response, sha256)])
+
+    return {
+        "chat_id": chat_id,
+        "user_message": user_message,
+        "ai_message": ai_message,
+        "timings": timings
+    }
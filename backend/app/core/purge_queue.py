@@ -0,0 +1,240 @@
+import asyncio
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+from pymongo import ReturnDocument
+
+from app.config import Config
+from app.core.database import db
+from app.crud.media_cleanup import purge_media
+from app.utils.logger import logger
+
+class PurgeQueue:
+    """
+        Mongo-backed work queue that deletes the media and documents of deleted chats in the background.
+
+        Deleting chats only tombstones them (deleted_at, purge_id) and records a purge, so the
+        request returns right away; tombstoned chats are hidden from every route query.
+        Workers claim due purges with a lease, retry failures with exponential backoff and give up
+        after PURGE_MAX_ATTEMPTS. A purge is keyed by an idempotency key (Svix message id, chat id),
+        so retried webhooks and repeated deletes do not enqueue the same work twice.
+    """
+
+    def __init__(self, collection, chats, workers: int, max_attempts: int, lease_seconds: int, poll_seconds: float):
+        self.collection = collection
+        self.chats = chats
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.lease = timedelta(seconds=lease_seconds)
+        self.poll_seconds = poll_seconds
+
+        self._tasks = []
+        self._wake = asyncio.Event()
+        self._done = 0
+        self._retried = 0
+        self._failed = 0
+
+    async def start(self):
+        self._tasks = [asyncio.create_task(self._worker(i)) for i in range(self.workers)]
+        logger.info(f"Started {self.workers} media purge workers.")
+
+    async def stop(self):
+        for task in self._tasks:
+            task.cancel()
+
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    async def enqueue(self, key: str, chat_filter: dict) -> Optional[str]:
+        """
+            Tombstones the live chats matching chat_filter and queues their purge under key.
+            Returns key, or None when there was nothing to delete and no purge with this key exists.
+        """
+
+        now = datetime.now()
+        result = await self.chats.update_many(
+            {**chat_filter, "deleted_at": None},
+            {"$set": {"deleted_at": now, "purge_id": key}}
+        )
+
+        if result.modified_count == 0:
+            existing = await self.collection.find_one({"_id": key}, {"_id": 1})
+            return key if existing else None
+
+        try:
+            # Re-queues a finished purge with the same key, e.g. a chat re-used after a failed delete
+            await self.collection.update_one(
+                {"_id": key},
+                {
+                    "$setOnInsert": {"created_at": now},
+                    "$set": {
+                        "status": "queued",
+                        "attempts": 0,
+                        "next_attempt_at": now,
+                        "claim": None,
+                        "error": None,
+                        "updated_at": now
+                    },
+                    "$unset": {"finished_at": ""}
+                },
+                upsert=True
+            )
+        except Exception:
+            await self.chats.update_many({"purge_id": key}, {"$unset": {"deleted_at": "", "purge_id": ""}})
+            raise
+
+        self._wake.set()
+        logger.info(f"Queued purge {key} of {result.modified_count} chats.")
+
+        return key
+
+    async def stats(self) -> dict:
+        """
+            Queue depth by status and lag: the age of the oldest purge that is due but not done.
+        """
+
+        stats = {"workers": len(self._tasks), "done": self._done, "retried": self._retried, "failed": self._failed}
+
+        try:
+            counts = await self.collection.aggregate([
+                {"$match": {"status": {"$in": ["queued", "running", "failed"]}}},
+                {"$group": {"_id": "$status", "count": {"$sum": 1}}}
+            ]).to_list(length=None)
+
+            oldest = await self.collection.find_one(
+                {"status": {"$in": ["queued", "running"]}},
+                {"created_at": 1},
+                sort=[("created_at", 1)]
+            )
+        except Exception as e:
+            logger.error(f"Failed to read purge queue stats: {e}")
+            return stats
+
+        depth = {item["_id"]: item["count"] for item in counts}
+
+        return {
+            **stats,
+            "queued": depth.get("queued", 0),
+            "running": depth.get("running", 0),
+            "dead": depth.get("failed", 0),
+            "lag_seconds": (datetime.now() - oldest["created_at"]).total_seconds() if oldest else 0.0
+        }
+
+    async def _worker(self, number: int):
+        while True:
+            try:
+                purge = await self._claim()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Purge worker {number} failed to claim work. Error: {e}")
+                purge = None
+
+            if not purge:
+                self._wake.clear()
+
+                try:
+                    await asyncio.wait_for(self._wake.wait(), timeout=self.poll_seconds)
+                except asyncio.TimeoutError:
+                    pass
+
+                continue
+
+            try:
+                await self._run(purge)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Purge worker {number} failed on purge {purge['_id']}. Error: {e}")
+
+    async def _claim(self) -> Optional[dict]:
+        # Due purges, and purges whose worker died holding the lease
+        now = datetime.now()
+
+        return await self.collection.find_one_and_update(
+            {"$or": [
+                {"status": "queued", "next_attempt_at": {"$lte": now}},
+                {"status": "running", "lease_until": {"$lt": now}}
+            ]},
+            {
+                "$set": {"status": "running", "claim": uuid.uuid4().hex, "lease_until": now + self.lease, "updated_at": now},
+                "$inc": {"attempts": 1}
+            },
+            sort=[("next_attempt_at", 1)],
+            return_document=ReturnDocument.AFTER
+        )
+
+    async def _run(self, purge: dict):
+        key = purge["_id"]
+        owned = {"_id": key, "claim": purge["claim"]}
+
+        try:
+            chat_ids = [str(chat_id) for chat_id in await self.chats.distinct("_id", {"purge_id": key})]
+            reports = await purge_media(chat_ids)
+            errors = [report["error"] for report in reports if report["error"]]
+
+            if errors:
+                raise RuntimeError(f"{len(errors)} of {len(reports)} delete batches failed: {errors[0]}")
+
+            await db["messages"].delete_many({"chat_id": {"$in": chat_ids}})
+            result = await self.chats.delete_many({"purge_id": key})
+
+        except asyncio.CancelledError:
+            # Shutting down, let another worker pick it up right away
+            await asyncio.shield(self.collection.update_one(
+                owned, {"$set": {"status": "queued", "claim": None, "updated_at": datetime.now()}}
+            ))
+            raise
+
+        except Exception as e:
+            await self._retry(purge, str(e))
+            return
+
+        now = datetime.now()
+        await self.collection.update_one(owned, {"$set": {
+            "status": "done",
+            "claim": None,
+            "deleted_chats": result.deleted_count,
+            "deleted_media": sum(report["deleted"] for report in reports),
+            "updated_at": now,
+            "finished_at": now
+        }})
+
+        self._done += 1
+        logger.info(f"Purge {key} done: {result.deleted_count} chats deleted.")
+
+    async def _retry(self, purge: dict, error: str):
+        now = datetime.now()
+        owned = {"_id": purge["_id"], "claim": purge["claim"]}
+
+        if purge["attempts"] >= self.max_attempts:
+            # Chats stay tombstoned so the purge can be re-queued by hand
+            await self.collection.update_one(owned, {"$set": {
+                "status": "failed", "claim": None, "error": error, "updated_at": now
+            }})
+
+            self._failed += 1
+            logger.error(f"Purge {purge['_id']} failed after {purge['attempts']} attempts. Error: {error}")
+            return
+
+        delay = min(Config.PURGE_BACKOFF_BASE_SECONDS * 2 ** (purge["attempts"] - 1), Config.PURGE_BACKOFF_MAX_SECONDS)
+
+        await self.collection.update_one(owned, {"$set": {
+            "status": "queued",
+            "claim": None,
+            "error": error,
+            "next_attempt_at": now + timedelta(seconds=delay),
+            "updated_at": now
+        }})
+
+        self._retried += 1
+        logger.warning(f"Purge {purge['_id']} attempt {purge['attempts']} failed, retrying in {delay:.0f}s. Error: {error}")
+
+purge_queue = PurgeQueue(
+    db["purge_queue"],
+    db["chats"],
+    Config.PURGE_WORKERS,
+    Config.PURGE_MAX_ATTEMPTS,
+    Config.PURGE_LEASE_SECONDS,
+    Config.PURGE_POLL_SECONDS
+)
@@ -0,0 +1,188 @@
+import asyncio
+import itertools
+import time
+from contextlib import asynccontextmanager
+
+from app.config import Config
+from app.utils.metrics import SCHEDULER_WAIT
+
+# Requests without a known user share one bucket and one queue
+ANONYMOUS = "anonymous"
+
+class _Request:
+    __slots__ = ("user", "media_type", "cost", "start_tag", "finish_tag", "seq", "enqueued_at", "future")
+
+    def __init__(self, user: str, media_type: str, cost: float, start_tag: float, seq: int, future: asyncio.Future):
+        self.user = user
+        self.media_type = media_type
+        self.cost = cost
+        self.start_tag = start_tag
+        self.finish_tag = start_tag + cost
+        self.seq = seq
+        self.enqueued_at = time.perf_counter()
+        self.future = future
+
+class FairScheduler:
+    """
+        Cost-aware fair scheduler in front of the LLM analyses.
+
+        Every analysis costs a weight from its media type and size, and at most capacity cost units
+        run at once (a single analysis larger than that still runs when nothing else does).
+        Waiting analyses are ordered by weighted fair queueing across users, smallest virtual finish
+        tag first: each user's analyses get finish tags that grow with the cost that user has queued,
+        so a burst of videos from one user does not hold back images from others. The virtual time
+        follows the start tag of the last analysis dispatched.
+
+        Per-user token buckets refill at token_rate cost units per second up to token_burst.
+        A user whose bucket is empty only goes ahead of users whose buckets are not when nothing
+        else is waiting, so spare capacity is never left idle.
+    """
+
+    def __init__(self, capacity: float, costs: dict, cost_per_mb: float, token_rate: float, token_burst: float):
+        self.capacity = capacity
+        self.costs = costs
+        self.cost_per_mb = cost_per_mb
+        self.token_rate = token_rate
+        self.token_burst = token_burst
+
+        self._waiting = []
+        self._used = 0.0
+        self._running = 0
+        self._virtual_time = 0.0
+        self._last_finish = {}
+        self._buckets = {}
+        self._seq = itertools.count()
+        self._classes = {}
+
+    def cost_of(self, media_type: str, size: int) -> float:
+        return self.costs.get(media_type, 1.0) + self.cost_per_mb * size / (1024 * 1024)
+
+    @asynccontextmanager
+    async def slot(self, user: str, media_type: str, size: int):
+        """
+            Waits for the analysis to be scheduled and holds its cost for the duration of the block.
+            Yields the number of seconds it waited.
+        """
+
+        request = self._enqueue(user or ANONYMOUS, media_type, self.cost_of(media_type, size))
+        self._dispatch()
+
+        try:
+            await request.future
+        except BaseException:
+            if request.future.done() and not request.future.cancelled():
+                # Scheduled just as the caller was cancelled
+                self._release(request)
+            else:
+                self._waiting.remove(request)
+                self._class(media_type)["waiting"] -= 1
+                self._dispatch()
+            raise
+
+        waited = time.perf_counter() - request.enqueued_at
+        self._record(media_type, waited)
+
+        try:
+            yield waited
+        finally:
+            self._release(request)
+
+    def stats(self) -> dict:
+        return {
+            "capacity": self.capacity,
+            "used": round(self._used, 2),
+            "running": self._running,
+            "waiting": len(self._waiting),
+            "users_waiting": len({request.user for request in self._waiting}),
+            "classes": {
+                media_type: {
+                    "waiting": stats["waiting"],
+                    "scheduled": stats["scheduled"],
+                    "average_wait_seconds": round(stats["wait_seconds"] / stats["scheduled"], 3) if stats["scheduled"] else None,
+                    "max_wait_seconds": round(stats["max_wait_seconds"], 3)
+                }
+                for media_type, stats in self._classes.items()
+            }
+        }
+
+    def _class(self, media_type: str) -> dict:
+        return self._classes.setdefault(media_type, {"waiting": 0, "scheduled": 0, "wait_seconds": 0.0, "max_wait_seconds": 0.0})
+
+    def _enqueue(self, user: str, media_type: str, cost: float) -> _Request:
+        start_tag = max(self._virtual_time, self._last_finish.get(user, 0.0))
+        request = _Request(user, media_type, cost, start_tag, next(self._seq), asyncio.get_running_loop().create_future())
+
+        self._last_finish[user] = request.finish_tag
+        self._waiting.append(request)
+        self._class(media_type)["waiting"] += 1
+
+        return request
+
+    def _tokens(self, user: str, now: float) -> float:
+        tokens, updated_at = self._buckets.get(user, (self.token_burst, now))
+        tokens = min(self.token_burst, tokens + (now - updated_at) * self.token_rate)
+        self._buckets[user] = (tokens, now)
+        return tokens
+
+    def _dispatch(self):
+        while True:
+            # Cancelled requests are still listed until their caller removes them
+            ordered = sorted(
+                (request for request in self._waiting if not request.future.done()),
+                key=lambda request: (request.finish_tag, request.seq)
+            )
+
+            if not ordered:
+                break
+
+            now = time.monotonic()
+            request = next((request for request in ordered if self._tokens(request.user, now) > 0), ordered[0])
+
+            # The head waits for capacity rather than being overtaken, so large analyses are not starved
+            if self._running and self._used + request.cost > self.capacity:
+                return
+
+            self._waiting.remove(request)
+            self._class(request.media_type)["waiting"] -= 1
+            self._used += request.cost
+            self._running += 1
+            self._virtual_time = max(self._virtual_time, request.start_tag)
+
+            tokens, updated_at = self._buckets[request.user]
+            self._buckets[request.user] = (tokens - request.cost, updated_at)
+
+            request.future.set_result(None)
+
+        if not self._waiting:
+            self._forget_idle_users()
+
+    def _release(self, request: _Request):
+        self._used = max(0.0, self._used - request.cost)
+        self._running -= 1
+        self._dispatch()
+
+    def _forget_idle_users(self):
+        # Nothing is waiting: finish tags at or behind the virtual time and full buckets carry no state
+        now = time.monotonic()
+
+        self._last_finish = {user: finish for user, finish in self._last_finish.items() if finish > self._virtual_time}
+        self._buckets = {
+            user: bucket for user, bucket in self._buckets.items()
+            if bucket[0] + (now - bucket[1]) * self.token_rate < self.token_burst
+        }
+
+    def _record(self, media_type: str, waited: float):
+        stats = self._class(media_type)
+        stats["scheduled"] += 1
+        stats["wait_seconds"] += waited
+        stats["max_wait_seconds"] = max(stats["max_wait_seconds"], waited)
+
+        SCHEDULER_WAIT.observe(waited, media_type=media_type)
+
+fair_scheduler = FairScheduler(
+    Config.SCHEDULER_CAPACITY,
+    {"image": Config.SCHEDULER_COST_IMAGE, "audio": Config.SCHEDULER_COST_AUDIO, "video": Config.SCHEDULER_COST_VIDEO},
+    Config.SCHEDULER_COST_PER_MB,
+    Config.SCHEDULER_USER_RATE,
+    Config.SCHEDULER_USER_BURST
+)
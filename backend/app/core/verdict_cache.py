@@ -0,0 +1,143 @@
+import time
+from collections import OrderedDict
+from datetime import datetime, timedelta
+from typing import Optional
+
+from app.config import Config
+from app.core.database import db
+from app.utils.logger import logger
+from app.utils.metrics import CACHE_LOOKUPS
+
+class VerdictCache:
+    """
+        Content-addressed cache of analysis verdicts.
+        Keyed by SHA-256 of the uploaded bytes, media type and model name, so re-checking the
+        same file skips both the Cloudinary upload and the Gemini call.
+
+        An in-process LRU sits in front of a Mongo collection whose TTL index evicts old entries.
+        With local_ttl_seconds (several worker processes), an entry is only served from the LRU for
+        that long after it was read from Mongo, so an entry invalidated by another worker stops
+        being served within local_ttl_seconds without a Mongo round trip on every hit.
+    """
+
+    def __init__(self, collection, max_entries: int, ttl_seconds: int, local_ttl_seconds: float = None):
+        self.collection = collection
+        self.max_entries = max_entries
+        self.ttl = timedelta(seconds=ttl_seconds)
+        self.local_ttl = local_ttl_seconds
+
+        self._entries = OrderedDict()
+        self._memory_hits = 0
+        self._db_hits = 0
+        self._misses = 0
+        self._stores = 0
+        self._evictions = 0
+
+    @staticmethod
+    def make_key(sha256: str, media_type: str, model_name: str) -> str:
+        return f"{media_type}:{model_name}:{sha256}"
+
+    async def get(self, key: str) -> Optional[dict]:
+        """
+            Returns the cached entry (url, public_id, resource_type, bytes, label, confidence, reason, segments) or None.
+        """
+
+        entry, remembered_at = self._entries.get(key, (None, None))
+
+        if entry and not self._is_expired(entry) and not self._is_stale(remembered_at):
+            self._entries.move_to_end(key)
+            self._memory_hits += 1
+            CACHE_LOOKUPS.inc(result="memory_hit")
+            return entry
+
+        if entry:
+            del self._entries[key]
+
+        try:
+            entry = await self.collection.find_one({"_id": key})
+        except Exception as e:
+            logger.error(f"Verdict cache lookup failed for key: {key}. Error: {e}")
+            entry = None
+
+        # The TTL monitor only runs every minute, so expired documents can still be returned
+        if not entry or self._is_expired(entry):
+            self._misses += 1
+            CACHE_LOOKUPS.inc(result="miss")
+            return None
+
+        self._db_hits += 1
+        CACHE_LOOKUPS.inc(result="db_hit")
+        self._remember(key, entry)
+        return entry
+
+    async def put(self, key: str, upload_response: dict, label: str, confidence: float, reason: str, segments: list = None):
+        """
+            Stores the verdict (and audio segment results, if any) and the Cloudinary asset it was produced for.
+        """
+
+        entry = {
+            "_id": key,
+            "url": upload_response["secure_url"],
+            "public_id": upload_response["public_id"],
+            "resource_type": upload_response["resource_type"],
+            "bytes": upload_response.get("bytes"),
+            "label": label,
+            "confidence": confidence,
+            "reason": reason,
+            "segments": segments,
+            "created_at": datetime.now()
+        }
+
+        self._remember(key, entry)
+        self._stores += 1
+
+        try:
+            await self.collection.replace_one({"_id": key}, entry, upsert=True)
+        except Exception as e:
+            logger.error(f"Failed to store verdict in cache for key: {key}. Error: {e}")
+
+    async def invalidate_urls(self, urls: list):
+        """
+            Drops every entry that points at one of the given Cloudinary URLs, e.g. once the assets are deleted.
+        """
+
+        urls = set(urls)
+
+        for key in [key for key, (entry, _) in self._entries.items() if entry["url"] in urls]:
+            del self._entries[key]
+
+        await self.collection.delete_many({"url": {"$in": list(urls)}})
+
+    def stats(self) -> dict:
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self._memory_hits + self._db_hits,
+            "memory_hits": self._memory_hits,
+            "db_hits": self._db_hits,
+            "misses": self._misses,
+            "stores": self._stores,
+            "evictions": self._evictions
+        }
+
+    def _remember(self, key: str, entry: dict):
+        self._entries[key] = (entry, time.monotonic())
+        self._entries.move_to_end(key)
+
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+            self._evictions += 1
+
+    def _is_expired(self, entry: dict) -> bool:
+        return entry["created_at"] + self.ttl < datetime.now()
+
+    def _is_stale(self, remembered_at: float) -> bool:
+        return self.local_ttl is not None and time.monotonic() - remembered_at > self.local_ttl
+
+# Workers share the Mongo collection but not their LRUs, purges by one worker must be seen by the others
+verdict_cache = VerdictCache(
+    db["verdict_cache"],
+    Config.VERDICT_CACHE_SIZE,
+    Config.VERDICT_CACHE_TTL_SECONDS,
+    local_ttl_seconds=Config.VERDICT_CACHE_LOCAL_TTL_SECONDS if Config.SERVING_WORKERS > 1 else None
+)
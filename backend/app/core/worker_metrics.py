@@ -0,0 +1,137 @@
+import asyncio
+import json
+import os
+
+from app.config import Config
+from app.utils.logger import logger
+from app.utils.metrics import REGISTRY, Registry
+
+class WorkerMetrics:
+    """
+        Shares the Prometheus metrics of the worker processes through a directory, so a scrape,
+        served by whichever worker gets it, reports the whole server.
+
+        Every interval seconds each worker refreshes its snapshot gauges and writes its metrics to
+        <directory>/<pid>.json. A scrape merges the files of the other workers into the metrics of
+        the worker serving it: the other workers' values are up to interval seconds old. The file of
+        a worker that is gone still counts for counters and histograms, but not for gauges.
+        With a single worker (enabled=False) nothing is written.
+    """
+
+    def __init__(self, directory: str, interval: float, enabled: bool, registry: Registry = REGISTRY):
+        self.directory = directory
+        self.interval = interval
+        self.enabled = enabled
+        self.registry = registry
+
+        self._refresh = None
+        self._task = None
+        self._writes = 0
+        self._write_errors = 0
+
+    async def start(self, refresh=None):
+        """
+            refresh() updates the gauges that are only set when the metrics are read.
+        """
+
+        self._refresh = refresh
+
+        if self.enabled:
+            await asyncio.to_thread(os.makedirs, self.directory, exist_ok=True)
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+
+            # The counts since the last snapshot would be lost otherwise
+            await self._write()
+
+    async def render(self) -> str:
+        """
+            The metrics of every worker in Prometheus text format.
+        """
+
+        if self._refresh:
+            self._refresh()
+
+        if not self.enabled:
+            return self.registry.render()
+
+        try:
+            others = await asyncio.to_thread(self._read_others)
+        except OSError as e:
+            logger.error(f"Failed to read the metrics of the other workers: {e}")
+            others = []
+
+        return self.registry.render(others)
+
+    def stats(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "writes": self._writes,
+            "write_errors": self._write_errors
+        }
+
+    async def _run(self):
+        while True:
+            await self._write()
+            await asyncio.sleep(self.interval)
+
+    async def _write(self):
+        if self._refresh:
+            self._refresh()
+
+        # Taken on the event loop, where the stats behind the gauges are updated
+        snapshot = self.registry.snapshot()
+
+        try:
+            await asyncio.to_thread(self._write_file, snapshot)
+            self._writes += 1
+        except OSError as e:
+            self._write_errors += 1
+            logger.error(f"Failed to write the metrics snapshot of worker {os.getpid()}: {e}")
+
+    def _write_file(self, snapshot: dict):
+        path = os.path.join(self.directory, f"{os.getpid()}.json")
+
+        with open(f"{path}.tmp", "w") as file:
+            json.dump(snapshot, file)
+
+        # Readers never see a half-written file
+        os.replace(f"{path}.tmp", path)
+
+    def _read_others(self) -> list:
+        others = []
+
+        for filename in os.listdir(self.directory):
+            pid, extension = os.path.splitext(filename)
+
+            if extension != ".json" or not pid.isdigit() or int(pid) == os.getpid():
+                continue
+
+            try:
+                with open(os.path.join(self.directory, filename)) as file:
+                    others.append((json.load(file), _is_alive(int(pid))))
+            except (OSError, ValueError) as e:
+                logger.warning(f"Skipping the metrics snapshot {filename}: {e}")
+
+        return others
+
+def _is_alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # Exists, but belongs to another user
+        return True
+
+    return True
+
+worker_metrics = WorkerMetrics(
+    Config.METRICS_DIR,
+    Config.METRICS_SNAPSHOT_SECONDS,
+    enabled=Config.SERVING_WORKERS > 1
+)
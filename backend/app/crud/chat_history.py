@@ -0,0 +1,60 @@
+from bson import ObjectId
+from bson.errors import InvalidId
+from datetime import datetime
+import base64
+
+from app.core.database import db
+
+# Sidebar entries: everything but the messages, plus how many there are
+# (chats that were not migrated yet still have their messages embedded)
+SUMMARY_PROJECTION = {
+    "user_email": 1,
+    "title": 1,
+    "created_at": 1,
+    "message_count": {"$add": [{"$ifNull": ["$message_count", 0]}, {"$size": {"$ifNull": ["$messages", []]}}]}
+}
+
+def encode_cursor(chat: dict) -> str:
+    raw = f"{chat['created_at'].isoformat()}|{chat['_id']}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor: str):
+    """
+        Returns the (created_at, _id) position encoded in a cursor.
+        Raises ValueError for a malformed cursor.
+    """
+
+    try:
+        created_at, chat_id = base64.urlsafe_b64decode(cursor.encode()).decode().split("|")
+        return datetime.fromisoformat(created_at), ObjectId(chat_id)
+    except (ValueError, InvalidId, UnicodeDecodeError) as e:
+        raise ValueError(f"Invalid cursor: {cursor}") from e
+
+async def get_history_page(email: str, limit: int, cursor: str = None):
+    """
+        Returns (chat summaries, next_cursor) of the user's chats, newest first.
+        Keyset pagination on (created_at, _id) is served by the (user_email, created_at, _id) index,
+        so every page costs the same no matter how many chats the user has.
+    """
+
+    query = {"user_email": email, "deleted_at": None}
+
+    if cursor:
+        created_at, chat_id = decode_cursor(cursor)
+        query["$or"] = [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "_id": {"$lt": chat_id}}
+        ]
+
+    chats = await db["chats"].find(query, SUMMARY_PROJECTION) \
+        .sort([("created_at", -1), ("_id", -1)]) \
+        .limit(limit + 1) \
+        .to_list(length=limit + 1)
+
+    next_cursor = encode_cursor(chats[limit - 1]) if len(chats) > limit else None
+    chats = chats[:limit]
+
+    for chat in chats:
+        chat["_id"] = str(chat["_id"])
+
+    return chats, next_cursor
@@ -0,0 +1,201 @@
+from bson import ObjectId
+from datetime import datetime
+from fastapi import HTTPException
+from pymongo import UpdateOne
+import asyncio
+import pytz
+import uuid
+
+from app.core.database import db
+from app.crud.chat_history import encode_cursor, decode_cursor
+from app.utils.logger import logger
+
+IST = pytz.timezone('Asia/Kolkata')
+
+def is_new_chat(chat_id: str) -> bool:
+    return not chat_id or chat_id == "null" or chat_id == ""
+
+def build_messages(media_type: str, document_url: str, label: str, confidence: float, reason: str, segments: list = None):
+    """
+        Builds the user message (uploaded media) and the AI message (verdict) of one analysis.
+    """
+
+    user_message = {
+        "id": str(uuid.uuid4()),
+        "role": "user",
+        "type": media_type,
+        "content": document_url,
+        "created_at": datetime.now()
+    }
+
+    # The verdict refers to the uploaded media by id instead of repeating its URL
+    ai_message = {
+        "id": str(uuid.uuid4()),
+        "role": "trueai",
+        "type": media_type,
+        "reply_to": user_message["id"],
+        "label": label,
+        "confidence": confidence,
+        "reason": reason,
+        "created_at": datetime.now()
+    }
+
+    if segments:
+        ai_message["segments"] = segments
+
+    return user_message, ai_message
+
+async def append_messages(clerk_user_id: str, email: str, chat_id: str, title: str, messages: list) -> str:
+    """
+        Appends the messages to the chat, creating the chat (with the given title) when no chat_id
+        is given. Messages are stored in the messages collection, the chat document only keeps
+        a message count, so it stays small no matter how long the chat gets. Returns the chat_id.
+        Raises a 404 HTTPException for an unknown chat_id and a 410 for a deleted chat.
+    """
+
+    if is_new_chat(chat_id):
+        new_chat = {
+            "clerk_user_id": clerk_user_id,
+            "user_email": email,
+            "title": f"{title} {datetime.now(IST).strftime('%H:%M')}",
+            "created_at": datetime.now(),
+            "message_count": len(messages)
+        }
+
+        result = await db["chats"].insert_one(new_chat)
+        chat_id = str(result.inserted_id)
+    else:
+        if not ObjectId.is_valid(chat_id):
+            raise HTTPException(status_code=404, detail="Chat not found.")
+
+        result = await db["chats"].update_one(
+            {"_id": ObjectId(chat_id), "deleted_at": None},
+            {"$inc": {"message_count": len(messages)}}
+        )
+
+        if result.matched_count == 0:
+            logger.warning(f"Chat with chat_id: {chat_id} not found, messages were not stored")
+
+            # A tombstoned chat is being purged, its media must not be recorded again
+            if await db["chats"].find_one({"_id": ObjectId(chat_id)}, {"_id": 1}):
+                raise HTTPException(status_code=410, detail="The chat was deleted.")
+
+            raise HTTPException(status_code=404, detail="Chat not found.")
+
+    # Copies, so the inserted _id does not end up in the messages returned to the client
+    await db["messages"].insert_many([{**message, "chat_id": chat_id} for message in messages])
+    logger.info(f"Stored {len(messages)} messages in chat_id: {chat_id}")
+
+    return chat_id
+
+async def save_analysis(
+    media_type: str,
+    clerk_user_id: str,
+    email: str,
+    chat_id: str,
+    document_url: str,
+    label: str,
+    confidence: float,
+    reason: str,
+    segments: list = None
+):
+    """
+        Stores the messages of one analysis, in a new chat when no chat_id is given.
+        Returns (chat_id, user_message, ai_message).
+    """
+
+    user_message, ai_message = build_messages(media_type, document_url, label, confidence, reason, segments)
+    chat_id = await append_messages(
+        clerk_user_id, email, chat_id, f"{media_type.capitalize()} Analysis", [user_message, ai_message]
+    )
+
+    return chat_id, user_message, ai_message
+
+async def attach_messages(chats: list) -> list:
+    """
+        Adds the messages of every chat, oldest first, in one query.
+        Messages still embedded in chats that were not migrated yet come first.
+    """
+
+    by_chat = {str(chat["_id"]): list(chat.get("messages", [])) for chat in chats}
+
+    if by_chat:
+        cursor = db["messages"].find({"chat_id": {"$in": list(by_chat)}}, {"_id": 0}) \
+            .sort([("chat_id", 1), ("created_at", 1), ("_id", 1)])
+
+        async for message in cursor:
+            by_chat[message.pop("chat_id")].append(message)
+
+    for chat in chats:
+        chat["messages"] = by_chat[str(chat["_id"])]
+
+    return chats
+
+async def get_messages_page(chat_id: str, limit: int, cursor: str = None):
+    """
+        Returns (messages, next_cursor) of one page of a chat, oldest first within the page.
+        Pages go from the newest messages back in time; pass next_cursor to get older ones.
+        Keyset pagination on (created_at, _id) is served by the (chat_id, created_at, _id) index.
+    """
+
+    query = {"chat_id": chat_id}
+
+    if cursor:
+        created_at, message_id = decode_cursor(cursor)
+        query["$or"] = [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "_id": {"$lt": message_id}}
+        ]
+
+    messages = await db["messages"].find(query) \
+        .sort([("created_at", -1), ("_id", -1)]) \
+        .limit(limit + 1) \
+        .to_list(length=limit + 1)
+
+    next_cursor = encode_cursor(messages[limit - 1]) if len(messages) > limit else None
+    messages = messages[:limit]
+    messages.reverse()
+
+    return messages, next_cursor
+
+async def migrate_embedded_messages() -> int:
+    """
+        Moves the messages embedded in chats (the layout before the messages collection) into it.
+        Verdicts lose their copy of the media URL and point at the user message instead.
+        Safe to run more than once and while the app is serving, messages are upserted by id.
+    """
+
+    migrated = 0
+
+    async for chat in db["chats"].find({"messages": {"$exists": True}}, {"messages": 1}):
+        chat_id = str(chat["_id"])
+        operations = []
+        last_user_message = None
+
+        for message in chat["messages"]:
+            message = {**message, "chat_id": chat_id}
+
+            if message["role"] == "user":
+                last_user_message = message["id"]
+            else:
+                message.pop("content", None)
+                message["reply_to"] = last_user_message
+
+            operations.append(UpdateOne({"id": message["id"]}, {"$setOnInsert": message}, upsert=True))
+
+        if operations:
+            await db["messages"].bulk_write(operations, ordered=False)
+
+        message_count = await db["messages"].count_documents({"chat_id": chat_id})
+        await db["chats"].update_one(
+            {"_id": chat["_id"]},
+            {"$set": {"message_count": message_count}, "$unset": {"messages": ""}}
+        )
+        migrated += 1
+
+    logger.info(f"Moved the messages of {migrated} chats to the messages collection.")
+    return migrated
+
+if __name__ == "__main__":
+    # python -m app.crud.chat_messages   -> move embedded chat messages to the messages collection
+    asyncio.run(migrate_embedded_messages())
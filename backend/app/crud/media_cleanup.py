@@ -1,71 +1,162 @@
+import asyncio
+import time
 from bson import ObjectId
-import re
+from datetime import datetime
 
-from app.core.cloudinary_client import delete_resource
+from app.config import Config
+from app.core.cloudinary_client import FOLDERS, RESOURCE_TYPES, created_at, delete_resources, direct_upload_folder, list_resources
 from app.core.database import db
+from app.core.executor import cloudinary_pool
+from app.core.verdict_cache import verdict_cache
+from app.crud.media_manifest import backfill_chats
 from app.utils.logger import logger
 
-def extract_public_id_from_url(url: str) -> str:
+async def delete_public_ids(groups: dict) -> list:
     """
-        Extracts the public_id from a Cloudinary URL.
-        Example URL: https://res.cloudinary.com/.../upload/v12345/TrueAI/images/xyz.png
-        Returns: TrueAI/images/xyz
+        Deletes the grouped public_ids through Cloudinary's bulk delete API, in batches of
+        CLOUDINARY_DELETE_BATCH_SIZE with at most CLOUDINARY_DELETE_CONCURRENCY batches in flight.
+        Returns one report per batch: resource_type, count, deleted, not_found and error.
     """
 
-    regex = r"upload/(?:v\d+/)?(.+)\.[a-zA-Z0-9]+$"
-    match = re.search(regex, url)
+    semaphore = asyncio.Semaphore(Config.CLOUDINARY_DELETE_CONCURRENCY)
+    batch_size = min(Config.CLOUDINARY_DELETE_BATCH_SIZE, 100) # Admin API limit per call
 
-    if match:
-        return match.group(1)
-    
-    return None
+    async def delete_batch(resource_type: str, public_ids: list) -> dict:
+        report = {"resource_type": resource_type, "count": len(public_ids), "deleted": 0, "not_found": 0, "error": None}
 
-async def delete_media_for_chat_id(chat_id: str):
+        try:
+            async with semaphore:
+                statuses = await cloudinary_pool.run(delete_resources, public_ids, resource_type)
+
+            report["deleted"] = sum(1 for status in statuses.values() if status == "deleted")
+            report["not_found"] = sum(1 for status in statuses.values() if status == "not_found")
+
+        except Exception as e:
+            logger.error(f"Failed to delete a batch of {len(public_ids)} {resource_type} resources. Error: {e}")
+            report["error"] = str(e)
+
+        return report
+
+    batches = [
+        (resource_type, public_ids[start:start + batch_size])
+        for resource_type, public_ids in groups.items()
+        for start in range(0, len(public_ids), batch_size)
+    ]
+
+    return list(await asyncio.gather(*(delete_batch(resource_type, public_ids) for resource_type, public_ids in batches)))
+
+async def discard_unrecorded(entries: list) -> list:
     """
-        Deletes all media which was used in a specific chat.
+        Deletes assets uploaded for analyses whose results could not be stored, given their manifest entries.
+        Verdict cache entries pointing at them are dropped first, and assets that a chat has recorded
+        meanwhile (reused through the verdict cache by another request) are kept.
+        Returns the per batch reports of delete_public_ids.
     """
 
-    try:
-        chat = await db["chats"].find_one({ "_id": ObjectId(chat_id) })
+    if not entries:
+        return []
 
-        if not chat:
-            logger.error(f"Chat with chat_id: {chat_id} not found for media cleanup")
-            return
-        
-        messages = chat.get("messages", [])
+    await verdict_cache.invalidate_urls([entry["url"] for entry in entries])
 
-        for message in messages:
-            if message["role"] == "user":
-                media_url = message["content"]
-                media_type = message["type"]
+    public_ids = [entry["public_id"] for entry in entries]
+    recorded = set(await db["media"].distinct("public_id", {"public_id": {"$in": public_ids}, "deleted_at": None}))
+    groups = {}
 
-                if media_type == "audio":
-                    media_type = "video" # Cloudinary uses resource_type "video" for audio files as well
+    for entry in entries:
+        if entry["public_id"] not in recorded:
+            logger.warning(f"Deleting Cloudinary asset of an analysis that was not stored: {entry['public_id']}")
+            groups.setdefault(entry["resource_type"], []).append(entry["public_id"])
 
-                public_id = extract_public_id_from_url(media_url)
+    return await delete_public_ids(groups) if groups else []
 
-                if public_id:
-                    await delete_resource(public_id, media_type)
+async def sweep_direct_uploads(max_age: float) -> int:
+    """
+        Deletes the direct uploads older than max_age seconds that no chat has recorded:
+        uploads that were signed but never analyzed, or whose analysis failed.
+        Returns how many assets were deleted.
+    """
 
-        return
+    cutoff = time.time() - max_age
+    deleted = 0
 
-    except Exception as e:
-        logger.error(f"Failed to delete media for chat_id: {chat_id}. Error: {e}")
-        return
+    for media_type in FOLDERS:
+        resource_type = RESOURCE_TYPES[media_type]
+        next_cursor = None
 
-async def clear_media_for_user(email: str):
+        while True:
+            resources, next_cursor = await cloudinary_pool.run(
+                list_resources, direct_upload_folder(media_type), resource_type, next_cursor
+            )
+            stale = [resource["public_id"] for resource in resources if created_at(resource) < cutoff]
+
+            if stale:
+                recorded = set(await db["media"].distinct("public_id", {"public_id": {"$in": stale}}))
+                unrecorded = [public_id for public_id in stale if public_id not in recorded]
+
+                if unrecorded:
+                    reports = await delete_public_ids({resource_type: unrecorded})
+                    deleted += sum(report["deleted"] for report in reports)
+
+            if not next_cursor:
+                break
+
+    if deleted:
+        logger.info(f"Deleted {deleted} direct uploads that were never analyzed")
+
+    return deleted
+
+async def purge_media(chat_ids: list) -> list:
     """
-        Deletes all media which is associated with a specific user.
+        Deletes the media recorded for the given chats, keeping assets that are still referenced
+        by another chat. The chats' references are marked deleted first and only removed once
+        every delete batch succeeded, so a failed purge can simply be run again.
+        Returns the per batch reports of delete_public_ids.
     """
 
-    try:
-        chats = await db["chats"].find({ "user_email": email }).to_list(length=None)
-
-        for chat in chats:
-            await delete_media_for_chat_id(str(chat["_id"]))
-        
-        return
-    
-    except Exception as e:
-        logger.error(f"Failed to clear media for user: {email}. Error: {e}")
-        return
+    media = db["media"]
+    chats_filter = {"chat_id": {"$in": chat_ids}}
+
+    # Chats from before the manifest, or whose media failed to be recorded, only have their message URLs
+    backfilled = await backfill_chats({"_id": {"$in": [ObjectId(chat_id) for chat_id in chat_ids]}})
+
+    if backfilled:
+        logger.info(f"Recorded {backfilled} media of purged chats from their messages")
+
+    references = await media.find(chats_filter, {"public_id": 1, "resource_type": 1, "url": 1}).to_list(length=None)
+
+    if not references:
+        return []
+
+    await media.update_many({**chats_filter, "deleted_at": None}, {"$set": {"deleted_at": datetime.now()}})
+
+    # Every asset whose last live reference is gone
+    public_ids = list({reference["public_id"] for reference in references})
+    shared = set(await media.distinct("public_id", {"public_id": {"$in": public_ids}, "deleted_at": None}))
+
+    if shared:
+        logger.info(f"Keeping {len(shared)} media still used by other chats")
+
+    groups = {}
+    urls = set()
+
+    for reference in references:
+        if reference["public_id"] in shared:
+            continue
+
+        urls.add(reference["url"])
+        groups.setdefault(reference["resource_type"], set()).add(reference["public_id"])
+
+    reports = []
+
+    if groups:
+        await verdict_cache.invalidate_urls(list(urls))
+        reports = await delete_public_ids({resource_type: list(ids) for resource_type, ids in groups.items()})
+
+        deleted = sum(report["deleted"] for report in reports)
+        failed = sum(1 for report in reports if report["error"])
+        logger.info(f"Deleted {deleted} of {len(urls)} media in {len(reports)} batches ({failed} failed)")
+
+    if not any(report["error"] for report in reports):
+        await media.delete_many(chats_filter)
+
+    return reports
@@ -0,0 +1,205 @@
+import asyncio
+import re
+from datetime import datetime
+from pymongo import UpdateOne
+
+from app.core.cloudinary_client import get_resources
+from app.core.database import db
+from app.core.executor import cloudinary_pool
+from app.utils.logger import logger
+
+# Cloudinary Admin API limit of public_ids per lookup
+LOOKUP_BATCH_SIZE = 100
+
+# Chats whose messages are fetched with one query during a backfill
+BACKFILL_BATCH_SIZE = 100
+
+def manifest_entry(media_type: str, upload_response: dict, sha256: str = None) -> dict:
+    """
+        Builds the manifest entry of one uploaded media from its Cloudinary upload response.
+    """
+
+    return {
+        "public_id": upload_response["public_id"],
+        "resource_type": upload_response["resource_type"],
+        "url": upload_response["secure_url"],
+        "bytes": upload_response.get("bytes"),
+        "sha256": sha256,
+        "media_type": media_type
+    }
+
+async def record_media(clerk_user_id: str, email: str, chat_id: str, entries: list):
+    """
+        Records the media used in a chat, one document per (chat_id, public_id).
+        The same asset is recorded once for every chat that uses it (cached verdicts reuse assets),
+        so its references can be counted before deleting it.
+    """
+
+    now = datetime.now()
+    operations = [
+        UpdateOne(
+            {"chat_id": chat_id, "public_id": entry["public_id"]},
+            {"$setOnInsert": {**entry, "clerk_user_id": clerk_user_id, "user_email": email, "chat_id": chat_id, "created_at": now}},
+            upsert=True
+        )
+        for entry in entries
+    ]
+
+    if operations:
+        await db["media"].bulk_write(operations, ordered=False)
+
+async def get_storage_usage(email: str) -> dict:
+    """
+        Returns how many distinct Cloudinary assets the user's live chats use and their total size.
+    """
+
+    pipeline = [
+        {"$match": {"user_email": email, "deleted_at": None}},
+        {"$group": {"_id": "$public_id", "media_type": {"$first": "$media_type"}, "bytes": {"$first": "$bytes"}}},
+        {"$group": {"_id": "$media_type", "count": {"$sum": 1}, "bytes": {"$sum": {"$ifNull": ["$bytes", 0]}}}}
+    ]
+
+    by_type = {item["_id"]: {"count": item["count"], "bytes": item["bytes"]} async for item in db["media"].aggregate(pipeline)}
+
+    return {
+        "count": sum(usage["count"] for usage in by_type.values()),
+        "bytes": sum(usage["bytes"] for usage in by_type.values()),
+        "by_type": by_type
+    }
+
+def extract_public_id_from_url(url: str) -> str:
+    """
+        Extracts the public_id from a Cloudinary URL.
+        Example URL: https://res.cloudinary.com/.../upload/v12345/TrueAI/images/xyz.png
+        Returns: TrueAI/images/xyz
+    """
+
+    regex = r"upload/(?:v\d+/)?(.+)\.[a-zA-Z0-9]+$"
+    match = re.search(regex, url)
+
+    if match:
+        return match.group(1)
+
+    return None
+
+async def _fill_sizes() -> int:
+    """
+        Looks up the size of backfilled media on Cloudinary, 100 assets per call.
+    """
+
+    filled = 0
+
+    for resource_type in ("image", "video"):
+        public_ids = await db["media"].distinct("public_id", {"resource_type": resource_type, "bytes": None})
+
+        for start in range(0, len(public_ids), LOOKUP_BATCH_SIZE):
+            batch = public_ids[start:start + LOOKUP_BATCH_SIZE]
+
+            try:
+                resources = await cloudinary_pool.run(get_resources, batch, resource_type)
+            except Exception as e:
+                logger.error(f"Failed to look up {len(batch)} {resource_type} resources. Error: {e}")
+                continue
+
+            operations = [
+                UpdateOne({"public_id": resource["public_id"], "bytes": None}, {"$set": {"bytes": resource["bytes"]}})
+                for resource in resources
+            ]
+
+            if operations:
+                result = await db["media"].bulk_write(operations, ordered=False)
+                filled += result.modified_count
+
+    return filled
+
+async def _backfill_batch(chats: list) -> int:
+    """
+        Records the media of a batch of chats, with one query for the messages of all of them.
+    """
+
+    chat_ids = [str(chat["_id"]) for chat in chats]
+    stored = {chat_id: [] for chat_id in chat_ids}
+
+    async for message in db["messages"].find({"chat_id": {"$in": chat_ids}, "role": "user"}, {"chat_id": 1, "role": 1, "type": 1, "content": 1}):
+        stored[message["chat_id"]].append(message)
+
+    operations = []
+
+    for chat in chats:
+        chat_id = str(chat["_id"])
+
+        # Messages are embedded in chats that were not migrated yet
+        for message in chat.get("messages", []) + stored[chat_id]:
+            if message.get("role") != "user":
+                continue
+
+            public_id = extract_public_id_from_url(message["content"])
+
+            if not public_id:
+                logger.warning(f"Skipping media with unrecognized URL: {message['content']}")
+                continue
+
+            entry = {
+                "public_id": public_id,
+                "resource_type": "image" if message["type"] == "image" else "video", # Cloudinary uses resource_type "video" for audio files as well
+                "url": message["content"],
+                "bytes": None,
+                "sha256": None,
+                "media_type": message["type"],
+                "clerk_user_id": chat.get("clerk_user_id"),
+                "user_email": chat.get("user_email"),
+                "chat_id": chat_id,
+                "created_at": chat.get("created_at")
+            }
+
+            operations.append(UpdateOne(
+                {"chat_id": chat_id, "public_id": public_id},
+                {"$setOnInsert": entry},
+                upsert=True
+            ))
+
+    if not operations:
+        return 0
+
+    result = await db["media"].bulk_write(operations, ordered=False)
+    return result.upserted_count
+
+async def backfill_chats(chat_filter: dict) -> int:
+    """
+        Records the media of the chats matching chat_filter that is missing from the manifest.
+        The public_id is parsed from the URL of every user message. Chats are handled BACKFILL_BATCH_SIZE
+        at a time. Returns how many records were added.
+    """
+
+    projection = {"clerk_user_id": 1, "user_email": 1, "created_at": 1, "messages.role": 1, "messages.type": 1, "messages.content": 1}
+    recorded = 0
+    batch = []
+
+    async for chat in db["chats"].find(chat_filter, projection):
+        batch.append(chat)
+
+        if len(batch) >= BACKFILL_BATCH_SIZE:
+            recorded += await _backfill_batch(batch)
+            batch = []
+
+    if batch:
+        recorded += await _backfill_batch(batch)
+
+    return recorded
+
+async def backfill() -> int:
+    """
+        Records the media of chats stored before the manifest existed.
+        Sizes are looked up on Cloudinary afterwards.
+        Safe to run more than once, already recorded media is left as it is.
+    """
+
+    recorded = await backfill_chats({"deleted_at": None})
+    filled = await _fill_sizes()
+    logger.info(f"Backfilled {recorded} media records, looked up the size of {filled}.")
+
+    return recorded
+
+if __name__ == "__main__":
+    # python -m app.crud.media_manifest   -> record the media of existing chats
+    asyncio.run(backfill())
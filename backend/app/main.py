@@ -1,14 +1,76 @@
+import asyncio
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 
 from app.config import Config
+from app.core.admission import admission_queue, byte_budget
+from app.core.chunked_upload import chunked_uploads
+from app.core.executor import cloudinary_pool, gemini_pool
+from app.core.indexes import ensure_indexes
+from app.core.janitor import janitor
+from app.core.jobs import job_manager
+from app.core.middleware import AdmissionControlMiddleware, UploadSizeLimitMiddleware
+from app.core.phash_index import phash_index
+from app.core.purge_queue import purge_queue
+from app.core.worker_metrics import worker_metrics
+from app.utils.logger import logger
 from app.api.image_route import router as image_router
 from app.api.video_route import router as video_router
 from app.api.audio_route import router as audio_router
 from app.api.chat_route import router as chat_router
 from app.api.webhook_route import router as webhook_router
+from app.api.metrics_route import router as metrics_router, prometheus_router, refresh_gauges
+from app.api.job_route import router as job_router
+from app.api.batch_route import router as batch_router
+from app.api.direct_upload_route import router as direct_upload_router, reference_router
 
-app = FastAPI(title="TrueAI Backend")
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    try:
+        await ensure_indexes()
+    except Exception as e:
+        logger.error(f"Failed to create indexes: {e}")
+
+    # Started first, jobs hand their uploads to it
+    await janitor.start(keep=job_manager.pending_files)
+    await job_manager.start()
+    await purge_queue.start()
+    await chunked_uploads.start()
+    await worker_metrics.start(refresh=refresh_gauges)
+
+    # Loading can take a while for a large index, lookups simply miss until it is done
+    phash_loader = asyncio.create_task(phash_index.load())
+
+    yield
+
+    phash_loader.cancel()
+    await job_manager.stop(Config.GRACEFUL_SHUTDOWN_TIMEOUT_SECONDS)
+    await purge_queue.stop()
+    await chunked_uploads.stop()
+    await janitor.stop(Config.JANITOR_DRAIN_TIMEOUT_SECONDS)
+    await worker_metrics.stop()
+
+    cloudinary_pool.shutdown()
+    gemini_pool.shutdown()
+
+app = FastAPI(title="TrueAI Backend", lifespan=lifespan)
+
+# Middleware added first runs innermost: oversized uploads are rejected before they queue,
+# and CORS headers are still set on the 413 and 503 responses
+app.add_middleware(
+    AdmissionControlMiddleware,
+    admission=admission_queue,
+    path_prefixes=("/api/image/", "/api/video/", "/api/audio/", "/api/analyze/"),
+    byte_budget=byte_budget,
+    max_request_size=Config.MAX_FILE_SIZE
+)
+
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    max_file_size=Config.MAX_FILE_SIZE,
+    path_limits={"/api/analyze/batch": Config.BATCH_MAX_TOTAL_SIZE}
+)
 
 app.add_middleware(
     CORSMiddleware,
@@ -23,6 +85,12 @@ app.include_router(video_router, prefix="/api/video", tags=["Video Analysis"])
 app.include_router(audio_router, prefix="/api/audio", tags=["Audio Analysis"])
 app.include_router(chat_router, prefix="/api/chat", tags=["Chat History"])
 app.include_router(webhook_router, prefix="/api/webhook", tags=["Webhooks"])
+app.include_router(batch_router, prefix="/api/analyze", tags=["Batch Analysis"])
+app.include_router(direct_upload_router, prefix="/api/upload", tags=["Direct Uploads"])
+app.include_router(reference_router, prefix="/api/analyze", tags=["Direct Uploads"])
+app.include_router(job_router, prefix="/api/jobs", tags=["Analysis Jobs"])
+app.include_router(metrics_router, prefix="/api/metrics", tags=["Metrics"])
+app.include_router(prometheus_router, tags=["Metrics"])
 
 @app.get("/")
 def root():
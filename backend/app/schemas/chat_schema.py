@@ -2,14 +2,23 @@ from pydantic import BaseModel, Field
 from typing import List, Optional
 from datetime import datetime
 
+class SegmentSchema(BaseModel):
+    start: float    # seconds
+    end: float      # seconds
+    label: Optional[str] = None
+    confidence: Optional[float] = None
+    reason: Optional[str] = None
+
 class MessageSchema(BaseModel):
     id: str = Field(..., description="Unique ID for the message")
     role: str       # [user, trueai]
     type: str       # [image, video, audio]
-    content: str    # URL of media uploaded
+    content: Optional[str] = None    # URL of media uploaded, only on user messages
+    reply_to: Optional[str] = None   # id of the user message a verdict belongs to
     label: Optional[str] = None   # [AI, Real]
     confidence: Optional[float] = None
     reason: Optional[str] = None
+    segments: Optional[List[SegmentSchema]] = None    # per-segment results of long audio
     created_at: datetime = Field(default_factory=datetime.now)
 
 class ChatSchema(BaseModel):
@@ -19,5 +28,20 @@ class ChatSchema(BaseModel):
     created_at: datetime = Field(default_factory=datetime.now)
     messages: List[MessageSchema] = []
 
+class ChatSummarySchema(BaseModel):
+    id: str = Field(..., alias="_id")
+    user_email: str
+    title: str
+    created_at: datetime = Field(default_factory=datetime.now)
+    message_count: int = 0
+
+class ChatHistoryPage(BaseModel):
+    chats: List[ChatSummarySchema] = []
+    next_cursor: Optional[str] = None   # pass back as `cursor` to get the next page
+
+class MessagePage(BaseModel):
+    messages: List[MessageSchema] = []   # oldest first
+    next_cursor: Optional[str] = None    # pass back as `cursor` to get older messages
+
 class ChatCreate(BaseModel):
     email: str
@@ -0,0 +1,64 @@
+MIN_SEGMENT_SECONDS = 1.0
+
+def plan_windows(duration: float, window_seconds: float, overlap_seconds: float) -> list:
+    """
+        Splits [0, duration) into overlapping (start, end) windows.
+        A trailing window shorter than MIN_SEGMENT_SECONDS is dropped, unless it is the only one.
+    """
+
+    step = max(window_seconds - overlap_seconds, MIN_SEGMENT_SECONDS)
+    windows = []
+    start = 0.0
+
+    while start < duration:
+        end = min(start + window_seconds, duration)
+
+        if windows and end - start < MIN_SEGMENT_SECONDS:
+            break
+
+        windows.append((round(start, 3), round(end, 3)))
+
+        if end >= duration:
+            break
+
+        start += step
+
+    return windows
+
+def format_timestamp(seconds: float) -> str:
+    minutes, seconds = divmod(int(seconds), 60)
+    return f"{minutes}:{seconds:02d}"
+
+def aggregate_segments(segments: list, ai_threshold: float) -> tuple:
+    """
+        Combines per-segment verdicts into one (label, confidence, reason).
+
+        A recording is labeled 'AI' as soon as one segment is confidently AI-generated, so a
+        partially synthetic clip is not hidden by the real parts around it. Otherwise it is 'Real'
+        with the average confidence of the real segments.
+    """
+
+    scored = [segment for segment in segments if segment["label"] in ("AI", "Real")]
+
+    if not scored:
+        return "Unknown", 0.0, "Error: none of the audio segments could be analyzed."
+
+    ai_segments = [
+        segment for segment in scored
+        if segment["label"] == "AI" and (segment["confidence"] or 0.0) >= ai_threshold
+    ]
+
+    if ai_segments:
+        strongest = max(ai_segments, key=lambda segment: segment["confidence"])
+        spans = ", ".join(
+            f"{format_timestamp(segment['start'])}-{format_timestamp(segment['end'])}" for segment in ai_segments[:3]
+        )
+        reason = f"{len(ai_segments)} of {len(scored)} segments sound AI-generated ({spans}). {strongest['reason']}"
+
+        return "AI", strongest["confidence"], reason
+
+    real_segments = [segment for segment in scored if segment["label"] == "Real"] or scored
+    confidence = round(sum(segment["confidence"] or 0.0 for segment in real_segments) / len(real_segments), 2)
+    strongest = max(real_segments, key=lambda segment: segment["confidence"] or 0.0)
+
+    return "Real", confidence, strongest["reason"]
@@ -0,0 +1,16 @@
+import hashlib
+
+CHUNK_SIZE = 1024 * 1024  # 1 MB
+
+def sha256_file(file_path: str) -> str:
+    """
+        Returns the hex SHA-256 digest of the file, read in chunks.
+    """
+
+    digest = hashlib.sha256()
+
+    with open(file_path, "rb") as f:
+        while chunk := f.read(CHUNK_SIZE):
+            digest.update(chunk)
+
+    return digest.hexdigest()
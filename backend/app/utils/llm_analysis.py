@@ -1,14 +1,92 @@
+import asyncio
+import os
+import aiofiles
 import google.generativeai as genai
-import time
 
 from app.config import Config
+from app.core.executor import PoolSaturatedError, gemini_pool
+from app.core.gemini_file_watcher import gemini_file_watcher
+from app.core.janitor import janitor
+from app.utils.audio_segments import plan_windows, aggregate_segments
+from app.utils.media_sampling import (
+    MediaDecodeError, probe_duration, extract_keyframes, extract_audio_excerpt, extract_audio_window
+)
 from app.utils.parse_llm_response import parse_llm_response
 from app.utils.logger import logger
+from app.utils.metrics import BYTES, GEMINI_INLINE_MAX, GEMINI_MEDIA_BYTES, track_stage
+
+MODEL_NAME = "gemini-3-flash-preview"
 
 genai.configure(api_key=Config.GEMINI_API_KEY)
-model = genai.GenerativeModel("gemini-3-flash-preview")
+model = genai.GenerativeModel(MODEL_NAME)
+
+GEMINI_INLINE_MAX.set(Config.GEMINI_INLINE_MAX_BYTES)
+
+async def _upload_to_gemini(temp_file_path: str, mime_type: str, media_type: str):
+    """
+        Uploads a file to the Gemini File API on the Gemini pool.
+        If the analysis is cancelled while the upload is in flight, the file is handed to the janitor
+        once the upload returns.
+    """
+
+    with track_stage("gemini_upload", media_type):
+        uploaded_file = await gemini_pool.run_with_cleanup(
+            janitor.discard_gemini_file, genai.upload_file, temp_file_path, mime_type=mime_type
+        )
+
+    BYTES.inc(os.path.getsize(temp_file_path), direction="gemini_upload", media_type=media_type)
+    return uploaded_file
+
+async def _media_part(temp_file_path: str, mime_type: str, media_type: str) -> tuple:
+    """
+        Returns the part of the generate_content request that carries the file, and the Gemini file
+        to delete afterwards (None when nothing was uploaded).
+        Files up to GEMINI_INLINE_MAX_BYTES are sent inline, saving the File API upload and delete
+        round trips. Larger files are uploaded to the File API.
+    """
+
+    size = os.path.getsize(temp_file_path)
+
+    if size <= Config.GEMINI_INLINE_MAX_BYTES:
+        GEMINI_MEDIA_BYTES.observe(size, media_type=media_type, path="inline")
+
+        async with aiofiles.open(temp_file_path, "rb") as file:
+            return {"mime_type": mime_type, "data": await file.read()}, None
+
+    GEMINI_MEDIA_BYTES.observe(size, media_type=media_type, path="file_api")
 
-def analyze_image_with_llm(temp_file_path: str, mime_type: str) -> str:
+    uploaded_file = await _upload_to_gemini(temp_file_path, mime_type, media_type)
+    return uploaded_file, uploaded_file
+
+async def _generate(contents: list, media_type: str) -> dict:
+    """
+        Runs generate_content on the Gemini pool and parses the JSON verdict out of the response.
+    """
+
+    inline_bytes = sum(len(part["data"]) for part in contents if isinstance(part, dict))
+
+    if inline_bytes:
+        BYTES.inc(inline_bytes, direction="gemini_inline", media_type=media_type)
+
+    with track_stage("generate_content", media_type):
+        response = await gemini_pool.run(model.generate_content, contents)
+
+    with track_stage("parse", media_type):
+        return parse_llm_response(response.text)
+
+def _unknown_verdict(error: Exception, analysis: str) -> tuple:
+    """
+        Turns an error of an analysis into the 'Unknown' verdict returned to the user.
+        A saturated Gemini pool is not a verdict, it is raised again and answered with a 503 by the routes.
+    """
+
+    if isinstance(error, PoolSaturatedError):
+        raise error
+
+    logger.error(f"Error in {analysis}: {str(error)}")
+    return "Unknown", 0.0, f"Error: {str(error)}"
+
+async def analyze_image_with_llm(temp_file_path: str, mime_type: str) -> tuple:
     """
         Analyzes the image using a large language model(Gemini) to classify it as 'AI' or 'Real'.
     """
@@ -16,8 +94,8 @@ def analyze_image_with_llm(temp_file_path: str, mime_type: str) -> str:
     uploaded_image = None
     
     try:
-        # Upload the image to Gemini
-        uploaded_image = genai.upload_file(temp_file_path, mime_type=mime_type)
+        # Send the image inline, or upload it to Gemini when it is large
+        image_part, uploaded_image = await _media_part(temp_file_path, mime_type, "image")
 
         prompt = """
             You are an expert visual content analyst. Your task is to determine whether the provided image is 'AI' or 'Real'.
@@ -38,8 +116,7 @@ def analyze_image_with_llm(temp_file_path: str, mime_type: str) -> str:
             Return **only** the JSON object, with no extra text.
         """
 
-        response = model.generate_content([uploaded_image, prompt])
-        parsed_response = parse_llm_response(response.text)
+        parsed_response = await _generate([image_part, prompt], "image")
 
         label = parsed_response.get("label")
         confidence = parsed_response.get("confidence")
@@ -48,29 +125,98 @@ def analyze_image_with_llm(temp_file_path: str, mime_type: str) -> str:
         return label, confidence, reason
 
     except Exception as e:
-        logger.error(f"Error in LLM analysis: {str(e)}")
-        return "Unknown", 0.0, f"Error: {str(e)}"
+        return _unknown_verdict(e, "LLM analysis")
     
     finally:
+        # Deleted in the background, the verdict is returned right away
         if uploaded_image:
-            genai.delete_file(uploaded_image)
-            logger.info("Cleaned up uploaded image from Gemini.")
+            janitor.discard_gemini_file(uploaded_image)
 
-def analyze_video_with_llm(temp_file_path: str, mime_type: str) -> str:
+async def analyze_video_with_llm(temp_file_path: str, mime_type: str) -> tuple:
     """
         Analyzes the video using a large language model(Gemini) to classify it as 'AI' or 'Real'.
+        In 'keyframes' mode, sampled frames and an audio excerpt are sent inline first, and the
+        full video is only uploaded when that verdict is missing or not confident enough.
     """
-    
+
+    if Config.VIDEO_ANALYSIS_MODE == "keyframes":
+        label, confidence, reason = await analyze_video_keyframes_with_llm(temp_file_path)
+
+        if label != "Unknown" and (confidence or 0.0) >= Config.VIDEO_KEYFRAME_MIN_CONFIDENCE:
+            return label, confidence, reason
+
+        logger.info(f"Keyframe verdict not confident enough ({label}, {confidence}), analyzing the full video.")
+
+    return await analyze_full_video_with_llm(temp_file_path, mime_type)
+
+async def analyze_video_keyframes_with_llm(temp_file_path: str) -> tuple:
+    """
+        Analyzes locally sampled frames and a short audio excerpt of the video in one request.
+        Nothing is uploaded to the Gemini File API, so there is no wait for server-side processing.
+    """
+
+    try:
+        with track_stage("decode", "video"):
+            frames, audio = await asyncio.gather(
+                extract_keyframes(temp_file_path, Config.VIDEO_KEYFRAME_COUNT, Config.VIDEO_KEYFRAME_SAMPLING),
+                extract_audio_excerpt(temp_file_path, Config.VIDEO_AUDIO_EXCERPT_SECONDS)
+            )
+
+        if not frames:
+            raise MediaDecodeError("No frames could be sampled from the video.")
+
+        prompt = f"""
+            You are an expert visual content analyst. Your task is to determine whether a video is 'AI' or 'Real'.
+            You are given {len(frames)} frames sampled in order from the video{" and a short excerpt of its audio" if audio else ""}.
+
+            ### Instructions:
+            1. Carefully analyze the visual consistency, physics, and artifacts within and across the frames.
+            2. Decide whether the video is **AI-generated** or **Real**.
+            3. Estimate your **confidence score** between 0 and 1.
+            4. Provide a **concise reason (≤ 30 words)** supporting your classification. Use simple English to ensure clarity.
+
+            ### Response Format (strictly follow this JSON structure):
+            {{
+            "label": "AI" | "Real",
+            "confidence": float,
+            "reason": "string (≤ 30 words)"
+            }}
+
+            Return **only** the JSON object, with no extra text.
+        """
+
+        parts = [{"mime_type": "image/jpeg", "data": frame} for frame in frames]
+
+        if audio:
+            parts.append({"mime_type": "audio/mpeg", "data": audio})
+
+        parsed_response = await _generate(parts + [prompt], "video")
+
+        label = parsed_response.get("label")
+        confidence = parsed_response.get("confidence")
+        reason = parsed_response.get("reason")
+
+        return label, confidence, reason
+
+    except Exception as e:
+        return _unknown_verdict(e, "keyframe LLM analysis")
+
+async def analyze_full_video_with_llm(temp_file_path: str, mime_type: str) -> tuple:
+    """
+        Analyzes the whole video. A small video is sent inline, a larger one is uploaded to Gemini
+        and analyzed once it has been processed.
+    """
+
     uploaded_video = None
     
     try:
-        # Upload the video to Gemini
-        uploaded_video = genai.upload_file(temp_file_path, mime_type=mime_type)
+        # Send the video inline, or upload it to Gemini when it is large
+        video_part, uploaded_video = await _media_part(temp_file_path, mime_type, "video")
 
-        # Wait until the video is fully processed
-        while uploaded_video.state.name != "ACTIVE":
-            time.sleep(2)
-            uploaded_video = genai.get_file(uploaded_video.name)
+        # An uploaded video can only be used once it is fully processed
+        if uploaded_video:
+            with track_stage("gemini_active_wait", "video"):
+                uploaded_video = video_part = await gemini_file_watcher.wait_until_active(uploaded_video)
 
         prompt = """
             You are an expert visual content analyst. Your task is to determine whether the provided video is 'AI' or 'Real'.
@@ -91,8 +237,7 @@ def analyze_video_with_llm(temp_file_path: str, mime_type: str) -> str:
             Return **only** the JSON object, with no extra text.
         """
 
-        response = model.generate_content([uploaded_video, prompt])
-        parsed_response = parse_llm_response(response.text)
+        parsed_response = await _generate([video_part, prompt], "video")
 
         label = parsed_response.get("label")
         confidence = parsed_response.get("confidence")
@@ -101,24 +246,99 @@ def analyze_video_with_llm(temp_file_path: str, mime_type: str) -> str:
         return label, confidence, reason
 
     except Exception as e:
-        logger.error(f"Error in LLM analysis: {str(e)}")
-        return "Unknown", 0.0, f"Error: {str(e)}"
+        return _unknown_verdict(e, "LLM analysis")
     
     finally:
+        # Deleted in the background, the verdict is returned right away
         if uploaded_video:
-            genai.delete_file(uploaded_video)
-            logger.info("Cleaned up uploaded video from Gemini.")
+            janitor.discard_gemini_file(uploaded_video)
 
-def analyze_audio_with_llm(temp_file_path: str, mime_type: str) -> str:
+async def analyze_audio_with_llm(temp_file_path: str, mime_type: str) -> tuple:
     """
         Analyzes the audio using a large language model(Gemini) to classify it as 'AI' or 'Real'.
+        In 'segments' mode the verdict has a fourth element: the per-segment results.
+    """
+
+    if Config.AUDIO_ANALYSIS_MODE == "segments":
+        try:
+            return await analyze_audio_segments_with_llm(temp_file_path)
+        except MediaDecodeError as e:
+            logger.warning(f"Could not split audio into segments, analyzing the whole file: {e}")
+
+    return await analyze_whole_audio_with_llm(temp_file_path, mime_type)
+
+async def analyze_audio_segments_with_llm(temp_file_path: str) -> tuple:
+    """
+        Decodes the audio locally into overlapping mono windows, scores the windows concurrently
+        with bounded parallelism and aggregates them.
+        Returns (label, confidence, reason, segments), each segment has start/end in seconds.
+    """
+
+    duration = await probe_duration(temp_file_path)
+    windows = plan_windows(duration, Config.AUDIO_SEGMENT_SECONDS, Config.AUDIO_SEGMENT_OVERLAP_SECONDS)
+    semaphore = asyncio.Semaphore(Config.AUDIO_SEGMENT_CONCURRENCY)
+
+    async def score(start: float, end: float) -> dict:
+        async with semaphore:
+            label, confidence, reason = await analyze_audio_window_with_llm(temp_file_path, start, end)
+
+        return {"start": start, "end": end, "label": label, "confidence": confidence, "reason": reason}
+
+    segments = await asyncio.gather(*(score(start, end) for start, end in windows))
+    label, confidence, reason = aggregate_segments(segments, Config.AUDIO_SEGMENT_AI_THRESHOLD)
+
+    logger.info(f"Scored {len(segments)} audio segments of a {duration:.1f}s recording: {label} ({confidence})")
+    return label, confidence, reason, segments
+
+async def analyze_audio_window_with_llm(temp_file_path: str, start: float, end: float) -> tuple:
+    """
+        Analyzes one window of the audio, sent inline as mono WAV.
+    """
+
+    try:
+        with track_stage("decode", "audio"):
+            wav = await extract_audio_window(temp_file_path, start, end - start, Config.AUDIO_SAMPLE_RATE)
+
+        prompt = """
+            You are an expert audio forensics analyst. Your task is to determine whether the provided audio excerpt is **AI** or **Real**.
+
+            ### Instructions:
+            1. Listen for acoustic realism, breathing patterns, artifacts, and digital anomalies.
+            2. Decide whether the audio is **AI-generated** or **Real**.
+            3. Estimate your **confidence score** between 0 and 1.
+            4. Provide a **concise reason (≤ 20 words)** supporting your classification. Use simple English to ensure clarity.
+
+            ### Response Format (strictly follow this JSON structure):
+            {
+            "label": "AI" | "Real",
+            "confidence": float,
+            "reason": "string (≤ 20 words)"
+            }
+
+            Return **only** the JSON object, with no extra text.
+        """
+
+        parsed_response = await _generate([{"mime_type": "audio/wav", "data": wav}, prompt], "audio")
+
+        label = parsed_response.get("label")
+        confidence = parsed_response.get("confidence")
+        reason = parsed_response.get("reason")
+
+        return label, confidence, reason
+
+    except Exception as e:
+        return _unknown_verdict(e, f"LLM analysis of audio segment {start}-{end}s")
+
+async def analyze_whole_audio_with_llm(temp_file_path: str, mime_type: str) -> tuple:
+    """
+        Analyzes the whole audio file in one request, sent inline or uploaded to Gemini when it is large.
     """
     
     uploaded_audio = None
     
     try:
-        # Upload the audio to Gemini
-        uploaded_audio = genai.upload_file(temp_file_path, mime_type=mime_type)
+        # Send the audio inline, or upload it to Gemini when it is large
+        audio_part, uploaded_audio = await _media_part(temp_file_path, mime_type, "audio")
 
         prompt = """
             You are an expert audio forensics analyst. Your task is to determine whether the provided audio file is **AI** or **Real**.
@@ -139,8 +359,7 @@ def analyze_audio_with_llm(temp_file_path: str, mime_type: str) -> str:
             Return **only** the JSON object, with no extra text.
         """
 
-        response = model.generate_content([uploaded_audio, prompt])
-        parsed_response = parse_llm_response(response.text)
+        parsed_response = await _generate([audio_part, prompt], "audio")
 
         label = parsed_response.get("label")
         confidence = parsed_response.get("confidence")
@@ -149,10 +368,9 @@ def analyze_audio_with_llm(temp_file_path: str, mime_type: str) -> str:
         return label, confidence, reason
 
     except Exception as e:
-        logger.error(f"Error in LLM analysis: {str(e)}")
-        return "Unknown", 0.0, f"Error: {str(e)}"
+        return _unknown_verdict(e, "LLM analysis")
     
     finally:
+        # Deleted in the background, the verdict is returned right away
         if uploaded_audio:
-            genai.delete_file(uploaded_audio)
-            logger.info("Cleaned up uploaded audio from Gemini.")
\ No newline at end of file
+            janitor.discard_gemini_file(uploaded_audio)
\ No newline at end of file
@@ -0,0 +1,127 @@
+import asyncio
+import json
+from typing import Optional
+
+from app.utils.logger import logger
+
+FRAME_WIDTH = 768
+SCENE_THRESHOLD = 0.3
+MAX_PARALLEL_SEEKS = 4
+
+class MediaDecodeError(Exception):
+    """
+        Raised when ffmpeg/ffprobe cannot decode the given media file.
+    """
+
+async def _run(*args: str) -> bytes:
+    """
+        Runs an ffmpeg/ffprobe command and returns its stdout.
+    """
+
+    try:
+        process = await asyncio.create_subprocess_exec(
+            *args,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.PIPE
+        )
+    except FileNotFoundError:
+        raise MediaDecodeError(f"{args[0]} is not installed.")
+
+    stdout, stderr = await process.communicate()
+
+    if process.returncode != 0:
+        raise MediaDecodeError(f"{args[0]} failed: {stderr.decode(errors='ignore').strip()[-300:]}")
+
+    return stdout
+
+async def probe_duration(file_path: str) -> float:
+    """
+        Returns the duration of a media file in seconds.
+    """
+
+    output = await _run(
+        "ffprobe", "-v", "error", "-show_entries", "format=duration", "-of", "json", file_path
+    )
+
+    try:
+        return float(json.loads(output)["format"]["duration"])
+    except (KeyError, ValueError) as e:
+        raise MediaDecodeError(f"Could not read duration of {file_path}: {e}")
+
+async def _frame_at(file_path: str, timestamp: float) -> bytes:
+    # -ss before -i seeks to the nearest keyframe, so only a few frames are decoded
+    return await _run(
+        "ffmpeg", "-v", "error", "-ss", f"{timestamp:.3f}", "-i", file_path,
+        "-frames:v", "1", "-vf", f"scale='min({FRAME_WIDTH},iw)':-2",
+        "-f", "image2pipe", "-vcodec", "mjpeg", "-q:v", "3", "pipe:1"
+    )
+
+async def _uniform_frames(file_path: str, duration: float, count: int) -> list:
+    semaphore = asyncio.Semaphore(MAX_PARALLEL_SEEKS)
+
+    async def frame(index: int) -> bytes:
+        async with semaphore:
+            return await _frame_at(file_path, duration * (index + 0.5) / count)
+
+    frames = await asyncio.gather(*(frame(index) for index in range(count)))
+    return [frame for frame in frames if frame]
+
+async def _scene_change_frames(file_path: str, count: int) -> list:
+    output = await _run(
+        "ffmpeg", "-v", "error", "-i", file_path,
+        "-vf", f"select='gt(scene,{SCENE_THRESHOLD})',scale='min({FRAME_WIDTH},iw)':-2",
+        "-vsync", "vfr", "-frames:v", str(count),
+        "-f", "image2pipe", "-vcodec", "mjpeg", "-q:v", "3", "pipe:1"
+    )
+
+    # The mjpeg stream is a plain concatenation of JPEG files (SOI ... EOI)
+    parts = output.split(b"\xff\xd9\xff\xd8")
+    return [
+        (b"" if index == 0 else b"\xff\xd8") + part + (b"" if index == len(parts) - 1 else b"\xff\xd9")
+        for index, part in enumerate(parts) if part
+    ]
+
+async def extract_keyframes(file_path: str, count: int, sampling: str = "uniform") -> list:
+    """
+        Decodes the video locally and returns up to `count` representative frames as JPEG bytes.
+        'scene' sampling picks frames at scene changes and tops up with uniform samples when the
+        video has too few cuts, 'uniform' sampling picks evenly spaced frames.
+    """
+
+    duration = await probe_duration(file_path)
+    frames = []
+
+    if sampling == "scene":
+        frames = await _scene_change_frames(file_path, count)
+
+    if len(frames) < count:
+        frames += await _uniform_frames(file_path, duration, count - len(frames))
+
+    logger.info(f"Sampled {len(frames)} frames ({sampling}) from a {duration:.1f}s video.")
+    return frames
+
+async def extract_audio_excerpt(file_path: str, seconds: float) -> Optional[bytes]:
+    """
+        Returns the first `seconds` of the audio track as mono 16 kHz MP3, or None if there is none.
+    """
+
+    try:
+        output = await _run(
+            "ffmpeg", "-v", "error", "-i", file_path, "-vn", "-ac", "1", "-ar", "16000",
+            "-t", str(seconds), "-f", "mp3", "pipe:1"
+        )
+    except MediaDecodeError as e:
+        logger.info(f"No audio excerpt extracted: {e}")
+        return None
+
+    return output or None
+
+async def extract_audio_window(file_path: str, start: float, duration: float, sample_rate: int) -> bytes:
+    """
+        Decodes one window of the audio track, downmixed to mono and resampled, as WAV bytes.
+    """
+
+    return await _run(
+        "ffmpeg", "-v", "error", "-ss", f"{start:.3f}", "-t", f"{duration:.3f}", "-i", file_path,
+        "-vn", "-ac", "1", "-ar", str(sample_rate), "-f", "wav", "pipe:1"
+    )
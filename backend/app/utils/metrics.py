@@ -0,0 +1,267 @@
+import bisect
+import threading
+import time
+from contextlib import contextmanager
+
+# Latency buckets in seconds, from a cache hit up to a long video analysis
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+
+class Registry:
+    """
+        Holds every metric and renders them in the Prometheus text exposition format.
+
+        With several worker processes, render() merges in the snapshot() of the other workers:
+        counters and histograms are added up, gauges are added up (or the largest value is taken,
+        see Gauge) over the workers that are still running.
+    """
+
+    def __init__(self):
+        self._metrics = []
+
+    def register(self, metric):
+        self._metrics.append(metric)
+
+    def snapshot(self) -> dict:
+        """
+            The current samples of every metric, JSON-serializable, to be merged by another process.
+        """
+
+        return {metric.name: [[name, labels, value] for name, labels, value in metric.samples()] for metric in self._metrics}
+
+    def render(self, others: list = ()) -> str:
+        """
+            others are (snapshot, alive) pairs of the other worker processes.
+        """
+
+        lines = []
+
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.help}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+
+            samples = {(name, tuple(labels)): value for name, labels, value in metric.samples()}
+
+            for snapshot, alive in others:
+                # The gauges of a worker that is gone no longer describe anything
+                if metric.type == "gauge" and not alive:
+                    continue
+
+                for name, labels, value in snapshot.get(metric.name, ()):
+                    key = (name, tuple(tuple(label) for label in labels))
+                    samples[key] = metric.merge(samples[key], value) if key in samples else value
+
+            for (name, labels), value in samples.items():
+                lines.append(f"{name}{_format_labels(labels)} {_format_value(value)}")
+
+        return "\n".join(lines) + "\n"
+
+REGISTRY = Registry()
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _format_labels(labels: list) -> str:
+    if not labels:
+        return ""
+
+    return "{" + ",".join(f'{name}="{_escape(str(value))}"' for name, value in labels) + "}"
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+class _Metric:
+    """
+        Base of the metric types: values are kept per label combination behind a lock,
+        so they can be updated from the event loop and from executor threads alike.
+    """
+
+    type = None
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), registry: Registry = REGISTRY):
+        self.name = name
+        self.help = help
+        self.labelnames = labelnames
+
+        self._values = {}
+        self._lock = threading.Lock()
+
+        registry.register(self)
+
+    def _key(self, labels: dict) -> tuple:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def _labels(self, key: tuple) -> list:
+        return list(zip(self.labelnames, key))
+
+    def merge(self, value: float, other: float) -> float:
+        return value + other
+
+class Counter(_Metric):
+    type = "counter"
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = list(self._values.items())
+
+        for key, value in values:
+            yield self.name, self._labels(key), value
+
+class Gauge(_Metric):
+    """
+        Merged across worker processes by adding the values up, or with multiprocess_mode "max"
+        by taking the largest one (for values every worker has, like a configured limit).
+    """
+
+    type = "gauge"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), multiprocess_mode: str = "sum", registry: Registry = REGISTRY):
+        super().__init__(name, help, labelnames, registry)
+        self.multiprocess_mode = multiprocess_mode
+
+    def merge(self, value: float, other: float) -> float:
+        return max(value, other) if self.multiprocess_mode == "max" else value + other
+
+    def set(self, value: float, **labels):
+        key = self._key(labels)
+
+        with self._lock:
+            self._values[key] = value
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def dec(self, amount: float = 1, **labels):
+        self.inc(-amount, **labels)
+
+    def samples(self):
+        with self._lock:
+            values = list(self._values.items())
+
+        for key, value in values:
+            yield self.name, self._labels(key), value
+
+class Histogram(_Metric):
+    type = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: tuple = (), buckets: tuple = DEFAULT_BUCKETS, registry: Registry = REGISTRY):
+        super().__init__(name, help, labelnames, registry)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+
+        with self._lock:
+            counts, total = self._values.get(key) or ([0] * (len(self.buckets) + 1), 0.0)
+            counts[index] += 1
+            self._values[key] = (counts, total + value)
+
+    @contextmanager
+    def time(self, **labels):
+        started = time.perf_counter()
+
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - started, **labels)
+
+    def samples(self):
+        with self._lock:
+            values = [(key, list(counts), total) for key, (counts, total) in self._values.items()]
+
+        for key, counts, total in values:
+            labels = self._labels(key)
+            cumulative = 0
+
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield f"{self.name}_bucket", labels + [("le", _format_value(float(bound)))], cumulative
+
+            yield f"{self.name}_sum", labels, total
+            yield f"{self.name}_count", labels, cumulative
+
+STAGE_SECONDS = Histogram(
+    "trueai_stage_duration_seconds",
+    "Duration of each analysis stage.",
+    ("stage", "media_type")
+)
+
+IN_FLIGHT = Gauge(
+    "trueai_stage_in_flight",
+    "Analysis stages currently running.",
+    ("stage", "media_type")
+)
+
+ERRORS = Counter(
+    "trueai_stage_errors_total",
+    "Failed analysis stages by type of failure.",
+    ("stage", "media_type", "error_type")
+)
+
+BYTES = Counter(
+    "trueai_bytes_total",
+    "Bytes of media received and sent on to Cloudinary and Gemini.",
+    ("direction", "media_type")
+)
+
+@contextmanager
+def track_stage(stage: str, media_type: str):
+    """
+        Times the wrapped block into STAGE_SECONDS, counts it in IN_FLIGHT while it runs and
+        counts an exception escaping it in ERRORS by exception class.
+    """
+
+    IN_FLIGHT.inc(stage=stage, media_type=media_type)
+    started = time.perf_counter()
+
+    try:
+        yield
+    except BaseException as e:
+        ERRORS.inc(stage=stage, media_type=media_type, error_type=type(e).__name__)
+        raise
+    finally:
+        STAGE_SECONDS.observe(time.perf_counter() - started, stage=stage, media_type=media_type)
+        IN_FLIGHT.dec(stage=stage, media_type=media_type)
+
+ADMISSION_TURNED_AWAY = Counter(
+    "trueai_admission_turned_away_total",
+    "Analyze requests turned away by the admission queue, because it was full or the wait timed out.",
+    ("reason",)
+)
+
+CACHE_LOOKUPS = Counter(
+    "trueai_verdict_cache_lookups_total",
+    "Verdict cache lookups by result.",
+    ("result",)
+)
+
+SCHEDULER_WAIT = Histogram(
+    "trueai_scheduler_wait_seconds",
+    "Time analyses waited in the fair scheduler before they started.",
+    ("media_type",)
+)
+
+GEMINI_MEDIA_BYTES = Histogram(
+    "trueai_gemini_media_bytes",
+    "Size of media sent to Gemini, by whether it went inline or through the File API.",
+    ("media_type", "path"),
+    buckets=tuple(kb * 1024 for kb in (256, 512, 1024, 2048, 4096, 8192, 16384, 32768, 65536))
+)
+
+GEMINI_INLINE_MAX = Gauge(
+    "trueai_gemini_inline_max_bytes",
+    "Largest media sent inline to Gemini, larger media goes through the File API.",
+    multiprocess_mode="max"
+)
@@ -0,0 +1,29 @@
+from PIL import Image, ImageOps
+
+HASH_SIZE = 8  # 8x8 gradient bits -> 64-bit hash
+
+def dhash(file_path: str, hash_size: int = HASH_SIZE) -> int:
+    """
+        Computes the difference hash (dHash) of an image.
+        The image is shrunk to (hash_size + 1) x hash_size grayscale pixels and every bit records
+        whether a pixel is brighter than its right neighbour. Re-saving, resizing or recompressing
+        an image only flips a few bits, so near-duplicates have a small Hamming distance.
+    """
+
+    with Image.open(file_path) as image:
+        image = ImageOps.exif_transpose(image)
+        image = image.convert("L").resize((hash_size + 1, hash_size), Image.Resampling.LANCZOS)
+        pixels = list(image.getdata())
+
+    value = 0
+
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+
+        for col in range(hash_size):
+            value = (value << 1) | (pixels[offset + col] > pixels[offset + col + 1])
+
+    return value
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
@@ -0,0 +1,216 @@
+import hashlib
+from contextlib import aclosing
+from typing import AsyncIterator, Callable, Optional
+import aiofiles
+import aiofiles.os
+import aiofiles.tempfile
+import httpx
+from fastapi import HTTPException, Request, Response, UploadFile
+from fastapi.routing import APIRoute
+from starlette.datastructures import FormData
+from starlette.formparsers import MultiPartException, MultiPartParser
+
+from app.config import Config
+from app.utils.logger import logger
+from app.utils.metrics import BYTES, track_stage
+
+CHUNK_SIZE = 1024 * 1024  # 1 MB
+SNIFF_SIZE = 64
+SPOOL_PREFIX = "trueai-"
+
+# ISO base media (MP4/MOV/M4A/HEIC) brands found at bytes 8-12, after the "ftyp" box type
+FTYP_BRANDS = {
+    b"heic": "image/heic", b"heix": "image/heic", b"mif1": "image/heif", b"msf1": "image/heif",
+    b"avif": "image/avif",
+    b"M4A ": "audio/mp4", b"M4B ": "audio/mp4",
+    b"qt  ": "video/quicktime",
+    b"isom": "video/mp4", b"iso2": "video/mp4", b"mp41": "video/mp4", b"mp42": "video/mp4",
+    b"avc1": "video/mp4", b"dash": "video/mp4", b"3gp4": "video/3gpp", b"3gp5": "video/3gpp",
+    b"3g2a": "video/3gpp2"
+}
+
+def sniff_mime_type(head: bytes) -> Optional[str]:
+    """
+        Detects the real MIME type of a file from its magic bytes.
+        Returns None if the format is not one we analyze.
+    """
+
+    if head.startswith(b"\xff\xd8\xff"):
+        return "image/jpeg"
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head.startswith((b"GIF87a", b"GIF89a")):
+        return "image/gif"
+    if head.startswith(b"BM"):
+        return "image/bmp"
+    if head.startswith((b"II*\x00", b"MM\x00*")):
+        return "image/tiff"
+
+    if head.startswith(b"RIFF") and len(head) >= 12:
+        return {b"WEBP": "image/webp", b"WAVE": "audio/wav", b"AVI ": "video/x-msvideo"}.get(head[8:12])
+
+    if head[4:8] == b"ftyp":
+        return FTYP_BRANDS.get(head[8:12], "video/mp4")
+
+    if head.startswith(b"\x1a\x45\xdf\xa3"):
+        return "video/webm"
+
+    if head.startswith(b"ID3"):
+        return "audio/mpeg"
+    if head.startswith(b"OggS"):
+        return "audio/ogg"
+    if head.startswith(b"fLaC"):
+        return "audio/flac"
+    # Raw MPEG audio frame sync (11 set bits), e.g. an MP3 without ID3 tag
+    if len(head) >= 2 and head[0] == 0xFF and head[1] & 0xE0 == 0xE0:
+        return "audio/mpeg"
+
+    return None
+
+class UploadMultiPartParser(MultiPartParser):
+    """
+        Keeps uploaded parts in memory up to UPLOAD_SPOOL_MAX_BYTES while the form is parsed,
+        then spills them to disk.
+    """
+
+    spool_max_size = Config.UPLOAD_SPOOL_MAX_BYTES
+
+class UploadRequest(Request):
+    """
+        Request whose multipart form is parsed with UploadMultiPartParser.
+        Other forms are parsed as usual.
+    """
+
+    async def _get_form(self, *, max_files: int | float = 1000, max_fields: int | float = 1000, max_part_size: int = 1024 * 1024) -> FormData:
+        content_type = self.headers.get("content-type", "").split(";")[0].strip().lower()
+
+        if self._form is None and content_type == "multipart/form-data":
+            try:
+                async with aclosing(self.stream()) as stream:
+                    parser = UploadMultiPartParser(
+                        self.headers, stream, max_files=max_files, max_fields=max_fields, max_part_size=max_part_size
+                    )
+                    self._form = await parser.parse()
+            except MultiPartException as exc:
+                raise HTTPException(status_code=400, detail=exc.message)
+
+        return await super()._get_form(max_files=max_files, max_fields=max_fields, max_part_size=max_part_size)
+
+class UploadRoute(APIRoute):
+    """
+        Route class of the routers that take file uploads, see UploadRequest.
+    """
+
+    def get_route_handler(self) -> Callable:
+        route_handler = super().get_route_handler()
+
+        async def upload_route_handler(request: Request) -> Response:
+            return await route_handler(UploadRequest(request.scope, request.receive))
+
+        return upload_route_handler
+
+async def ingest_upload(file: UploadFile, media_type: Optional[str], max_size: int) -> dict:
+    """
+        Streams the uploaded file to a temporary file in chunks with async file I/O.
+        In the same pass it enforces the size limit, computes the SHA-256 of the content
+        and sniffs the real MIME type from the magic bytes, so oversized or mislabeled
+        uploads are rejected before they are fully written to disk.
+
+        media_type None accepts any image, video or audio file, the detected one is returned.
+
+        Returns {"path", "size", "sha256", "mime_type", "media_type"}.
+    """
+
+    with track_stage("spool", media_type or "any"):
+        upload = await _spool(_read_chunks(file), file.size, file.content_type, media_type, max_size)
+
+    BYTES.inc(upload["size"], direction="received", media_type=upload["media_type"])
+    return upload
+
+async def ingest_url(url: str, media_type: Optional[str], max_size: int, timeout: float) -> dict:
+    """
+        Streams the file at the given URL (e.g. a Cloudinary asset) to a temporary file,
+        with the same size limit, hashing and type check as ingest_upload().
+
+        Returns {"path", "size", "sha256", "mime_type", "media_type"}.
+    """
+
+    with track_stage("download", media_type or "any"):
+        async with httpx.AsyncClient(timeout=timeout, follow_redirects=True) as client:
+            async with client.stream("GET", url) as response:
+                response.raise_for_status()
+
+                content_length = response.headers.get("content-length")
+                declared_size = int(content_length) if content_length and content_length.isdigit() else None
+
+                upload = await _spool(
+                    response.aiter_bytes(CHUNK_SIZE), declared_size, response.headers.get("content-type"), media_type, max_size
+                )
+
+    BYTES.inc(upload["size"], direction="downloaded", media_type=upload["media_type"])
+    return upload
+
+async def _read_chunks(file: UploadFile) -> AsyncIterator[bytes]:
+    while chunk := await file.read(CHUNK_SIZE):
+        yield chunk
+
+async def _spool(
+    chunks: AsyncIterator[bytes],
+    declared_size: Optional[int],
+    declared_type: Optional[str],
+    media_type: Optional[str],
+    max_size: int
+) -> dict:
+    if declared_size and declared_size > max_size:
+        raise HTTPException(status_code=413, detail=f"File size exceeds the {max_size // (1024 * 1024)}MB limit.")
+
+    digest = hashlib.sha256()
+    size = 0
+    head = b""
+    mime_type = None
+
+    async with aiofiles.tempfile.NamedTemporaryFile("wb", delete=False, prefix=SPOOL_PREFIX) as temp_file:
+        temp_file_path = temp_file.name
+
+        try:
+            async for chunk in chunks:
+                size += len(chunk)
+
+                if size > max_size:
+                    raise HTTPException(status_code=413, detail=f"File size exceeds the {max_size // (1024 * 1024)}MB limit.")
+
+                if mime_type is None:
+                    head = (head + chunk)[:SNIFF_SIZE]
+
+                    if len(head) == SNIFF_SIZE or len(chunk) < CHUNK_SIZE:
+                        mime_type = _check_media_type(head, media_type)
+
+                digest.update(chunk)
+                await temp_file.write(chunk)
+
+            if mime_type is None:
+                mime_type = _check_media_type(head, media_type)
+
+        except BaseException:
+            await temp_file.close()
+            await aiofiles.os.remove(temp_file_path)
+            raise
+
+    if declared_type and declared_type != mime_type:
+        logger.info(f"Upload declared as {declared_type} but detected as {mime_type}")
+
+    return {
+        "path": temp_file_path,
+        "size": size,
+        "sha256": digest.hexdigest(),
+        "mime_type": mime_type,
+        "media_type": mime_type.split("/")[0]
+    }
+
+def _check_media_type(head: bytes, media_type: str) -> str:
+    mime_type = sniff_mime_type(head)
+
+    if not mime_type or (media_type and mime_type.split("/")[0] != media_type):
+        raise HTTPException(status_code=415, detail=f"Unsupported file type. Expected a supported {media_type or 'media'} format.")
+
+    return mime_type
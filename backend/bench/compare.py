@@ -0,0 +1,54 @@
+import argparse
+import json
+import sys
+
+METRICS = ("requests_per_second", "p50_ms", "p95_ms", "p99_ms", "peak_rss_mb")
+
+def load(path: str) -> dict:
+    with open(path) as file:
+        results = json.load(file)
+
+    return {(scenario["endpoint"], scenario["concurrency"]): scenario for scenario in results["scenarios"]}
+
+def change(before: float, after: float) -> float:
+    return (after - before) / before * 100 if before else 0.0
+
+def compare(baseline: dict, current: dict, threshold: float) -> list:
+    """
+        Prints the change of every metric per scenario and returns the regressions: throughput
+        down or p95/p99 latency up by more than threshold percent.
+    """
+
+    regressions = []
+
+    for key in sorted(baseline.keys() & current.keys()):
+        endpoint, concurrency = key
+        cells = []
+
+        for metric in METRICS:
+            delta = change(baseline[key][metric], current[key][metric])
+            cells.append(f"{metric} {current[key][metric]} ({delta:+.1f}%)")
+
+            worse = -delta if metric == "requests_per_second" else delta
+
+            if metric in ("requests_per_second", "p95_ms", "p99_ms") and worse > threshold:
+                regressions.append(f"{endpoint} c={concurrency} {metric} {delta:+.1f}%")
+
+        print(f"{endpoint:>12} c={concurrency:<4} " + "  ".join(cells))
+
+    return regressions
+
+if __name__ == "__main__":
+    # python -m bench.compare baseline.json current.json --threshold 10
+    parser = argparse.ArgumentParser(description="Diff two benchmark result files.")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=10.0, help="percent change that counts as a regression")
+    args = parser.parse_args()
+
+    regressions = compare(load(args.baseline), load(args.current), args.threshold)
+
+    for regression in regressions:
+        print(f"REGRESSION: {regression}")
+
+    sys.exit(1 if regressions else 0)
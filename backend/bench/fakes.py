@@ -0,0 +1,302 @@
+import hashlib
+import json
+import os
+import random
+import re
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+class LatencyModel:
+    """
+        Log-normal latency (median seconds, sigma) with a failure probability, used by the
+        stand-ins to behave like a remote API without calling one. Seeded, so runs are repeatable.
+    """
+
+    def __init__(self, median: float, sigma: float = 0.0, failure_rate: float = 0.0, seed: int = 0):
+        self.median = median
+        self.sigma = sigma
+        self.failure_rate = failure_rate
+
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    @classmethod
+    def parse(cls, spec: str, seed: int = 0) -> "LatencyModel":
+        """
+            Parses "median[:sigma[:failure_rate]]", e.g. "0.4:0.5:0.01".
+        """
+
+        parts = [float(part) for part in spec.split(":")]
+        return cls(*parts, seed=seed)
+
+    def wait(self, name: str):
+        with self._lock:
+            delay = self.median * self._random.lognormvariate(0, self.sigma) if self.sigma else self.median
+            failed = self._random.random() < self.failure_rate
+
+        time.sleep(delay)
+
+        if failed:
+            raise RuntimeError(f"Simulated {name} failure")
+
+    def describe(self) -> dict:
+        return {"median_seconds": self.median, "sigma": self.sigma, "failure_rate": self.failure_rate}
+
+class _State:
+    def __init__(self, name: str):
+        self.name = name
+
+class FakeGeminiFile:
+    """
+        Stand-in for a Gemini File API file, PROCESSING until processing_seconds have passed.
+    """
+
+    def __init__(self, mime_type: str, processing_seconds: float):
+        self.name = f"files/{uuid.uuid4().hex}"
+        self.mime_type = mime_type
+        self._active_at = time.monotonic() + processing_seconds
+
+    @property
+    def state(self) -> _State:
+        return _State("ACTIVE" if time.monotonic() >= self._active_at else "PROCESSING")
+
+class FakeGemini:
+    """
+        Stand-in for the parts of google.generativeai the app calls.
+    """
+
+    def __init__(self, upload: LatencyModel, generate: LatencyModel, processing_seconds: float):
+        self.upload = upload
+        self.generate = generate
+        self.processing_seconds = processing_seconds
+
+        self._files = {}
+        self._lock = threading.Lock()
+
+    def upload_file(self, path: str, mime_type: str = None, **kwargs) -> FakeGeminiFile:
+        self.upload.wait("gemini upload")
+
+        # Only video needs server-side processing before it can be used
+        processing = self.processing_seconds if mime_type and mime_type.startswith("video/") else 0.0
+        file = FakeGeminiFile(mime_type, processing)
+
+        with self._lock:
+            self._files[file.name] = file
+
+        return file
+
+    def get_file(self, name: str) -> FakeGeminiFile:
+        with self._lock:
+            return self._files[name]
+
+    def list_files(self, **kwargs) -> list:
+        with self._lock:
+            return list(self._files.values())
+
+    def delete_file(self, file, **kwargs):
+        with self._lock:
+            self._files.pop(getattr(file, "name", file), None)
+
+    def configure(self, **kwargs):
+        pass
+
+    def model(self, model_name: str, **kwargs) -> "FakeModel":
+        return FakeModel(self.generate)
+
+class FakeResponse:
+    def __init__(self, text: str):
+        self.text = text
+
+class FakeModel:
+    def __init__(self, latency: LatencyModel):
+        self.latency = latency
+
+    def generate_content(self, contents, **kwargs) -> FakeResponse:
+        self.latency.wait("generate_content")
+
+        return FakeResponse(json.dumps({"label": "AI", "confidence": 0.93, "reason": "Benchmark stand-in verdict."}))
+
+class FakeCloudinary:
+    """
+        Stand-in for the cloudinary.uploader and cloudinary.api calls the app makes.
+        Direct uploads from clients are simulated with add_asset(), the stored assets are served
+        over HTTP on localhost once serve() has been called. The public_ids uploaded and deleted
+        are kept in uploaded and deleted.
+    """
+
+    def __init__(self, upload: LatencyModel, admin: LatencyModel):
+        self.upload_latency = upload
+        self.admin_latency = admin
+
+        self._assets = {}
+        self._lock = threading.Lock()
+        self._base_url = "https://res.cloudinary.com/bench"
+
+        self.uploaded = []
+        self.deleted = []
+
+    def serve(self) -> str:
+        """
+            Serves the added assets on a local port in a daemon thread. Returns the base URL.
+        """
+
+        assets, lock = self._assets, self._lock
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                match = re.search(r"upload/(?:v\d+/)?(.+)\.[a-zA-Z0-9]+$", self.path)
+
+                with lock:
+                    asset = assets.get(match.group(1)) if match else None
+
+                if asset is None:
+                    self.send_error(404)
+                    return
+
+                self.send_response(200)
+                self.send_header("Content-Length", str(len(asset["data"])))
+                self.end_headers()
+                self.wfile.write(asset["data"])
+
+            def log_message(self, *args):
+                pass
+
+        server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+
+        self._base_url = f"http://127.0.0.1:{server.server_port}/bench"
+        return self._base_url
+
+    def add_asset(self, public_id: str, data: bytes, resource_type: str = "image", created_at: datetime = None):
+        """
+            Stores an asset as if a client had uploaded it straight to Cloudinary, now unless created_at is given.
+        """
+
+        created_at = created_at or datetime.now(timezone.utc)
+
+        with self._lock:
+            self._assets[public_id] = {"data": data, "resource_type": resource_type, "created_at": created_at}
+
+    def resource(self, public_id: str, resource_type: str = "image", **kwargs) -> dict:
+        from cloudinary.exceptions import NotFound
+
+        self.admin_latency.wait("cloudinary resource")
+
+        with self._lock:
+            asset = self._assets.get(public_id)
+
+        if asset is None or asset["resource_type"] != resource_type:
+            raise NotFound(f"Resource not found - {public_id}")
+
+        return self._describe(public_id, asset)
+
+    def resources(self, prefix: str = "", resource_type: str = "image", **kwargs) -> dict:
+        self.admin_latency.wait("cloudinary resources")
+
+        with self._lock:
+            assets = [
+                (public_id, asset) for public_id, asset in self._assets.items()
+                if public_id.startswith(prefix) and asset["resource_type"] == resource_type
+            ]
+
+        return {"resources": [self._describe(public_id, asset) for public_id, asset in assets]}
+
+    def _describe(self, public_id: str, asset: dict) -> dict:
+        resource_type = asset["resource_type"]
+        extension = "png" if resource_type == "image" else "mp4"
+
+        return {
+            "public_id": public_id,
+            "resource_type": resource_type,
+            "secure_url": f"{self._base_url}/{resource_type}/upload/v1/{public_id}.{extension}",
+            "bytes": len(asset["data"]),
+            "etag": hashlib.md5(asset["data"]).hexdigest(),
+            "created_at": asset["created_at"].strftime("%Y-%m-%dT%H:%M:%SZ")
+        }
+
+    def upload(self, file_path: str, folder: str = "", resource_type: str = "image", **kwargs) -> dict:
+        self.upload_latency.wait("cloudinary upload")
+
+        public_id = f"{folder}/{uuid.uuid4().hex}"
+        extension = "png" if resource_type == "image" else "mp4"
+
+        with self._lock:
+            self.uploaded.append(public_id)
+
+        return {
+            "public_id": public_id,
+            "resource_type": resource_type,
+            "secure_url": f"https://res.cloudinary.com/bench/{resource_type}/upload/v1/{public_id}.{extension}",
+            "bytes": os.path.getsize(file_path)
+        }
+
+    def upload_large_part(self, file: tuple, http_headers: dict = None, resource_type: str = "image", public_id: str = None, **kwargs) -> dict:
+        self.upload_latency.wait("cloudinary upload part")
+
+        # "bytes start-end/total", the last part returns the complete upload response
+        start_end, total = http_headers["Content-Range"].split(" ")[1].split("/")
+        end = int(start_end.split("-")[1])
+
+        if end + 1 < int(total):
+            return {"done": False}
+
+        with self._lock:
+            self.uploaded.append(public_id)
+
+        return {
+            "public_id": public_id,
+            "resource_type": resource_type,
+            "secure_url": f"{self._base_url}/{resource_type}/upload/v1/{public_id}.mp4",
+            "bytes": int(total)
+        }
+
+    def destroy(self, public_id: str, resource_type: str = "image", **kwargs) -> dict:
+        self.admin_latency.wait("cloudinary destroy")
+
+        with self._lock:
+            self.deleted.append(public_id)
+
+        return {"result": "ok"}
+
+    def delete_resources(self, public_ids: list, resource_type: str = "image", **kwargs) -> dict:
+        self.admin_latency.wait("cloudinary delete_resources")
+
+        with self._lock:
+            for public_id in public_ids:
+                self._assets.pop(public_id, None)
+                self.deleted.append(public_id)
+
+        return {"deleted": {public_id: "deleted" for public_id in public_ids}}
+
+    def resources_by_ids(self, public_ids: list, resource_type: str = "image", **kwargs) -> dict:
+        self.admin_latency.wait("cloudinary resources_by_ids")
+        return {"resources": []}
+
+def install_fakes(fake_cloudinary: FakeCloudinary, fake_gemini: FakeGemini):
+    """
+        Replaces the Cloudinary and Gemini SDK entry points. Must run before the app is imported,
+        since the app builds its Gemini model at import time.
+    """
+
+    import cloudinary.api
+    import cloudinary.uploader
+    import google.generativeai as genai
+
+    cloudinary.uploader.upload = fake_cloudinary.upload
+    cloudinary.uploader.upload_large = fake_cloudinary.upload
+    cloudinary.uploader.upload_large_part = fake_cloudinary.upload_large_part
+    cloudinary.uploader.destroy = fake_cloudinary.destroy
+    cloudinary.api.delete_resources = fake_cloudinary.delete_resources
+    cloudinary.api.resources_by_ids = fake_cloudinary.resources_by_ids
+    cloudinary.api.resource = fake_cloudinary.resource
+    cloudinary.api.resources = fake_cloudinary.resources
+
+    genai.configure = fake_gemini.configure
+    genai.upload_file = fake_gemini.upload_file
+    genai.get_file = fake_gemini.get_file
+    genai.list_files = fake_gemini.list_files
+    genai.delete_file = fake_gemini.delete_file
+    genai.GenerativeModel = fake_gemini.model
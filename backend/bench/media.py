@@ -0,0 +1,48 @@
+import io
+import os
+import random
+import struct
+
+from PIL import Image
+
+def make_image(seed: int, size: int = 256) -> bytes:
+    """
+        A PNG of random noise, different for every seed so it misses the verdict cache
+        and the perceptual hash index.
+    """
+
+    noise = random.Random(seed).randbytes(size * size * 3)
+    image = Image.frombytes("RGB", (size, size), noise)
+
+    buffer = io.BytesIO()
+    image.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+# Random filler shared by all video and audio payloads, only the seed bytes differ
+_FILLER = os.urandom(1024 * 1024)
+
+def make_video(seed: int, size: int = 1024 * 1024) -> bytes:
+    """
+        An MP4 "ftyp" header followed by filler. Only the header is sniffed on ingest and the
+        stand-ins never decode it, so this is enough for the full-upload video path.
+    """
+
+    ftyp = struct.pack(">I4s4sI4s4s", 24, b"ftyp", b"isom", 0x200, b"isom", b"mp41")
+    return ftyp + seed.to_bytes(8, "big") + _filler(size - len(ftyp) - 8)
+
+def make_audio(seed: int, size: int = 512 * 1024) -> bytes:
+    """
+        A RIFF/WAVE header followed by filler, for the whole-file audio path.
+    """
+
+    header = b"RIFF" + struct.pack("<I", size - 8) + b"WAVEfmt "
+    return header + seed.to_bytes(8, "big") + _filler(size - len(header) - 8)
+
+def _filler(size: int) -> bytes:
+    return (_FILLER * (size // len(_FILLER) + 1))[:size]
+
+MEDIA = {
+    "image": ("image/png", "bench.png", make_image),
+    "video": ("video/mp4", "bench.mp4", make_video),
+    "audio": ("audio/wav", "bench.wav", make_audio)
+}
@@ -0,0 +1,255 @@
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import resource
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+
+from bench.fakes import LatencyModel, FakeCloudinary, FakeGemini, install_fakes
+from bench.media import MEDIA
+
+ENDPOINTS = ("image", "video", "audio", "image_reference", "history", "history_page")
+# Endpoints that upload straight to the Cloudinary stand-in and analyze by reference, by media type
+REFERENCE_ENDPOINTS = {"image_reference": "image"}
+EMAIL = "bench@trueai.local"
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description="Drive the analyze and history routes in-process with Cloudinary and Gemini stand-ins."
+    )
+    parser.add_argument("--endpoints", default=",".join(ENDPOINTS), help="comma-separated subset of: " + ", ".join(ENDPOINTS))
+    parser.add_argument("--concurrency", default="1,8,32", help="comma-separated concurrency levels")
+    parser.add_argument("--requests", type=int, default=100, help="requests per endpoint and concurrency level")
+    parser.add_argument("--warmup", type=int, default=5, help="untimed requests per endpoint before the first level")
+    parser.add_argument("--duplicate-ratio", type=float, default=0.0, help="share of uploads that repeat earlier bytes (verdict cache hits)")
+    parser.add_argument("--cloudinary-latency", default="0.4:0.3:0", help="upload latency as median_seconds[:sigma[:failure_rate]]")
+    parser.add_argument("--cloudinary-admin-latency", default="0.2:0.3:0", help="delete/lookup latency, same format")
+    parser.add_argument("--gemini-upload-latency", default="0.3:0.3:0", help="Gemini file upload latency, same format")
+    parser.add_argument("--gemini-latency", default="1.5:0.4:0", help="generate_content latency, same format")
+    parser.add_argument("--gemini-processing", type=float, default=2.0, help="seconds an uploaded video stays PROCESSING")
+    parser.add_argument("--seed", type=int, default=1, help="seed of the latency and failure draws")
+    parser.add_argument("--mongo-url", default=os.getenv("BENCH_MONGO_URL", "mongodb://localhost:27017"))
+    parser.add_argument("--db", default="trueai_bench", help="database to use, dropped before the run")
+    parser.add_argument("--keep-db", action="store_true", help="do not drop the database before the run")
+    parser.add_argument("--output", default="bench-results.json", help="where to write the JSON results")
+    return parser.parse_args()
+
+def configure_environment(args):
+    # Read by app.config when the app is imported
+    os.environ.update({
+        "MONGO_URL": args.mongo_url,
+        "MONGO_DB_NAME": args.db,
+        "GEMINI_API_KEY": "bench",
+        "CLOUDINARY_CLOUD_NAME": "bench",
+        "CLOUDINARY_API_KEY": "bench",
+        "CLOUDINARY_API_SECRET": "bench",
+        "VIDEO_ANALYSIS_MODE": "full",
+        "AUDIO_ANALYSIS_MODE": "whole"
+    })
+
+def percentile(values: list, q: float) -> float:
+    """
+        Nearest-rank percentile of an already sorted list.
+    """
+
+    if not values:
+        return None
+
+    rank = max(0, min(len(values) - 1, round(q / 100 * len(values) + 0.5) - 1))
+    return values[rank]
+
+def peak_rss_mb() -> float:
+    # ru_maxrss is in KB on Linux and in bytes on macOS
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / (1024 * 1024 if sys.platform == "darwin" else 1024), 1)
+
+def git_commit() -> str:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except Exception:
+        return None
+
+class Payloads:
+    """
+        Hands out upload bodies. Every body is unique unless it is picked as a duplicate,
+        in which case it repeats the first body of its media type.
+    """
+
+    def __init__(self, duplicate_ratio: float, seed: int):
+        self.duplicate_ratio = duplicate_ratio
+        self._random = random.Random(seed)
+        self._next_seed = 1
+
+    def next(self, media_type: str):
+        mime_type, filename, make = MEDIA[media_type]
+
+        if self._next_seed > 1 and self._random.random() < self.duplicate_ratio:
+            seed = 0
+        else:
+            seed = self._next_seed
+            self._next_seed += 1
+
+        return mime_type, filename, make(seed)
+
+async def send(client, endpoint: str, payload, fake_cloudinary: FakeCloudinary) -> int:
+    if endpoint in REFERENCE_ENDPOINTS:
+        media_type = REFERENCE_ENDPOINTS[endpoint]
+        mime_type, filename, body = payload
+
+        signature = await client.post("/api/upload/signature", data={"clerk_user_id": "user_bench", "media_type": media_type})
+        signed = signature.json()
+        fake_cloudinary.add_asset(signed["public_id"], body, signed["resource_type"])
+
+        response = await client.post(
+            "/api/analyze/reference",
+            data={"clerk_user_id": "user_bench", "email": EMAIL, "media_type": media_type, "reference": signed["public_id"]}
+        )
+    elif endpoint == "history":
+        response = await client.get("/api/chat/history", params={"email": EMAIL})
+    elif endpoint == "history_page":
+        response = await client.get("/api/chat/history/page", params={"email": EMAIL, "limit": 20})
+    else:
+        mime_type, filename, body = payload
+        response = await client.post(
+            f"/api/{endpoint}/analyze",
+            data={"clerk_user_id": "user_bench", "email": EMAIL, "mime_type": mime_type},
+            files={"file": (filename, body, mime_type)}
+        )
+
+    return response.status_code
+
+async def run_scenario(client, endpoint: str, concurrency: int, requests: int, payloads: Payloads, fake_cloudinary: FakeCloudinary) -> dict:
+    # Bodies are built up front so their cost is not part of the measured latency
+    media_type = REFERENCE_ENDPOINTS.get(endpoint, endpoint)
+    bodies = [payloads.next(media_type) if media_type in MEDIA else None for _ in range(requests)]
+    semaphore = asyncio.Semaphore(concurrency)
+    latencies = []
+    errors = {}
+
+    async def one(payload):
+        async with semaphore:
+            started = time.perf_counter()
+
+            try:
+                status = await send(client, endpoint, payload, fake_cloudinary)
+                error = None if status == 200 else f"http_{status}"
+            except Exception as e:
+                error = type(e).__name__
+
+            latencies.append((time.perf_counter() - started) * 1000)
+
+            if error:
+                errors[error] = errors.get(error, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(payload) for payload in bodies))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+
+    return {
+        "endpoint": endpoint,
+        "concurrency": concurrency,
+        "requests": requests,
+        "errors": errors,
+        "error_rate": round(sum(errors.values()) / requests, 4),
+        "duration_seconds": round(elapsed, 3),
+        "requests_per_second": round(requests / elapsed, 2),
+        "mean_ms": round(sum(latencies) / len(latencies), 1),
+        "p50_ms": round(percentile(latencies, 50), 1),
+        "p95_ms": round(percentile(latencies, 95), 1),
+        "p99_ms": round(percentile(latencies, 99), 1),
+        "max_ms": round(latencies[-1], 1),
+        "peak_rss_mb": peak_rss_mb()
+    }
+
+async def main(args, fake_cloudinary: FakeCloudinary) -> dict:
+    import httpx
+    from app.core.database import client as mongo_client
+    from app.main import app
+
+    if not args.keep_db:
+        await mongo_client.drop_database(args.db)
+
+    endpoints = [endpoint.strip() for endpoint in args.endpoints.split(",") if endpoint.strip()]
+    levels = [int(level) for level in args.concurrency.split(",")]
+    payloads = Payloads(args.duplicate_ratio, args.seed)
+    scenarios = []
+
+    # Assets uploaded "directly" by the reference endpoints are downloaded from here
+    fake_cloudinary.serve()
+
+    async with app.router.lifespan_context(app):
+        transport = httpx.ASGITransport(app=app)
+
+        async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+            for endpoint in endpoints:
+                if args.warmup:
+                    await run_scenario(client, endpoint, 1, args.warmup, payloads, fake_cloudinary)
+
+            for concurrency in levels:
+                for endpoint in endpoints:
+                    result = await run_scenario(client, endpoint, concurrency, args.requests, payloads, fake_cloudinary)
+                    scenarios.append(result)
+
+                    print(
+                        f"{endpoint:>12} c={concurrency:<4} {result['requests_per_second']:>8.2f} req/s  "
+                        f"p50 {result['p50_ms']:>8.1f}  p95 {result['p95_ms']:>8.1f}  p99 {result['p99_ms']:>8.1f} ms  "
+                        f"errors {result['error_rate']:.2%}  rss {result['peak_rss_mb']} MB",
+                        flush=True
+                    )
+
+    return {
+        "meta": {
+            "commit": git_commit(),
+            "started_at": datetime.now(timezone.utc).isoformat(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "requests": args.requests,
+            "warmup": args.warmup,
+            "duplicate_ratio": args.duplicate_ratio,
+            "seed": args.seed,
+            "latency": {
+                "cloudinary_upload": LatencyModel.parse(args.cloudinary_latency).describe(),
+                "cloudinary_admin": LatencyModel.parse(args.cloudinary_admin_latency).describe(),
+                "gemini_upload": LatencyModel.parse(args.gemini_upload_latency).describe(),
+                "gemini_generate": LatencyModel.parse(args.gemini_latency).describe(),
+                "gemini_processing_seconds": args.gemini_processing
+            }
+        },
+        "scenarios": scenarios
+    }
+
+if __name__ == "__main__":
+    # python -m bench.run --concurrency 1,8,32 --requests 100 --output bench-results.json
+    args = parse_args()
+    configure_environment(args)
+
+    fake_cloudinary = FakeCloudinary(
+        LatencyModel.parse(args.cloudinary_latency, args.seed),
+        LatencyModel.parse(args.cloudinary_admin_latency, args.seed + 1)
+    )
+
+    install_fakes(
+        fake_cloudinary,
+        FakeGemini(
+            LatencyModel.parse(args.gemini_upload_latency, args.seed + 2),
+            LatencyModel.parse(args.gemini_latency, args.seed + 3),
+            args.gemini_processing
+        )
+    )
+
+    results = asyncio.run(main(args, fake_cloudinary))
+
+    with open(args.output, "w") as output:
+        json.dump(results, output, indent=2)
+
+    print(f"Results written to {args.output}")
@@ -1,11 +1,48 @@
+import os
+import shutil
+import sys
 import uvicorn
 
-if __name__ == "__main__":
+from app.config import Config
+
+def run_development():
     uvicorn.run(
-        "app.main:app", 
-        host="0.0.0.0", 
-        port=5001, 
+        "app.main:app",
+        host=Config.HOST,
+        port=Config.PORT,
         reload=True,
-        timeout_keep_alive=180,
-        limit_concurrency=3
-    )
\ No newline at end of file
+        timeout_keep_alive=Config.KEEP_ALIVE_TIMEOUT_SECONDS
+    )
+
+def run_production():
+    """
+        Several worker processes, no file watcher and no hard concurrency cap: load is shed by the
+        admission queue instead. On SIGTERM/SIGINT uvicorn stops accepting connections and waits
+        up to GRACEFUL_SHUTDOWN_TIMEOUT_SECONDS for in-flight requests, then the app's shutdown
+        gives running analysis jobs the same time to finish.
+    """
+
+    # The workers load the config again, --production must reach them too
+    os.environ["APP_ENV"] = "production"
+
+    # Metrics snapshots of the workers of an earlier run
+    shutil.rmtree(Config.METRICS_DIR, ignore_errors=True)
+
+    uvicorn.run(
+        "app.main:app",
+        host=Config.HOST,
+        port=Config.PORT,
+        workers=Config.WEB_WORKERS,
+        timeout_keep_alive=Config.KEEP_ALIVE_TIMEOUT_SECONDS,
+        timeout_graceful_shutdown=Config.GRACEFUL_SHUTDOWN_TIMEOUT_SECONDS,
+        proxy_headers=True,
+        forwarded_allow_ips=Config.FORWARDED_ALLOW_IPS
+    )
+
+if __name__ == "__main__":
+    # python run.py                -> development server with auto-reload
+    # python run.py --production   -> production server (or APP_ENV=production)
+    if "--production" in sys.argv or Config.APP_ENV == "production":
+        run_production()
+    else:
+        run_development()
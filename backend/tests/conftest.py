@@ -0,0 +1,223 @@
+import os
+import sys
+from collections import OrderedDict
+from types import SimpleNamespace
+
+import pytest
+from bson import ObjectId
+
+# The app reads its configuration at import time
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("MONGO_DB_NAME", "trueai_test")
+os.environ.setdefault("GEMINI_API_KEY", "test")
+os.environ.setdefault("CLOUDINARY_CLOUD_NAME", "test")
+os.environ.setdefault("CLOUDINARY_API_KEY", "test")
+os.environ.setdefault("CLOUDINARY_API_SECRET", "test")
+os.environ["WEB_WORKERS"] = "1"
+os.environ["IMAGE_PHASH_ENABLED"] = "false"
+os.environ["VIDEO_ANALYSIS_MODE"] = "full"
+os.environ["AUDIO_ANALYSIS_MODE"] = "whole"
+
+from bench.fakes import FakeCloudinary, FakeGemini, LatencyModel, install_fakes
+
+fake_cloudinary = FakeCloudinary(LatencyModel(0), LatencyModel(0))
+fake_gemini = FakeGemini(LatencyModel(0), LatencyModel(0), 0)
+
+# Before the app is imported, it builds its Gemini model at import time
+install_fakes(fake_cloudinary, fake_gemini)
+
+import app.main  # noqa: E402,F401
+from app.core.database import db as mongo_db  # noqa: E402
+from app.core.verdict_cache import verdict_cache  # noqa: E402
+
+def _is_operator(condition) -> bool:
+    return isinstance(condition, dict) and any(key.startswith("$") for key in condition)
+
+def _matches(document: dict, query: dict) -> bool:
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(_matches(document, alternative) for alternative in condition):
+                return False
+            continue
+
+        value = document.get(key)
+
+        if _is_operator(condition):
+            for operator, argument in condition.items():
+                if operator == "$in" and value not in argument:
+                    return False
+                if operator == "$lt" and (value is None or not value < argument):
+                    return False
+                if operator == "$lte" and (value is None or not value <= argument):
+                    return False
+                if operator == "$exists" and (key in document) != argument:
+                    return False
+
+        # None matches a missing field, as in Mongo
+        elif value != condition:
+            return False
+
+    return True
+
+def _apply(document: dict, update: dict, inserting: bool):
+    for operator, fields in update.items():
+        for key, value in fields.items():
+            if operator == "$set" or (operator == "$setOnInsert" and inserting):
+                document[key] = value
+            elif operator == "$inc":
+                document[key] = document.get(key, 0) + value
+            elif operator == "$unset":
+                document.pop(key, None)
+            elif operator == "$push":
+                document.setdefault(key, []).append(value)
+
+class FakeCursor:
+    def __init__(self, documents: list):
+        self._documents = documents
+
+    def sort(self, keys: list):
+        for key, direction in reversed(keys):
+            self._documents.sort(key=lambda document: document.get(key), reverse=direction < 0)
+        return self
+
+    def limit(self, count: int):
+        self._documents = self._documents[:count]
+        return self
+
+    async def to_list(self, length=None):
+        return self._documents[:length] if length else list(self._documents)
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        for document in self._documents:
+            yield document
+
+class FakeCollection:
+    """
+        In-memory stand-in for the motor collection calls the app makes.
+        Projections are ignored, every query returns copies of whole documents.
+    """
+
+    def __init__(self):
+        self.documents = []
+
+    def _find(self, query: dict) -> list:
+        return [document for document in self.documents if _matches(document, query or {})]
+
+    async def find_one(self, query: dict = None, projection: dict = None, **kwargs):
+        found = self._find(query)
+        return dict(found[0]) if found else None
+
+    def find(self, query: dict = None, projection: dict = None, **kwargs) -> FakeCursor:
+        return FakeCursor([dict(document) for document in self._find(query)])
+
+    async def distinct(self, field: str, query: dict = None) -> list:
+        return list(dict.fromkeys(document[field] for document in self._find(query) if field in document))
+
+    async def count_documents(self, query: dict) -> int:
+        return len(self._find(query))
+
+    async def insert_one(self, document: dict):
+        document.setdefault("_id", ObjectId())
+        self.documents.append(dict(document))
+        return SimpleNamespace(inserted_id=document["_id"])
+
+    async def insert_many(self, documents: list):
+        return SimpleNamespace(inserted_ids=[(await self.insert_one(document)).inserted_id for document in documents])
+
+    async def update_one(self, query: dict, update: dict, upsert: bool = False):
+        return self._update(query, update, upsert, many=False)
+
+    async def update_many(self, query: dict, update: dict, upsert: bool = False):
+        return self._update(query, update, upsert, many=True)
+
+    async def find_one_and_update(self, query: dict, update: dict, sort: list = None, return_document: bool = False, **kwargs):
+        found = FakeCursor(self._find(query)).sort(sort or [])._documents
+
+        if not found:
+            return None
+
+        before = dict(found[0])
+        _apply(found[0], update, inserting=False)
+
+        # ReturnDocument.AFTER is True
+        return dict(found[0]) if return_document else before
+
+    async def replace_one(self, query: dict, document: dict, upsert: bool = False):
+        found = self._find(query)
+
+        if found:
+            found[0].clear()
+            found[0].update(document)
+        elif upsert:
+            await self.insert_one(dict(document))
+
+        return SimpleNamespace(matched_count=len(found[:1]))
+
+    async def delete_many(self, query: dict):
+        found = self._find(query)
+        self.documents = [document for document in self.documents if not any(document is match for match in found)]
+        return SimpleNamespace(deleted_count=len(found))
+
+    async def bulk_write(self, operations: list, ordered: bool = True):
+        results = [self._update(operation._filter, operation._doc, operation._upsert, many=False) for operation in operations]
+
+        return SimpleNamespace(
+            upserted_count=sum(1 for result in results if result.upserted_id is not None),
+            modified_count=sum(result.modified_count for result in results)
+        )
+
+    def _update(self, query: dict, update: dict, upsert: bool, many: bool):
+        found = self._find(query)
+        found = found if many else found[:1]
+
+        for document in found:
+            _apply(document, update, inserting=False)
+
+        upserted_id = None
+
+        if not found and upsert:
+            document = {key: value for key, value in query.items() if not key.startswith("$") and not _is_operator(value)}
+            _apply(document, update, inserting=True)
+            document.setdefault("_id", ObjectId())
+            self.documents.append(document)
+            upserted_id = document["_id"]
+
+        return SimpleNamespace(matched_count=len(found), modified_count=len(found), upserted_id=upserted_id)
+
+class FakeDatabase:
+    def __init__(self):
+        self.collections = {}
+
+    def __getitem__(self, name: str) -> FakeCollection:
+        return self.collections.setdefault(name, FakeCollection())
+
+@pytest.fixture
+def anyio_backend():
+    return "asyncio"
+
+@pytest.fixture
+def fake_db(monkeypatch) -> FakeDatabase:
+    """
+        Points every app module that uses Mongo at a fresh in-memory database.
+    """
+
+    database = FakeDatabase()
+
+    for name, module in list(sys.modules.items()):
+        if name.startswith("app.") and getattr(module, "db", None) is mongo_db:
+            monkeypatch.setattr(module, "db", database)
+
+    monkeypatch.setattr(verdict_cache, "collection", database["verdict_cache"])
+    monkeypatch.setattr(verdict_cache, "_entries", OrderedDict())
+
+    return database
+
+@pytest.fixture
+def cloudinary() -> FakeCloudinary:
+    fake_cloudinary.uploaded.clear()
+    fake_cloudinary.deleted.clear()
+    fake_cloudinary._assets.clear()
+    return fake_cloudinary
@@ -0,0 +1,144 @@
+import asyncio
+
+import pytest
+
+from app.core.admission import AdmissionQueue, AdmissionRejected, ByteBudget
+from app.core.middleware import AdmissionControlMiddleware
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_reservations_are_granted_in_arrival_order():
+    budget = ByteBudget(100, timeout=5)
+    release = asyncio.Event()
+    granted = []
+
+    async def request(label: str, size: int):
+        async with budget.reserve(size):
+            granted.append(label)
+            await release.wait()
+
+    first = asyncio.create_task(request("first", 60))
+    await asyncio.sleep(0)
+    large = asyncio.create_task(request("large", 80))
+    await asyncio.sleep(0)
+
+    # Would fit next to the first one, but must not overtake the large request queued before it
+    small = asyncio.create_task(request("small", 10))
+    await asyncio.sleep(0)
+
+    assert granted == ["first"]
+    assert budget.stats()["waiting"] == 2
+    assert budget.stats()["waiting_bytes"] == 90
+
+    release.set()
+    await asyncio.gather(first, large, small)
+
+    assert granted == ["first", "large", "small"]
+    assert budget.stats()["used_bytes"] == 0
+
+
+async def test_used_bytes_never_exceed_the_limit():
+    budget = ByteBudget(100, timeout=5)
+    peak = 0
+
+    async def request(size: int):
+        nonlocal peak
+
+        async with budget.reserve(size):
+            peak = max(peak, budget.stats()["used_bytes"])
+            await asyncio.sleep(0.001 * size)
+
+    await asyncio.gather(*(request(size) for size in (70, 20, 50, 30, 90, 10, 40, 60)))
+
+    assert peak <= 100
+    assert budget.stats()["used_bytes"] == 0
+    assert budget.stats()["reserved"] == 8
+
+
+async def test_reservation_larger_than_the_budget_takes_all_of_it():
+    budget = ByteBudget(100, timeout=5)
+
+    async with budget.reserve(500):
+        assert budget.stats()["used_bytes"] == 100
+
+    assert budget.stats()["used_bytes"] == 0
+
+
+async def test_timed_out_reservation_is_rejected_and_leaves_the_queue():
+    budget = ByteBudget(100, timeout=0.05)
+    release = asyncio.Event()
+
+    async def hold():
+        async with budget.reserve(100):
+            await release.wait()
+
+    holder = asyncio.create_task(hold())
+    await asyncio.sleep(0)
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        async with budget.reserve(10):
+            pass
+
+    assert rejected.value.retry_after >= 1
+    assert budget.stats()["waiting"] == 0
+    assert budget.stats()["timed_out"] == 1
+
+    release.set()
+    await holder
+
+    async with budget.reserve(100):
+        assert budget.stats()["used_bytes"] == 100
+
+
+async def test_cancelled_reservation_does_not_block_the_queue():
+    budget = ByteBudget(100, timeout=5)
+    release = asyncio.Event()
+    granted = []
+
+    async def request(label: str, size: int):
+        async with budget.reserve(size):
+            granted.append(label)
+            await release.wait()
+
+    first = asyncio.create_task(request("first", 50))
+    await asyncio.sleep(0)
+    cancelled = asyncio.create_task(request("cancelled", 100))
+    await asyncio.sleep(0)
+    waiting = asyncio.create_task(request("waiting", 50))
+    await asyncio.sleep(0)
+
+    cancelled.cancel()
+    await asyncio.gather(cancelled, return_exceptions=True)
+    await asyncio.sleep(0)
+
+    # The cancelled request was at the head of the queue, the one behind it now fits
+    assert granted == ["first", "waiting"]
+
+    release.set()
+    await asyncio.gather(first, waiting)
+
+    assert budget.stats()["used_bytes"] == 0
+    assert budget.stats()["waiting"] == 0
+
+
+async def test_bodiless_requests_bypass_admission_and_the_budget():
+    admission = AdmissionQueue(max_active=1, max_queue=0, queue_timeout=5)
+    budget = ByteBudget(100, timeout=5)
+    calls = []
+
+    async def app(scope, receive, send):
+        calls.append((scope["method"], admission.stats()["active"], budget.stats()["used_bytes"]))
+
+    middleware = AdmissionControlMiddleware(app, admission, ("/api/video/",), budget, max_request_size=100)
+
+    def scope(method: str) -> dict:
+        return {"type": "http", "method": method, "path": "/api/video/chunked/abc", "headers": []}
+
+    async with admission.slot():
+        # The only slot is taken, a GET still goes through without reserving anything
+        await middleware(scope("GET"), None, None)
+
+    await middleware(scope("POST"), None, None)
+
+    assert calls == [("GET", 1, 0), ("POST", 1, 100)]
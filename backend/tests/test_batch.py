@@ -0,0 +1,100 @@
+import asyncio
+import hashlib
+import io
+import json
+
+import pytest
+from fastapi import UploadFile
+from starlette.datastructures import Headers
+
+from app.api import batch_route
+from app.core import pipeline
+from app.core.verdict_cache import verdict_cache
+from app.utils.llm_analysis import MODEL_NAME
+from bench.media import make_audio, make_image
+
+pytestmark = pytest.mark.anyio
+
+
+def upload_file(data: bytes, filename: str, mime_type: str) -> UploadFile:
+    return UploadFile(io.BytesIO(data), size=len(data), filename=filename, headers=Headers({"content-type": mime_type}))
+
+
+async def run_batch(files: list, chat_id: str = None) -> list:
+    response = await batch_route.analyze_batch("user", "user@example.com", chat_id, files)
+    return [json.loads(line) async for line in response.body_iterator]
+
+
+async def test_stored_batch_records_its_media(fake_db, cloudinary):
+    lines = await run_batch([upload_file(make_image(seed), f"{seed}.png", "image/png") for seed in (1, 2)])
+
+    assert lines[-1]["status"] == "complete"
+    assert lines[-1]["succeeded"] == 2
+
+    recorded = await fake_db["media"].distinct("public_id", {"chat_id": lines[-1]["chat_id"]})
+    assert sorted(recorded) == sorted(cloudinary.uploaded)
+    assert cloudinary.deleted == []
+
+
+async def test_failed_store_deletes_the_uploaded_media(fake_db, cloudinary, monkeypatch):
+    async def failing_append(*args):
+        raise RuntimeError("write failed")
+
+    monkeypatch.setattr(batch_route, "append_messages", failing_append)
+
+    lines = await run_batch([upload_file(make_image(seed), f"{seed}.png", "image/png") for seed in (3, 4)])
+
+    assert lines[-1] == {"status": "error", "error": "Failed to store the analysis results"}
+    assert len(cloudinary.uploaded) == 2
+    assert sorted(cloudinary.deleted) == sorted(cloudinary.uploaded)
+
+
+async def test_failed_store_keeps_media_reused_from_the_verdict_cache(fake_db, cloudinary, monkeypatch):
+    async def failing_append(*args):
+        raise RuntimeError("write failed")
+
+    monkeypatch.setattr(batch_route, "append_messages", failing_append)
+
+    cached = make_image(5)
+    shared = {
+        "public_id": "TrueAI/images/shared",
+        "resource_type": "image",
+        "secure_url": "https://res.cloudinary.com/test/image/upload/v1/TrueAI/images/shared.png"
+    }
+    await verdict_cache.put(verdict_cache.make_key(hashlib.sha256(cached).hexdigest(), "image", MODEL_NAME), shared, "AI", 0.9, "Cached.")
+
+    await run_batch([upload_file(cached, "cached.png", "image/png"), upload_file(make_image(6), "new.png", "image/png")])
+
+    assert len(cloudinary.uploaded) == 1
+    assert cloudinary.deleted == cloudinary.uploaded
+
+
+async def test_client_going_away_deletes_the_uploaded_media(fake_db, cloudinary, monkeypatch):
+    analyze_audio = pipeline.ANALYZERS["audio"]
+
+    async def slow_audio(temp_file_path: str, mime_type: str):
+        await asyncio.sleep(30)
+        return await analyze_audio(temp_file_path, mime_type)
+
+    monkeypatch.setitem(pipeline.ANALYZERS, "audio", slow_audio)
+
+    response = await batch_route.analyze_batch("user", "user@example.com", None, [
+        upload_file(make_image(7), "image.png", "image/png"),
+        upload_file(make_audio(7, 64 * 1024), "audio.wav", "audio/wav")
+    ])
+
+    lines = response.body_iterator
+    first = json.loads(await lines.__anext__())
+    assert first["filename"] == "image.png"
+
+    # The response is closed after the first line, as when the client disconnects
+    await lines.aclose()
+
+    deadline = asyncio.get_running_loop().time() + 2
+
+    while len(cloudinary.deleted) < 2:
+        assert asyncio.get_running_loop().time() < deadline, "uploads were not deleted"
+        await asyncio.sleep(0.01)
+
+    assert sorted(cloudinary.deleted) == sorted(cloudinary.uploaded)
+    assert await fake_db["messages"].count_documents({}) == 0
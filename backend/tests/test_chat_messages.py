@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta
+
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+
+from app.api.chat_route import get_chat_messages
+from app.crud.chat_history import get_history_page
+from app.crud.chat_messages import append_messages, get_messages_page
+
+pytestmark = pytest.mark.anyio
+
+
+async def add_messages(fake_db, chat_id: str, count: int):
+    # Pairs of messages share their created_at, the cursor has to break the ties by _id
+    start = datetime(2024, 1, 1)
+
+    await fake_db["messages"].insert_many([
+        {"_id": ObjectId(), "chat_id": chat_id, "id": str(number), "created_at": start + timedelta(seconds=number // 2)}
+        for number in range(count)
+    ])
+
+
+async def test_message_pages_cover_the_chat_once_newest_first(fake_db):
+    await add_messages(fake_db, "chat", 11)
+    pages = []
+    cursor = None
+
+    while True:
+        messages, cursor = await get_messages_page("chat", 3, cursor)
+        pages.append([message["id"] for message in messages])
+
+        if not cursor:
+            break
+
+    assert pages == [["8", "9", "10"], ["5", "6", "7"], ["2", "3", "4"], ["0", "1"]]
+
+
+async def test_history_pages_skip_deleted_chats(fake_db):
+    start = datetime(2024, 1, 1)
+
+    for number in range(5):
+        await fake_db["chats"].insert_one({
+            "user_email": "user@example.com",
+            "title": str(number),
+            "created_at": start + timedelta(minutes=number),
+            "deleted_at": datetime.now() if number == 2 else None
+        })
+
+    first, cursor = await get_history_page("user@example.com", 2)
+    second, end = await get_history_page("user@example.com", 2, cursor)
+
+    assert [chat["title"] for chat in first + second] == ["4", "3", "1", "0"]
+    assert end is None
+
+
+async def test_append_to_missing_or_deleted_chat_raises(fake_db):
+    deleted = await fake_db["chats"].insert_one({"user_email": "user@example.com", "deleted_at": datetime.now()})
+
+    for chat_id, status_code in ((str(ObjectId()), 404), ("not-an-id", 404), (str(deleted.inserted_id), 410)):
+        with pytest.raises(HTTPException) as error:
+            await append_messages("user", "user@example.com", chat_id, "Image Analysis", [{"id": "1"}])
+
+        assert error.value.status_code == status_code
+
+    assert await fake_db["messages"].count_documents({}) == 0
+
+
+async def test_messages_route_only_serves_live_chats_of_the_user(fake_db):
+    live = str((await fake_db["chats"].insert_one({"user_email": "user@example.com", "deleted_at": None})).inserted_id)
+    deleted = str((await fake_db["chats"].insert_one({"user_email": "user@example.com", "deleted_at": datetime.now()})).inserted_id)
+
+    for chat_id in (live, deleted):
+        await add_messages(fake_db, chat_id, 2)
+
+    page = await get_chat_messages(live, "user@example.com", 50, None)
+    assert len(page["messages"]) == 2
+
+    for chat_id, email in ((live, "other@example.com"), (deleted, "user@example.com"), ("not-an-id", "user@example.com")):
+        with pytest.raises(HTTPException) as error:
+            await get_chat_messages(chat_id, email, 50, None)
+
+        assert error.value.status_code == 404
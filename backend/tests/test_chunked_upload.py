@@ -0,0 +1,215 @@
+import asyncio
+import hashlib
+import os
+
+import cloudinary.uploader
+import pytest
+from fastapi import HTTPException
+
+from app.core.chunked_upload import ChunkedUploads
+from bench.media import make_video
+
+pytestmark = pytest.mark.anyio
+
+
+CHUNK_SIZE = 16 * 1024
+
+
+PART_SIZE = 48 * 1024
+
+
+@pytest.fixture
+def uploads(tmp_path) -> ChunkedUploads:
+    return ChunkedUploads(str(tmp_path / "uploads"), CHUNK_SIZE, PART_SIZE, 10 * 1024 * 1024, ttl=3600, complete_timeout=5)
+
+
+@pytest.fixture
+def parts(monkeypatch) -> list:
+    """
+        Records the Content-Range of every part sent to Cloudinary.
+    """
+
+    sent = []
+    upload_large_part = cloudinary.uploader.upload_large_part
+
+    def recording(file, http_headers=None, **kwargs):
+        sent.append(http_headers["Content-Range"])
+        return upload_large_part(file, http_headers=http_headers, **kwargs)
+
+    monkeypatch.setattr(cloudinary.uploader, "upload_large_part", recording)
+    return sent
+
+
+async def body(data: bytes):
+    yield data
+
+
+def chunk(data: bytes, index: int) -> bytes:
+    return data[index * CHUNK_SIZE:(index + 1) * CHUNK_SIZE]
+
+
+async def settle(uploads: ChunkedUploads):
+    while uploads._tasks:
+        await asyncio.gather(*uploads._tasks)
+
+
+async def send(uploads: ChunkedUploads, upload_id: str, data: bytes, indexes) -> dict:
+    for index in indexes:
+        await uploads.put_chunk(upload_id, index, body(chunk(data, index)))
+        await settle(uploads)
+
+    # Hashing and the Cloudinary transfer run after put_chunk returns
+    return await uploads.status(upload_id)
+
+
+async def test_chunks_in_any_order_complete_to_the_whole_video(uploads, cloudinary, parts):
+    await uploads.start()
+    data = make_video(1, 150 * 1024)
+    upload_id = (await uploads.create("user", "user@example.com", len(data)))["upload_id"]
+
+    status = await send(uploads, upload_id, data, [3, 0, 7, 1])
+
+    assert status["received_chunks"] == 4
+    assert status["missing_chunks"] == [2, 4, 5, 6, 8, 9]
+    assert status["hashed_bytes"] == 2 * CHUNK_SIZE
+    assert not status["ready"]
+
+    # Resumed after a dropped connection: the status lists what is still missing
+    status = await uploads.status(upload_id)
+    status = await send(uploads, upload_id, data, status["missing_chunks"])
+
+    assert status["ready"]
+    assert status["uploaded_bytes"] == len(data)
+
+    upload = await uploads.complete(upload_id)
+
+    with open(upload["path"], "rb") as video:
+        assert video.read() == data
+
+    assert upload["sha256"] == hashlib.sha256(data).hexdigest()
+    assert upload["mime_type"] == "video/mp4"
+    assert upload["upload_response"]["public_id"] == f"TrueAI/videos/{upload_id}"
+
+    # Parts reach Cloudinary in order, every one but the last of part_size
+    total = len(data)
+    assert parts == [
+        f"bytes {start}-{min(start + PART_SIZE, total) - 1}/{total}"
+        for start in range(0, total, PART_SIZE)
+    ]
+
+    with pytest.raises(HTTPException) as gone:
+        await uploads.status(upload_id)
+
+    assert gone.value.status_code == 404
+
+    os.remove(upload["path"])
+    await uploads.stop()
+
+
+async def test_resent_chunk_is_acknowledged_and_conflicting_content_rejected(uploads, cloudinary):
+    data = make_video(2, 40 * 1024)
+    upload_id = (await uploads.create("user", "user@example.com", len(data)))["upload_id"]
+
+    await send(uploads, upload_id, data, [0, 0])
+
+    with pytest.raises(HTTPException) as conflict:
+        await uploads.put_chunk(upload_id, 0, body(b"x" * CHUNK_SIZE))
+
+    assert conflict.value.status_code == 409
+
+    with pytest.raises(HTTPException) as checksum:
+        await uploads.put_chunk(upload_id, 1, body(chunk(data, 1)), checksum="0" * 64)
+
+    assert checksum.value.status_code == 400
+
+    with pytest.raises(HTTPException) as short:
+        await uploads.put_chunk(upload_id, 1, body(chunk(data, 1)[:-1]))
+
+    assert short.value.status_code == 400
+    assert (await uploads.status(upload_id))["missing_chunks"] == [1, 2]
+
+
+async def test_complete_with_missing_chunks_is_a_conflict(uploads, cloudinary):
+    data = make_video(3, 40 * 1024)
+    upload_id = (await uploads.create("user", "user@example.com", len(data)))["upload_id"]
+
+    await send(uploads, upload_id, data, [0, 2])
+
+    with pytest.raises(HTTPException) as conflict:
+        await uploads.complete(upload_id)
+
+    assert conflict.value.status_code == 409
+    assert "chunk 1" in conflict.value.detail
+
+
+async def test_upload_that_is_not_a_video_is_rejected_and_removed(uploads, cloudinary):
+    data = b"not a video" * 4096
+    upload_id = (await uploads.create("user", "user@example.com", len(data)))["upload_id"]
+
+    await send(uploads, upload_id, data, range(3))
+
+    with pytest.raises(HTTPException) as unsupported:
+        await uploads.complete(upload_id)
+
+    assert unsupported.value.status_code == 415
+    assert not os.path.exists(uploads._path(upload_id))
+
+
+async def test_checksum_is_saved_with_the_last_part(uploads, cloudinary, monkeypatch):
+    saved = []
+    save_progress = uploads._save_progress
+
+    async def recording(upload_id: str, progress: dict):
+        saved.append(dict(progress))
+        await save_progress(upload_id, progress)
+
+    monkeypatch.setattr(uploads, "_save_progress", recording)
+
+    data = make_video(4, 100 * 1024)
+    upload_id = (await uploads.create("user", "user@example.com", len(data)))["upload_id"]
+    await send(uploads, upload_id, data, range(7))
+
+    # A crash between two writes must never leave an upload that is fully sent but not ready
+    for progress in saved:
+        assert (progress.get("uploaded_bytes") == len(data)) == bool(progress.get("sha256"))
+
+    assert saved[-1]["upload_response"]["public_id"] == f"TrueAI/videos/{upload_id}"
+
+
+async def test_expired_upload_deletes_what_reached_cloudinary(uploads, cloudinary):
+    data = make_video(5, 100 * 1024)
+    upload_id = (await uploads.create("user", "user@example.com", len(data)))["upload_id"]
+    await send(uploads, upload_id, data, range(4))
+
+    assert (await uploads.status(upload_id))["uploaded_bytes"] == PART_SIZE
+
+    uploads.ttl = -1
+    await uploads.start()
+
+    deadline = asyncio.get_running_loop().time() + 2
+
+    while os.path.exists(uploads._path(upload_id)):
+        assert asyncio.get_running_loop().time() < deadline, "upload was not removed"
+        await asyncio.sleep(0.01)
+
+    await uploads.stop()
+
+    assert cloudinary.deleted == [f"TrueAI/videos/{upload_id}"]
+
+
+async def test_expired_upload_is_kept_when_the_delete_fails(uploads, cloudinary, monkeypatch):
+    data = make_video(6, 100 * 1024)
+    upload_id = (await uploads.create("user", "user@example.com", len(data)))["upload_id"]
+    await send(uploads, upload_id, data, range(4))
+
+    def failing_delete(*args, **kwargs):
+        raise RuntimeError("delete failed")
+
+    monkeypatch.setattr("cloudinary.api.delete_resources", failing_delete)
+    uploads.ttl = -1
+
+    removed = [await uploads._abandon(session) for _, session in await asyncio.to_thread(uploads._expired)]
+
+    # Tried again by the next round of the expiry loop
+    assert removed == [False]
+    assert os.path.exists(uploads._path(upload_id))
@@ -0,0 +1,137 @@
+import asyncio
+import threading
+
+import pytest
+
+from app.core.executor import OffloadPool, PoolSaturatedError
+
+pytestmark = pytest.mark.anyio
+
+
+class Blocking:
+    """
+        A blocking call that signals when it started and returns once released.
+    """
+
+    def __init__(self, result=None):
+        self.result = result
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        self.started.set()
+        self.release.wait(timeout=5)
+        return self.result
+
+
+@pytest.fixture
+def pool():
+    pool = OffloadPool("test", max_workers=1, max_queue=1)
+    yield pool
+    pool.shutdown()
+
+
+async def started(call: Blocking):
+    assert await asyncio.to_thread(call.started.wait, 5)
+
+
+async def test_pool_rejects_calls_beyond_its_queue(pool):
+    running, waiting = Blocking("running"), Blocking("waiting")
+
+    first = asyncio.create_task(pool.run(running))
+    await started(running)
+    second = asyncio.create_task(pool.run(waiting))
+    await asyncio.sleep(0)
+
+    with pytest.raises(PoolSaturatedError):
+        await pool.run(Blocking())
+
+    assert pool.stats()["queued"] == 1
+    assert pool.stats()["active"] == 1
+    assert pool.stats()["rejected"] == 1
+
+    running.release.set()
+    waiting.release.set()
+
+    assert await asyncio.gather(first, second) == ["running", "waiting"]
+    assert pool.stats()["queued"] == 0
+    assert pool.stats()["completed"] == 2
+
+
+async def test_call_cancelled_before_it_started_frees_its_queue_slot(pool):
+    running, cancelled = Blocking(), Blocking()
+
+    first = asyncio.create_task(pool.run(running))
+    await started(running)
+    second = asyncio.create_task(pool.run(cancelled))
+    await asyncio.sleep(0)
+
+    second.cancel()
+    await asyncio.gather(second, return_exceptions=True)
+
+    assert pool.stats()["queued"] == 0
+
+    # The freed slot takes a new call
+    replacement = Blocking("replacement")
+    replacement.release.set()
+    third = asyncio.create_task(pool.run(replacement))
+
+    running.release.set()
+    await first
+
+    assert await third == "replacement"
+    assert cancelled.calls == 0
+    assert pool.stats()["queued"] == 0
+
+
+async def test_result_of_a_cancelled_call_is_cleaned_up(pool):
+    upload = Blocking({"public_id": "orphan"})
+    cleaned = []
+
+    task = asyncio.create_task(pool.run_with_cleanup(cleaned.append, upload))
+    await started(upload)
+
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    upload.release.set()
+
+    # The cleanup is queued on the pool once the call finished
+    deadline = asyncio.get_running_loop().time() + 2
+
+    while not cleaned:
+        assert asyncio.get_running_loop().time() < deadline, "cleanup did not run"
+        await asyncio.sleep(0.01)
+
+    assert cleaned == [{"public_id": "orphan"}]
+
+
+async def test_call_cancelled_before_it_started_needs_no_cleanup(pool):
+    running, upload = Blocking(), Blocking({"public_id": "never"})
+    cleaned = []
+
+    first = asyncio.create_task(pool.run(running))
+    await started(running)
+    task = asyncio.create_task(pool.run_with_cleanup(cleaned.append, upload))
+    await asyncio.sleep(0)
+
+    task.cancel()
+    await asyncio.gather(task, return_exceptions=True)
+    running.release.set()
+    await first
+
+    assert await pool.run(lambda: None) is None
+    assert upload.calls == 0
+    assert cleaned == []
+
+
+async def test_failed_call_raises_and_is_counted(pool):
+    def failing():
+        raise RuntimeError("sdk error")
+
+    with pytest.raises(RuntimeError):
+        await pool.run(failing)
+
+    assert pool.stats()["failed"] == 1
+    assert pool.stats()["active"] == 0
@@ -0,0 +1,33 @@
+import asyncio
+
+import google.generativeai as genai
+import pytest
+
+from app.core.gemini_file_watcher import GeminiFileWatcher
+from bench.fakes import FakeGeminiFile
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_failed_poll_only_delays_its_own_file(monkeypatch):
+    files = [FakeGeminiFile("video/mp4", 0.05) for _ in range(3)]
+    broken = files[0].name
+    polls = {file.name: 0 for file in files}
+
+    def get_file(name: str):
+        polls[name] += 1
+
+        # The first poll of one file fails, the others must not wait for its next interval
+        if name == broken and polls[name] == 1:
+            raise RuntimeError("poll failed")
+
+        return next(file for file in files if file.name == name)
+
+    monkeypatch.setattr(genai, "get_file", get_file)
+    watcher = GeminiFileWatcher(initial_interval=0.1, max_interval=0.1, backoff=1.0, timeout=5)
+
+    active = await asyncio.gather(*(watcher.wait_until_active(file) for file in files))
+
+    assert [file.name for file in active] == [file.name for file in files]
+    assert polls == {name: 2 if name == broken else 1 for name in polls}
+    assert watcher.stats()["poll_errors"] == 1
@@ -0,0 +1,145 @@
+import asyncio
+import io
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi import HTTPException, UploadFile
+from starlette.datastructures import Headers
+
+from app.api import image_route
+from app.core import jobs
+from app.core.janitor import TEMP, janitor
+from app.core.jobs import JobManager
+from bench.media import make_image
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def manager(fake_db) -> JobManager:
+    return JobManager(fake_db["analysis_jobs"], workers=1, stale_seconds=60, max_queue=8)
+
+
+def handed_over(public_id: str) -> dict:
+    return {
+        "public_id": public_id,
+        "resource_type": "video",
+        "secure_url": f"https://res.cloudinary.com/test/video/upload/v1/{public_id}.mp4",
+        "bytes": 1024
+    }
+
+
+async def submit(manager: JobManager, temp_file_path: str, upload_response: dict = None) -> str:
+    return await manager.submit("video", temp_file_path, "video/mp4", "0" * 64, "user", "user@example.com", None, upload_response)
+
+
+async def test_job_runs_once_when_queued_twice(fake_db, manager, tmp_path, monkeypatch):
+    runs = []
+
+    async def analyze_and_save(*args, **kwargs):
+        runs.append(args)
+        return {"chat_id": "chat"}
+
+    monkeypatch.setattr(jobs, "analyze_and_save", analyze_and_save)
+    job_id = await submit(manager, str(tmp_path / "video.mp4"))
+
+    await asyncio.gather(manager._run(job_id), manager._run(job_id))
+
+    job = await manager.get(job_id)
+
+    assert len(runs) == 1
+    assert job["status"] == "done"
+    assert job["result"] == {"chat_id": "chat"}
+    assert [event["stage"] for event in job["events"]] == ["queued", "done"]
+
+
+async def test_failed_analysis_fails_the_job(fake_db, manager, tmp_path, monkeypatch):
+    async def analyze_and_save(*args, **kwargs):
+        raise RuntimeError("analysis failed")
+
+    monkeypatch.setattr(jobs, "analyze_and_save", analyze_and_save)
+    job_id = await submit(manager, str(tmp_path / "video.mp4"))
+
+    await manager._run(job_id)
+    job = await manager.get(job_id)
+
+    assert job["status"] == "failed"
+    assert job["error"] == "analysis failed"
+
+
+async def test_cancelled_job_is_requeued_without_its_deleted_asset(fake_db, manager, tmp_path, monkeypatch):
+    started = asyncio.Event()
+
+    async def analyze_and_save(*args, **kwargs):
+        started.set()
+        await asyncio.sleep(30)
+
+    monkeypatch.setattr(jobs, "analyze_and_save", analyze_and_save)
+    job_id = await submit(manager, str(tmp_path / "video.mp4"), handed_over("TrueAI/videos/chunked"))
+
+    run = asyncio.create_task(manager._run(job_id))
+    await started.wait()
+    run.cancel()
+    await asyncio.gather(run, return_exceptions=True)
+
+    # The cancelled analysis deleted the handed over asset, the retry uploads the file again
+    job = await fake_db["analysis_jobs"].find_one({"_id": job_id})
+
+    assert job["status"] == "queued"
+    assert job["upload_response"] is None
+
+
+async def test_recovery_requeues_jobs_whose_upload_is_still_here(fake_db, manager, tmp_path):
+    kept = tmp_path / "kept.mp4"
+    kept.write_bytes(b"video")
+
+    queued = await submit(manager, str(kept))
+    stale = await submit(manager, str(kept))
+    lost = await submit(manager, str(tmp_path / "lost.mp4"))
+
+    await fake_db["analysis_jobs"].update_one(
+        {"_id": stale}, {"$set": {"status": "running", "updated_at": datetime.now() - timedelta(minutes=5)}}
+    )
+
+    # A fresh queue, as after a restart
+    manager._queue = asyncio.Queue()
+    await manager._recover()
+
+    assert sorted([manager._queue.get_nowait() for _ in range(manager._queue.qsize())]) == sorted([queued, stale])
+    assert (await manager.get(lost))["status"] == "failed"
+
+
+async def test_recovery_deletes_the_asset_of_a_lost_upload(fake_db, cloudinary, manager, tmp_path):
+    lost = await submit(manager, str(tmp_path / "lost.mp4"), handed_over("TrueAI/videos/lost"))
+
+    await manager._recover()
+
+    assert (await manager.get(lost))["status"] == "failed"
+    assert cloudinary.deleted == ["TrueAI/videos/lost"]
+
+
+async def test_full_job_queue_is_a_503_and_the_route_discards_the_upload(fake_db, tmp_path, monkeypatch):
+    manager = JobManager(fake_db["analysis_jobs"], workers=1, stale_seconds=60, max_queue=2)
+
+    for number in range(2):
+        await submit(manager, str(tmp_path / f"{number}.mp4"))
+
+    with pytest.raises(HTTPException) as error:
+        await submit(manager, str(tmp_path / "2.mp4"))
+
+    assert error.value.status_code == 503
+    assert await fake_db["analysis_jobs"].count_documents({}) == 2
+    assert manager.stats()["rejected"] == 1
+
+    monkeypatch.setattr(image_route, "job_manager", manager)
+    discarded = []
+    monkeypatch.setattr(janitor, "_add", lambda kind, target: discarded.append((kind, target)))
+
+    data = make_image(1)
+    file = UploadFile(io.BytesIO(data), size=len(data), filename="image.png", headers=Headers({"content-type": "image/png"}))
+
+    with pytest.raises(HTTPException) as error:
+        await image_route.analyze_image("user", "user@example.com", "image/png", None, True, file)
+
+    assert error.value.status_code == 503
+    assert [kind for kind, _ in discarded] == [TEMP]
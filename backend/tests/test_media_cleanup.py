@@ -0,0 +1,50 @@
+from datetime import datetime, timedelta, timezone
+
+import pytest
+
+from app.crud.media_cleanup import discard_unrecorded, sweep_direct_uploads
+from app.crud.media_manifest import manifest_entry
+
+pytestmark = pytest.mark.anyio
+
+
+def upload_response(public_id: str) -> dict:
+    return {
+        "public_id": public_id,
+        "resource_type": "image",
+        "secure_url": f"https://res.cloudinary.com/test/image/upload/v1/{public_id}.png",
+        "bytes": 1024
+    }
+
+
+async def test_discard_keeps_assets_recorded_by_a_live_chat(fake_db, cloudinary):
+    await fake_db["media"].insert_many([
+        {"chat_id": "live", "public_id": "TrueAI/images/recorded", "deleted_at": None},
+        {"chat_id": "purged", "public_id": "TrueAI/images/purged", "deleted_at": datetime.now()}
+    ])
+    await fake_db["verdict_cache"].insert_one({"_id": "key", "url": upload_response("TrueAI/images/unsaved")["secure_url"]})
+
+    entries = [
+        manifest_entry("image", upload_response(public_id))
+        for public_id in ("TrueAI/images/recorded", "TrueAI/images/purged", "TrueAI/images/unsaved")
+    ]
+    await discard_unrecorded(entries)
+
+    assert sorted(cloudinary.deleted) == ["TrueAI/images/purged", "TrueAI/images/unsaved"]
+    assert await fake_db["verdict_cache"].count_documents({}) == 0
+
+
+async def test_sweep_deletes_stale_direct_uploads_nobody_recorded(fake_db, cloudinary):
+    old = datetime.now(timezone.utc) - timedelta(hours=2)
+
+    cloudinary.add_asset("TrueAI/images/direct/stale", b"image", created_at=old)
+    cloudinary.add_asset("TrueAI/images/direct/analyzed", b"image", created_at=old)
+    cloudinary.add_asset("TrueAI/images/direct/fresh", b"image")
+    cloudinary.add_asset("TrueAI/audios/direct/stale", b"audio", "video", created_at=old)
+    cloudinary.add_asset("TrueAI/images/uploaded", b"image", created_at=old)
+
+    # Recorded once, even by a chat that was deleted since: the purge owns it
+    await fake_db["media"].insert_one({"chat_id": "chat", "public_id": "TrueAI/images/direct/analyzed", "deleted_at": datetime.now()})
+
+    assert await sweep_direct_uploads(3600) == 2
+    assert sorted(cloudinary.deleted) == ["TrueAI/audios/direct/stale", "TrueAI/images/direct/stale"]
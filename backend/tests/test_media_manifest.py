@@ -0,0 +1,49 @@
+from datetime import datetime
+
+import pytest
+
+from app.crud import media_manifest
+
+pytestmark = pytest.mark.anyio
+
+
+async def test_backfill_fetches_messages_once_per_batch_of_chats(fake_db, monkeypatch):
+    monkeypatch.setattr(media_manifest, "BACKFILL_BATCH_SIZE", 2)
+
+    chat_ids = []
+
+    for number in range(3):
+        result = await fake_db["chats"].insert_one({"user_email": "user@example.com", "created_at": datetime.now(), "deleted_at": None})
+        chat_ids.append(str(result.inserted_id))
+
+    # Messages of the last chat are still embedded, the others were migrated
+    await fake_db["chats"].update_one({"_id": result.inserted_id}, {"$set": {"messages": [
+        {"role": "user", "type": "image", "content": "https://res.cloudinary.com/test/image/upload/v1/TrueAI/images/embedded.png"}
+    ]}})
+    await fake_db["messages"].insert_many([
+        {"chat_id": chat_id, "role": role, "type": "image", "content": f"https://res.cloudinary.com/test/image/upload/v1/TrueAI/images/{chat_id}.png"}
+        for chat_id in chat_ids[:2]
+        for role in ("user", "ai")
+    ])
+
+    queries = []
+    find = fake_db["messages"].find
+
+    def counted_find(query, *args, **kwargs):
+        queries.append(query)
+        return find(query, *args, **kwargs)
+
+    monkeypatch.setattr(fake_db["messages"], "find", counted_find)
+
+    assert await media_manifest.backfill_chats({"deleted_at": None}) == 3
+    assert len(queries) == 2
+
+    recorded = {(media["chat_id"], media["public_id"]) async for media in fake_db["media"].find({})}
+    assert recorded == {
+        (chat_ids[0], f"TrueAI/images/{chat_ids[0]}"),
+        (chat_ids[1], f"TrueAI/images/{chat_ids[1]}"),
+        (chat_ids[2], "TrueAI/images/embedded")
+    }
+
+    # Already recorded media is left as it is
+    assert await media_manifest.backfill_chats({"deleted_at": None}) == 0
@@ -0,0 +1,91 @@
+import asyncio
+import json
+import os
+import subprocess
+import sys
+
+import pytest
+
+from app.core.admission import AdmissionQueue, AdmissionRejected
+from app.core.worker_metrics import WorkerMetrics
+from app.utils.metrics import ADMISSION_TURNED_AWAY, Counter, Gauge, Histogram, Registry
+
+pytestmark = pytest.mark.anyio
+
+
+def samples(text: str) -> dict:
+    return dict(line.rsplit(" ", 1) for line in text.splitlines() if not line.startswith("#"))
+
+
+@pytest.fixture
+def dead_pid() -> int:
+    process = subprocess.Popen([sys.executable, "-c", "pass"])
+    process.wait()
+    return process.pid
+
+
+async def test_scrape_merges_the_metrics_of_the_other_workers(tmp_path, dead_pid):
+    registry = Registry()
+    requests = Counter("requests_total", "Requests.", ("route",), registry=registry)
+    queued = Gauge("queued", "Queued.", registry=registry)
+    limit = Gauge("limit_bytes", "Limit.", multiprocess_mode="max", registry=registry)
+    duration = Histogram("duration_seconds", "Duration.", buckets=(1,), registry=registry)
+
+    requests.inc(2, route="a")
+    queued.set(3)
+    limit.set(100)
+    duration.observe(0.5)
+
+    other = Registry()
+    Counter("requests_total", "Requests.", ("route",), registry=other).inc(5, route="a")
+    Gauge("queued", "Queued.", registry=other).set(4)
+    Gauge("limit_bytes", "Limit.", multiprocess_mode="max", registry=other).set(100)
+    Histogram("duration_seconds", "Duration.", buckets=(1,), registry=other).observe(2)
+
+    # One worker still running, one that is gone
+    for pid in (os.getppid(), dead_pid):
+        (tmp_path / f"{pid}.json").write_text(json.dumps(other.snapshot()))
+
+    metrics = WorkerMetrics(str(tmp_path), 5, enabled=True, registry=registry)
+
+    assert samples(await metrics.render()) == {
+        'requests_total{route="a"}': "12",
+        "queued": "7",
+        "limit_bytes": "100",
+        'duration_seconds_bucket{le="1.0"}': "1",
+        'duration_seconds_bucket{le="+Inf"}': "3",
+        "duration_seconds_sum": "4.5",
+        "duration_seconds_count": "3"
+    }
+
+
+async def test_worker_writes_its_snapshot_and_a_last_one_on_stop(tmp_path):
+    registry = Registry()
+    requests = Counter("requests_total", "Requests.", registry=registry)
+    metrics = WorkerMetrics(str(tmp_path / "metrics"), 3600, enabled=True, registry=registry)
+
+    await metrics.start(refresh=lambda: requests.inc())
+
+    while metrics.stats()["writes"] < 1:
+        await asyncio.sleep(0.01)
+
+    await metrics.stop()
+
+    snapshot = json.loads((tmp_path / "metrics" / f"{os.getpid()}.json").read_text())
+    assert snapshot == {"requests_total": [["requests_total", [], 2]]}
+    assert metrics.stats()["writes"] == 2
+
+
+async def test_turned_away_requests_are_counted():
+    def turned_away(reason: str) -> float:
+        return dict(((labels[0][1], value) for _, labels, value in ADMISSION_TURNED_AWAY.samples())).get(reason, 0)
+
+    before = turned_away("queue_full"), turned_away("timed_out")
+    admission = AdmissionQueue(max_active=1, max_queue=0, queue_timeout=5)
+
+    async with admission.slot():
+        with pytest.raises(AdmissionRejected):
+            async with admission.slot():
+                pass
+
+    assert (turned_away("queue_full"), turned_away("timed_out")) == (before[0] + 1, before[1])
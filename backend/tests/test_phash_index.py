@@ -0,0 +1,26 @@
+import random
+
+from app.core.phash_index import MultiIndexHash
+from app.utils.perceptual_hash import hamming_distance
+
+def test_multi_index_hash_matches_a_linear_scan():
+    generator = random.Random(7)
+    index = MultiIndexHash()
+    hashes = [generator.getrandbits(64) for _ in range(500)]
+
+    for number, value in enumerate(hashes):
+        index.add(value, number)
+
+    for _ in range(200):
+        # Near-duplicates of stored hashes, with a few bits flipped
+        value = generator.choice(hashes)
+        for bit in generator.sample(range(64), generator.randint(0, 9)):
+            value ^= 1 << bit
+
+        expected = min(hamming_distance(value, stored) for stored in hashes)
+        found = index.nearest(value, 8)
+
+        if expected <= 8:
+            assert found is not None and found[0] == expected
+        else:
+            assert found is None
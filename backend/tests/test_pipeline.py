@@ -0,0 +1,218 @@
+import asyncio
+import hashlib
+import threading
+from datetime import datetime
+
+import google.generativeai as genai
+import pytest
+from bson import ObjectId
+from fastapi import HTTPException
+
+from app.config import Config
+from app.core import pipeline
+from app.core.executor import PoolSaturatedError
+from app.core.janitor import janitor
+from app.core.verdict_cache import verdict_cache
+from app.utils import llm_analysis
+from app.utils.llm_analysis import MODEL_NAME
+from bench.media import make_audio, make_image, make_video
+
+pytestmark = pytest.mark.anyio
+
+
+async def eventually(condition, timeout: float = 2):
+    # Assets of a cancelled upload are deleted by the pool thread once the upload returns
+    deadline = asyncio.get_running_loop().time() + timeout
+
+    while not condition():
+        assert asyncio.get_running_loop().time() < deadline, "condition not met in time"
+        await asyncio.sleep(0.01)
+
+
+@pytest.fixture
+def image_file(tmp_path):
+    path = tmp_path / "image.png"
+    path.write_bytes(make_image(1))
+    return str(path)
+
+
+@pytest.fixture
+def video_file(tmp_path):
+    path = tmp_path / "video.mp4"
+    path.write_bytes(make_video(1, 64 * 1024))
+    return str(path)
+
+
+def sha256_of(path: str) -> str:
+    with open(path, "rb") as file:
+        return hashlib.sha256(file.read()).hexdigest()
+
+
+def upload_response(public_id: str, resource_type: str = "image") -> dict:
+    return {
+        "public_id": public_id,
+        "resource_type": resource_type,
+        "secure_url": f"https://res.cloudinary.com/test/{resource_type}/upload/v1/{public_id}.png",
+        "bytes": 1024
+    }
+
+
+async def failing_analysis(temp_file_path: str, mime_type: str):
+    await asyncio.sleep(0.01)
+    raise RuntimeError("analysis failed")
+
+
+async def deleted_chat(fake_db) -> str:
+    result = await fake_db["chats"].insert_one({"user_email": "user@example.com", "message_count": 0, "deleted_at": datetime.now()})
+    return str(result.inserted_id)
+
+
+async def test_failed_analysis_deletes_the_upload(fake_db, cloudinary, image_file, monkeypatch):
+    monkeypatch.setitem(pipeline.ANALYZERS, "image", failing_analysis)
+
+    with pytest.raises(RuntimeError):
+        await pipeline.analyze_and_save("image", image_file, "image/png", None, "user", "user@example.com", None)
+
+    await eventually(lambda: cloudinary.uploaded and cloudinary.deleted == cloudinary.uploaded)
+    assert await fake_db["chats"].count_documents({}) == 0
+
+
+async def test_gemini_upload_of_a_cancelled_analysis_is_discarded(image_file, monkeypatch):
+    started, release = threading.Event(), threading.Event()
+    uploaded = []
+    upload_file = genai.upload_file
+
+    def slow_upload(*args, **kwargs):
+        started.set()
+        release.wait(5)
+        uploaded.append(upload_file(*args, **kwargs))
+        return uploaded[-1]
+
+    monkeypatch.setattr(Config, "GEMINI_INLINE_MAX_BYTES", 0)
+    monkeypatch.setattr(genai, "upload_file", slow_upload)
+
+    analysis = asyncio.create_task(llm_analysis.analyze_image_with_llm(image_file, "image/png"))
+    await asyncio.to_thread(started.wait, 5)
+
+    analysis.cancel()
+    release.set()
+
+    with pytest.raises(asyncio.CancelledError):
+        await analysis
+
+    await eventually(lambda: uploaded and ("gemini", uploaded[0].name) in janitor._pending)
+    janitor._pending.pop(("gemini", uploaded[0].name))
+
+
+async def test_save_to_deleted_chat_deletes_the_upload_and_its_cache_entry(fake_db, cloudinary, image_file):
+    chat_id = await deleted_chat(fake_db)
+
+    with pytest.raises(HTTPException) as error:
+        await pipeline.analyze_and_save("image", image_file, "image/png", None, "user", "user@example.com", chat_id)
+
+    assert error.value.status_code == 410
+    assert len(cloudinary.uploaded) == 1
+    assert cloudinary.deleted == cloudinary.uploaded
+
+    # The verdict must not point later requests at the deleted asset
+    assert await fake_db["verdict_cache"].count_documents({}) == 0
+    assert verdict_cache.stats()["entries"] == 0
+    assert await fake_db["messages"].count_documents({}) == 0
+
+
+async def test_save_to_unknown_chat_is_a_404(fake_db, cloudinary, image_file):
+    with pytest.raises(HTTPException) as error:
+        await pipeline.analyze_and_save("image", image_file, "image/png", None, "user", "user@example.com", str(ObjectId()))
+
+    assert error.value.status_code == 404
+    assert cloudinary.deleted == cloudinary.uploaded
+
+
+async def test_failed_save_of_a_cache_hit_keeps_the_shared_asset(fake_db, cloudinary, image_file):
+    sha256 = sha256_of(image_file)
+    shared = upload_response("TrueAI/images/shared")
+    await verdict_cache.put(verdict_cache.make_key(sha256, "image", MODEL_NAME), shared, "AI", 0.9, "Cached.")
+
+    with pytest.raises(HTTPException):
+        await pipeline.analyze_and_save("image", image_file, "image/png", sha256, "user", "user@example.com", await deleted_chat(fake_db))
+
+    assert cloudinary.uploaded == []
+    assert cloudinary.deleted == []
+    assert await fake_db["verdict_cache"].count_documents({}) == 1
+
+
+async def test_failed_media_record_fails_the_save_and_keeps_the_asset(fake_db, cloudinary, image_file, monkeypatch):
+    async def failing_record(*args):
+        raise RuntimeError("record failed")
+
+    monkeypatch.setattr(pipeline, "record_media", failing_record)
+
+    with pytest.raises(RuntimeError):
+        await pipeline.analyze_and_save("image", image_file, "image/png", None, "user", "user@example.com", None)
+
+    # The stored message refers to the asset, the purge finds it there
+    assert await fake_db["messages"].count_documents({"role": "user", "type": "image"}) == 1
+    assert cloudinary.deleted == []
+
+
+async def test_saved_analysis_records_its_media(fake_db, cloudinary, image_file):
+    result = await pipeline.analyze_and_save("image", image_file, "image/png", None, "user", "user@example.com", None)
+
+    media = await fake_db["media"].find({"chat_id": result["chat_id"]}).to_list()
+
+    assert [record["public_id"] for record in media] == cloudinary.uploaded
+    assert await fake_db["messages"].count_documents({"chat_id": result["chat_id"]}) == 2
+    assert cloudinary.deleted == []
+
+
+async def test_failed_analysis_deletes_a_handed_over_asset(fake_db, cloudinary, video_file, monkeypatch):
+    monkeypatch.setitem(pipeline.ANALYZERS, "video", failing_analysis)
+    handed_over = upload_response("TrueAI/videos/chunked", "video")
+
+    with pytest.raises(RuntimeError):
+        await pipeline.analyze_and_save(
+            "video", video_file, "video/mp4", None, "user", "user@example.com", None, upload_response=handed_over
+        )
+
+    assert cloudinary.uploaded == []
+    assert cloudinary.deleted == ["TrueAI/videos/chunked"]
+
+
+async def test_handed_over_asset_recorded_by_a_chat_is_kept(fake_db, cloudinary, video_file, monkeypatch):
+    monkeypatch.setitem(pipeline.ANALYZERS, "video", failing_analysis)
+    handed_over = upload_response("TrueAI/videos/chunked", "video")
+    await fake_db["media"].insert_one({"chat_id": "other", "public_id": "TrueAI/videos/chunked", "deleted_at": None})
+
+    with pytest.raises(RuntimeError):
+        await pipeline.analyze_and_save(
+            "video", video_file, "video/mp4", None, "user", "user@example.com", None, upload_response=handed_over
+        )
+
+    assert cloudinary.deleted == []
+
+
+@pytest.mark.parametrize("analyzer, media, mime_type", [
+    (llm_analysis.analyze_image_with_llm, lambda: make_image(2), "image/png"),
+    (llm_analysis.analyze_video_with_llm, lambda: make_video(2, 64 * 1024), "video/mp4"),
+    (llm_analysis.analyze_audio_with_llm, lambda: make_audio(2, 64 * 1024), "audio/wav")
+])
+async def test_saturated_gemini_pool_is_not_a_verdict(analyzer, media, mime_type, tmp_path, monkeypatch):
+    path = tmp_path / "media"
+    path.write_bytes(media())
+
+    async def saturated(*args):
+        raise PoolSaturatedError("gemini pool is saturated")
+
+    async def failed(*args):
+        raise RuntimeError("generate failed")
+
+    monkeypatch.setattr(llm_analysis, "_generate", saturated)
+
+    with pytest.raises(PoolSaturatedError):
+        await analyzer(str(path), mime_type)
+
+    # Any other error is answered with an 'Unknown' verdict
+    monkeypatch.setattr(llm_analysis, "_generate", failed)
+
+    label, *_ = await analyzer(str(path), mime_type)
+    assert label == "Unknown"
@@ -0,0 +1,113 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from app.core.purge_queue import PurgeQueue
+
+pytestmark = pytest.mark.anyio
+
+
+@pytest.fixture
+def queue(fake_db) -> PurgeQueue:
+    return PurgeQueue(fake_db["purge_queue"], fake_db["chats"], workers=1, max_attempts=2, lease_seconds=60, poll_seconds=0.1)
+
+
+async def chat_with_image(fake_db, public_id: str) -> str:
+    result = await fake_db["chats"].insert_one({"user_email": "user@example.com", "message_count": 1, "deleted_at": None})
+    chat_id = str(result.inserted_id)
+
+    await fake_db["messages"].insert_one({
+        "chat_id": chat_id,
+        "role": "user",
+        "type": "image",
+        "content": f"https://res.cloudinary.com/test/image/upload/v1/{public_id}.png"
+    })
+
+    return chat_id
+
+
+async def test_enqueue_is_idempotent_per_key(fake_db, queue):
+    await chat_with_image(fake_db, "TrueAI/images/one")
+
+    assert await queue.enqueue("purge-1", {"user_email": "user@example.com"}) == "purge-1"
+    assert await queue.enqueue("purge-1", {"user_email": "user@example.com"}) == "purge-1"
+    assert await queue.enqueue("purge-2", {"user_email": "nobody@example.com"}) is None
+
+    assert await fake_db["purge_queue"].count_documents({}) == 1
+    assert (await fake_db["chats"].find_one({}))["purge_id"] == "purge-1"
+
+
+async def test_claimed_purge_is_leased_to_one_worker(fake_db, queue):
+    await chat_with_image(fake_db, "TrueAI/images/one")
+    await queue.enqueue("purge-1", {"user_email": "user@example.com"})
+
+    first = await queue._claim()
+
+    assert first["attempts"] == 1
+    assert await queue._claim() is None
+
+    # The worker died holding the lease, once it ran out another worker takes over
+    await fake_db["purge_queue"].update_one({"_id": "purge-1"}, {"$set": {"lease_until": datetime.now() - timedelta(seconds=1)}})
+    second = await queue._claim()
+
+    assert second["attempts"] == 2
+    assert second["claim"] != first["claim"]
+
+    # The first worker's late result no longer owns the purge
+    await queue._retry(first, "late failure")
+    assert (await fake_db["purge_queue"].find_one({"_id": "purge-1"}))["status"] == "running"
+
+
+async def test_purge_deletes_media_of_chats_recorded_only_in_their_messages(fake_db, cloudinary, queue):
+    # A chat from before the media manifest
+    chat_id = await chat_with_image(fake_db, "TrueAI/images/legacy")
+    await queue.enqueue("purge-1", {"user_email": "user@example.com"})
+
+    await queue._run(await queue._claim())
+
+    assert cloudinary.deleted == ["TrueAI/images/legacy"]
+    assert (await fake_db["purge_queue"].find_one({"_id": "purge-1"}))["status"] == "done"
+    assert await fake_db["chats"].count_documents({}) == 0
+    assert await fake_db["messages"].count_documents({"chat_id": chat_id}) == 0
+    assert await fake_db["media"].count_documents({}) == 0
+
+
+async def test_purge_keeps_media_used_by_another_chat(fake_db, cloudinary, queue):
+    await chat_with_image(fake_db, "TrueAI/images/shared")
+    await queue.enqueue("purge-1", {"user_email": "user@example.com"})
+
+    other = await chat_with_image(fake_db, "TrueAI/images/shared")
+    await fake_db["media"].insert_one({"chat_id": other, "public_id": "TrueAI/images/shared", "deleted_at": None})
+
+    await queue._run(await queue._claim())
+
+    assert cloudinary.deleted == []
+    assert await fake_db["media"].count_documents({"chat_id": other}) == 1
+
+
+async def test_failed_purge_is_retried_with_backoff_then_given_up(fake_db, cloudinary, queue, monkeypatch):
+    def failing_delete(*args, **kwargs):
+        raise RuntimeError("delete failed")
+
+    monkeypatch.setattr("cloudinary.api.delete_resources", failing_delete)
+
+    await chat_with_image(fake_db, "TrueAI/images/one")
+    await queue.enqueue("purge-1", {"user_email": "user@example.com"})
+
+    await queue._run(await queue._claim())
+    purge = await fake_db["purge_queue"].find_one({"_id": "purge-1"})
+
+    assert purge["status"] == "queued"
+    assert purge["next_attempt_at"] > datetime.now()
+    assert await queue._claim() is None
+
+    # Due again
+    await fake_db["purge_queue"].update_one({"_id": "purge-1"}, {"$set": {"next_attempt_at": datetime.now()}})
+    await queue._run(await queue._claim())
+    purge = await fake_db["purge_queue"].find_one({"_id": "purge-1"})
+
+    assert purge["status"] == "failed"
+    assert purge["attempts"] == 2
+
+    # Chats stay tombstoned, so the purge can be queued again by hand
+    assert await fake_db["chats"].count_documents({"purge_id": "purge-1"}) == 1
@@ -0,0 +1,122 @@
+import asyncio
+
+import pytest
+
+from app.core.scheduler import FairScheduler
+
+pytestmark = pytest.mark.anyio
+
+
+COSTS = {"image": 1, "audio": 3, "video": 6}
+
+
+def make_scheduler(capacity: float = 6, token_rate: float = 0, token_burst: float = 1000) -> FairScheduler:
+    return FairScheduler(capacity, COSTS, 0, token_rate, token_burst)
+
+
+async def test_running_cost_never_exceeds_capacity():
+    scheduler = make_scheduler(capacity=6)
+    running = []
+    peak = 0
+
+    async def analysis(user: str, media_type: str):
+        nonlocal peak
+
+        async with scheduler.slot(user, media_type, 0):
+            running.append(COSTS[media_type])
+            peak = max(peak, sum(running))
+            await asyncio.sleep(0.01)
+            running.remove(COSTS[media_type])
+
+    media_types = ["video", "image", "audio", "image", "video", "audio", "image", "image"]
+    await asyncio.gather(*(analysis(f"user{number % 3}", media_type) for number, media_type in enumerate(media_types)))
+
+    assert peak <= 6
+    assert scheduler.stats()["used"] == 0
+    assert scheduler.stats()["running"] == 0
+    assert scheduler.stats()["waiting"] == 0
+
+
+async def test_analysis_larger_than_capacity_runs_alone():
+    scheduler = make_scheduler(capacity=2)
+
+    async with scheduler.slot("user", "video", 0):
+        assert scheduler.stats()["running"] == 1
+
+    assert scheduler.stats()["used"] == 0
+
+
+async def test_images_of_another_user_overtake_a_video_burst():
+    scheduler = make_scheduler(capacity=6)
+    order = []
+
+    async def analysis(user: str, media_type: str, label: str):
+        async with scheduler.slot(user, media_type, 0):
+            order.append(label)
+            await asyncio.sleep(0.01)
+
+    burst = [asyncio.create_task(analysis("heavy", "video", f"video{number}")) for number in range(4)]
+    await asyncio.sleep(0)
+    image = asyncio.create_task(analysis("light", "image", "image"))
+
+    await asyncio.gather(*burst, image)
+
+    # The first video was already running, the image goes ahead of the rest of the burst
+    assert order[:2] == ["video0", "image"]
+
+
+async def test_cancelled_waiter_releases_its_place():
+    scheduler = make_scheduler(capacity=6)
+    release = asyncio.Event()
+    started = []
+
+    async def analysis(label: str, media_type: str):
+        async with scheduler.slot(label, media_type, 0):
+            started.append(label)
+            await release.wait()
+
+    first = asyncio.create_task(analysis("first", "video"))
+    await asyncio.sleep(0)
+    cancelled = asyncio.create_task(analysis("cancelled", "video"))
+    waiting = asyncio.create_task(analysis("waiting", "image"))
+    await asyncio.sleep(0)
+
+    assert scheduler.stats()["waiting"] == 2
+
+    cancelled.cancel()
+    await asyncio.gather(cancelled, return_exceptions=True)
+
+    assert scheduler.stats()["waiting"] == 1
+
+    release.set()
+    await asyncio.gather(first, waiting)
+
+    assert started == ["first", "waiting"]
+    assert scheduler.stats()["used"] == 0
+    assert scheduler.stats()["classes"]["video"]["waiting"] == 0
+
+
+async def test_user_with_empty_bucket_yields_to_others():
+    scheduler = make_scheduler(capacity=1, token_rate=0, token_burst=1)
+    release = asyncio.Event()
+    order = []
+
+    async def analysis(user: str, media_type: str, label: str):
+        async with scheduler.slot(user, media_type, 0):
+            order.append(label)
+            await release.wait()
+
+    # The first image spends the greedy user's whole bucket
+    first = asyncio.create_task(analysis("greedy", "image", "greedy1"))
+    await asyncio.sleep(0)
+    greedy = asyncio.create_task(analysis("greedy", "image", "greedy2"))
+    await asyncio.sleep(0)
+
+    # Later finish tag than the greedy user's second image, but tokens left
+    other = asyncio.create_task(analysis("other", "audio", "other"))
+    await asyncio.sleep(0)
+
+    release.set()
+    await asyncio.gather(first, greedy, other)
+
+    assert order == ["greedy1", "other", "greedy2"]
@@ -0,0 +1,93 @@
+import io
+import os
+import tempfile
+
+import httpx
+import pytest
+from fastapi import APIRouter, FastAPI, HTTPException, UploadFile
+from starlette.datastructures import Headers
+from starlette.formparsers import MultiPartParser
+
+from app.utils.upload_ingest import SPOOL_PREFIX, UploadMultiPartParser, UploadRoute, ingest_upload, sniff_mime_type
+from bench.media import make_audio, make_image, make_video
+
+pytestmark = pytest.mark.anyio
+
+
+def upload_file(data: bytes, mime_type: str, size: int = None) -> UploadFile:
+    return UploadFile(io.BytesIO(data), size=size, filename="upload", headers=Headers({"content-type": mime_type}))
+
+
+def spooled_files() -> set:
+    return {name for name in os.listdir(tempfile.gettempdir()) if name.startswith(SPOOL_PREFIX)}
+
+
+@pytest.mark.parametrize("media, mime_type", [
+    (lambda: make_image(1), "image/png"),
+    (lambda: make_audio(1, 4096), "audio/wav"),
+    (lambda: make_video(1, 4096), "video/mp4")
+])
+async def test_sniffed_type_of_generated_media(media, mime_type):
+    assert sniff_mime_type(media()[:64]) == mime_type
+
+
+async def test_upload_is_spooled_with_its_hash_and_real_type():
+    data = make_image(1)
+    upload = await ingest_upload(upload_file(data, "image/jpeg"), "image", 1024 * 1024)
+
+    try:
+        with open(upload["path"], "rb") as file:
+            assert file.read() == data
+
+        # The declared type is only logged, the sniffed one is used
+        assert upload["mime_type"] == "image/png"
+        assert upload["size"] == len(data)
+    finally:
+        os.remove(upload["path"])
+
+
+@pytest.mark.parametrize("size", [None, 2 * 1024 * 1024])
+async def test_oversized_upload_is_a_413_and_leaves_no_file(size):
+    before = spooled_files()
+    data = make_image(1) + b"\0" * (1024 * 1024)
+
+    with pytest.raises(HTTPException) as error:
+        await ingest_upload(upload_file(data, "image/png", size), "image", 1024 * 1024)
+
+    assert error.value.status_code == 413
+    assert spooled_files() == before
+
+
+@pytest.mark.parametrize("data, media_type", [
+    (b"%PDF-1.7 not a media file" * 4, "image"),
+    (make_image(1), "video")
+])
+async def test_unsupported_or_mislabeled_upload_is_a_415_and_leaves_no_file(data, media_type):
+    before = spooled_files()
+
+    with pytest.raises(HTTPException) as error:
+        await ingest_upload(upload_file(data, f"{media_type}/mp4"), media_type, 1024 * 1024)
+
+    assert error.value.status_code == 415
+    assert spooled_files() == before
+
+
+async def test_upload_routes_spool_parts_with_their_own_limit(monkeypatch):
+    monkeypatch.setattr(UploadMultiPartParser, "spool_max_size", 16)
+    app = FastAPI()
+
+    for prefix, router in (("/upload", APIRouter(route_class=UploadRoute)), ("/other", APIRouter())):
+        @router.post("/")
+        async def receive(file: UploadFile):
+            return {"rolled_to_disk": file.file._rolled}
+
+        app.include_router(router, prefix=prefix)
+
+    async with httpx.AsyncClient(transport=httpx.ASGITransport(app=app), base_url="http://test") as client:
+        responses = [
+            await client.post(f"{prefix}/", files={"file": ("image.png", b"x" * 64, "image/png")})
+            for prefix in ("/upload", "/other")
+        ]
+
+    assert [response.json() for response in responses] == [{"rolled_to_disk": True}, {"rolled_to_disk": False}]
+    assert MultiPartParser.spool_max_size == 1024 * 1024
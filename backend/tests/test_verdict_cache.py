@@ -0,0 +1,57 @@
+import asyncio
+
+import pytest
+
+from app.core.verdict_cache import VerdictCache
+
+pytestmark = pytest.mark.anyio
+
+
+UPLOAD = {
+    "public_id": "TrueAI/images/one",
+    "resource_type": "image",
+    "secure_url": "https://res.cloudinary.com/test/image/upload/v1/TrueAI/images/one.png"
+}
+
+
+async def test_entry_invalidated_by_another_worker_is_served_until_the_local_ttl(fake_db):
+    collection = fake_db["verdict_cache"]
+    worker, other_worker = (VerdictCache(collection, 16, 3600, local_ttl_seconds=0.05) for _ in range(2))
+
+    await worker.put("key", UPLOAD, "AI", 0.9, "Reason.")
+    assert (await other_worker.get("key"))["label"] == "AI"
+
+    # Both LRUs hold the entry, the purge runs on one worker only
+    await worker.invalidate_urls([UPLOAD["secure_url"]])
+
+    # Hits are not confirmed with Mongo, the other worker serves its copy until the local TTL ran out
+    assert (await other_worker.get("key"))["label"] == "AI"
+    assert other_worker.stats()["memory_hits"] == 1
+
+    await asyncio.sleep(0.1)
+
+    assert await other_worker.get("key") is None
+    assert other_worker.stats()["entries"] == 0
+
+
+async def test_single_worker_serves_hits_from_memory(fake_db):
+    cache = VerdictCache(fake_db["verdict_cache"], 16, 3600)
+
+    await cache.put("key", UPLOAD, "AI", 0.9, "Reason.")
+    await fake_db["verdict_cache"].delete_many({})
+
+    assert (await cache.get("key"))["label"] == "AI"
+    assert cache.stats()["memory_hits"] == 1
+
+
+async def test_lru_evicts_the_least_recently_used_entry(fake_db):
+    cache = VerdictCache(fake_db["verdict_cache"], 2, 3600)
+
+    for key in ("a", "b"):
+        await cache.put(key, UPLOAD, "AI", 0.9, "Reason.")
+
+    await cache.get("a")
+    await cache.put("c", UPLOAD, "AI", 0.9, "Reason.")
+
+    assert list(cache._entries) == ["a", "c"]
+    assert cache.stats()["evictions"] == 1
@@ -1,4 +1,4 @@
-import { createContext, useState, useContext, useEffect } from "react";
+import { createContext, useState, useContext, useEffect, useRef } from "react";
 import { useUser } from "@clerk/clerk-react";
 import axios from "axios";
 import toast from "react-hot-toast";
@@ -7,37 +7,121 @@ const DashboardContext = createContext(undefined);
 
 const SERVER_URL = import.meta.env.VITE_SERVER_URL;
 
+// Chats per page of the sidebar history, messages per page of a chat
+const HISTORY_PAGE_SIZE = 20;
+const MESSAGES_PAGE_SIZE = 50;
+
+const toChatMessage = (message) => ({
+  ...message,
+  result: message.label?.toLowerCase().includes("ai") ? "AI" : "Real",
+});
+
 export function DashboardProvider({ children }) {
   const { user } = useUser();
   const [chats, setChats] = useState([]);
+  const [historyCursor, setHistoryCursor] = useState(null);
   const [selectedChatId, setSelectedChatId] = useState(null);
+  const loadingMessages = useRef(new Set());
+
+  const email = user?.emailAddresses[0].emailAddress;
 
   useEffect(() => {
-    if (user?.emailAddresses[0].emailAddress) {
+    if (email) {
       fetchHistory();
     }
   }, [user]);
 
+  // Messages are only loaded once a chat is opened
+  useEffect(() => {
+    const chat = chats.find((c) => c.id === selectedChatId);
+
+    if (chat && chat.messages === null) {
+      fetchMessages(chat.id);
+    }
+  }, [selectedChatId, chats]);
+
+  const fetchHistoryPage = async (cursor) => {
+    const response = await axios.get(`${SERVER_URL}/api/chat/history/page`, {
+      params: { email, limit: HISTORY_PAGE_SIZE, cursor: cursor || undefined },
+    });
+
+    // Map backend response to frontend Chat object
+    const pageChats = response.data.chats.map((chat) => ({
+      id: chat._id,
+      name: chat.title,
+      messages: null,
+      messagesCursor: null,
+    }));
+
+    setHistoryCursor(response.data.next_cursor);
+    return pageChats;
+  };
+
   const fetchHistory = async () => {
     try {
-      const email = user?.emailAddresses[0].emailAddress;
+      const pageChats = await fetchHistoryPage(null);
+      loadingMessages.current.clear();
+      setChats(pageChats);
+    } catch (error) {
+      console.log("Failed to fetch history: ", error);
+    }
+  };
+
+  const loadMoreChats = async () => {
+    if (!historyCursor) {
+      return;
+    }
+
+    try {
+      const pageChats = await fetchHistoryPage(historyCursor);
+      setChats((prev) => [
+        ...prev,
+        ...pageChats.filter((chat) => !prev.some((c) => c.id === chat.id)),
+      ]);
+    } catch (error) {
+      console.log("Failed to fetch more history: ", error);
+    }
+  };
+
+  const fetchMessages = async (chatId, cursor = null) => {
+    if (loadingMessages.current.has(chatId)) {
+      return;
+    }
+
+    loadingMessages.current.add(chatId);
+
+    try {
       const response = await axios.get(
-        `${SERVER_URL}/api/chat/history?email=${email}`
+        `${SERVER_URL}/api/chat/${chatId}/messages`,
+        { params: { email, limit: MESSAGES_PAGE_SIZE, cursor: cursor || undefined } }
       );
 
-      // Map backend response to frontend Chat object
-      const mappedChats = response.data.map((chat) => ({
-        id: chat._id,
-        name: chat.title,
-        messages: chat.messages.map((message) => ({
-          ...message,
-          result: message.label?.toLowerCase().includes("ai") ? "AI" : "Real",
-        })),
-      }));
-
-      setChats(mappedChats);
+      // Pages go from the newest messages back, older pages are put in front
+      const pageMessages = response.data.messages.map(toChatMessage);
+
+      setChats((prev) =>
+        prev.map((chat) =>
+          chat.id === chatId
+            ? {
+                ...chat,
+                messages: [...pageMessages, ...(cursor ? chat.messages || [] : [])],
+                messagesCursor: response.data.next_cursor,
+              }
+            : chat
+        )
+      );
     } catch (error) {
-      console.log("Failed to fetch history: ", error);
+      console.log("Failed to fetch messages: ", error);
+    } finally {
+      loadingMessages.current.delete(chatId);
+    }
+  };
+
+  const loadOlderMessages = (chatId) => {
+    const chat = chats.find((c) => c.id === chatId);
+
+    if (chat?.messagesCursor) {
+      fetchMessages(chatId, chat.messagesCursor);
     }
   };
 
@@ -51,7 +135,7 @@ export function DashboardProvider({ children }) {
     setChats((prev) =>
       prev.map((chat) =>
         chat.id === chatId
-          ? { ...chat, messages: [...chat.messages, message] }
+          ? { ...chat, messages: [...(chat.messages || []), message] }
           : chat
       )
     );
@@ -59,7 +143,6 @@ export function DashboardProvider({ children }) {
 
   const deleteChat = async (chatId) => {
     try {
-      const email = user?.emailAddresses[0].emailAddress;
       await axios.delete(
         `${SERVER_URL}/api/chat/delete?email=${email}&chatId=${chatId}`
       );
@@ -68,7 +151,7 @@ export function DashboardProvider({ children }) {
         createNewChat();
       }
 
-      fetchHistory();
+      setChats((prev) => prev.filter((chat) => chat.id !== chatId));
       toast.success("Chat deleted successfully");
     } catch (error) {
       console.log("Failed to delete chat: ", error);
@@ -79,10 +162,13 @@ export function DashboardProvider({ children }) {
     <DashboardContext.Provider
       value={{
         chats,
+        hasMoreChats: Boolean(historyCursor),
         selectedChatId,
         createNewChat,
         selectChat,
         addMessageToChat,
+        loadMoreChats,
+        loadOlderMessages,
         refreshChats: fetchHistory,
         deleteChat,
       }}
@@ -21,8 +21,14 @@ const SERVER_URL = import.meta.env.VITE_SERVER_URL;
 
 export default function DetectionArea() {
   const { user } = useUser();
-  const { selectedChatId, chats, refreshChats, selectChat, addMessageToChat } =
-    useDashboard();
+  const {
+    selectedChatId,
+    chats,
+    refreshChats,
+    selectChat,
+    addMessageToChat,
+    loadOlderMessages,
+  } = useDashboard();
 
   const [attachedFile, setAttachedFile] = useState(null);
   const [isAnalyzing, setIsAnalyzing] = useState(false);
@@ -173,6 +179,17 @@ export default function DetectionArea() {
             </div>
           )}
 
+          {selectedChat?.messagesCursor && (
+            <div className="flex justify-center">
+              <button
+                onClick={() => loadOlderMessages(selectedChat.id)}
+                className="px-4 py-2 text-xs text-muted-foreground rounded-lg hover:bg-secondary hover:cursor-pointer"
+              >
+                Load older messages
+              </button>
+            </div>
+          )}
+
           {messages.map((msg) => (
             <div
               key={msg.id}
@@ -14,8 +14,15 @@ import * as Tooltip from "@radix-ui/react-tooltip";
 import { useDashboard } from "../dashboard/DashboardProvider";
 
 export default function Sidebar() {
-  const { chats, selectedChatId, createNewChat, selectChat, deleteChat } =
-    useDashboard();
+  const {
+    chats,
+    hasMoreChats,
+    selectedChatId,
+    createNewChat,
+    selectChat,
+    deleteChat,
+    loadMoreChats,
+  } = useDashboard();
   const [isOpen, setIsOpen] = useState(true);
 
   const toggleSidebar = () => setIsOpen((prev) => !prev);
@@ -81,6 +88,14 @@ export default function Sidebar() {
                     />
                   ))}
                 </div>
+                {hasMoreChats && (
+                  <button
+                    onClick={loadMoreChats}
+                    className="w-full mt-2 py-2 text-xs text-muted-foreground rounded-lg hover:bg-sidebar-accent hover:cursor-pointer"
+                  >
+                    Load more
+                  </button>
+                )}
               </>
             ) : (
               <div className="flex justify-center">